@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+
+import random
+import time
+from typing import Dict, Any
+
+from base_agent import LogLevel
+from rules import np
+from specialized_agents import AnalysisAgent
+
+
+def make_columns(users: int, samples: int = 10, seed: int = 0) -> Dict[str, Any]:
+    """Random fitness data for `users` users as columns (lists, or arrays with NumPy)"""
+    rng = random.Random(seed)
+    columns = {
+        "steps": [rng.randint(3000, 15000) for _ in range(users)],
+        "heart_rate": [[rng.randint(60, 150) for _ in range(samples)] for _ in range(users)],
+        "sleep_hours": [round(rng.uniform(5.0, 9.0), 1) for _ in range(users)]
+    }
+    if np is not None:
+        columns = {name: np.array(values) for name, values in columns.items()}
+    return columns
+
+
+def compare_analysis(agent: AnalysisAgent, columns: Dict[str, Any]) -> Dict[str, float]:
+    """Seconds to analyze the columns user by user and as one batch; both must agree"""
+    steps, heart_rate, sleep_hours = columns["steps"], columns["heart_rate"], columns["sleep_hours"]
+    if np is not None:
+        rows = zip(steps.tolist(), heart_rate.tolist(), sleep_hours.tolist())
+    else:
+        rows = zip(steps, heart_rate, sleep_hours)
+
+    start = time.perf_counter()
+    scalar = [agent.analyze_fitness_data(*row) for row in rows]
+    scalar_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batch = agent.analyze_fitness_batch(steps, heart_rate, sleep_hours)
+    batch_time = time.perf_counter() - start
+
+    if batch != scalar:
+        raise AssertionError("Batch and per-user recommendations differ")
+    return {
+        "scalar_s": scalar_time,
+        "batch_s": batch_time,
+        "speedup": scalar_time / batch_time if batch_time else float("inf")
+    }
+
+
+if __name__ == "__main__":
+    # Activity logging would dominate the per-user timings
+    agent = AnalysisAgent("AnalysisAgent")
+    agent.log.level = LogLevel.OFF
+    print("NumPy:", "available" if np is not None else "not installed (batch runs per user)")
+    for users in (10_000, 1_000_000):
+        result = compare_analysis(agent, make_columns(users))
+        print(f"{users:>9} users  per-user {result['scalar_s']:7.3f} s  "
+              f"batch {result['batch_s']:7.3f} s  speedup {result['speedup']:6.1f}x")
@@ -1,9 +1,21 @@
 #!/usr/bin/env python3
 
+import asyncio
+import heapq
+import inspect
+import itertools
+import os
+import sys
+import threading
+import time
 from abc import ABC, abstractmethod
+from collections import Counter, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
 from datetime import datetime
-from enum import Enum
-from typing import Dict, List, Any, Optional, Set
+from enum import Enum, IntEnum
+from types import MappingProxyType
+from typing import Callable, Dict, List, Any, Optional, Set
 
 
 class SpeechAct(Enum):
@@ -17,13 +29,113 @@ class SpeechAct(Enum):
     RECOMMEND = "recommend"  # Making a recommendation
 
 
+class LogLevel(IntEnum):
+    """Activity log levels; records below an agent's level are discarded"""
+    DEBUG = 10  # Hot-path events: belief, desire and intention updates, messages
+    INFO = 20   # Reasoning milestones
+    OFF = 100   # Disable logging entirely
+
+
+# Offset from the monotonic clock to wall-clock time, in nanoseconds
+_WALL_OFFSET_NS = time.time_ns() - time.monotonic_ns()
+
+
+def monotonic_to_wall_ns(monotonic_ns: int) -> int:
+    """Convert a time.monotonic_ns() reading to nanoseconds since the epoch"""
+    return monotonic_ns + _WALL_OFFSET_NS
+
+
+def wall_to_monotonic_ns(wall_ns: int) -> int:
+    """Convert nanoseconds since the epoch to this process's monotonic clock"""
+    return wall_ns - _WALL_OFFSET_NS
+
+
+def monotonic_to_datetime(monotonic_ns: int) -> datetime:
+    """Convert a time.monotonic_ns() reading to a local datetime"""
+    return datetime.fromtimestamp(monotonic_to_wall_ns(monotonic_ns) / 1e9)
+
+
+# Conversation ids are a per-process prefix plus a counter, so they stay
+# unique across the processes of a sharded run
+_CONVERSATION_PREFIX = f"conv-{os.getpid():x}-"
+_conversation_counter = itertools.count(1)
+
+
+def new_conversation_id() -> str:
+    """Allocate a unique conversation id"""
+    return f"{_CONVERSATION_PREFIX}{next(_conversation_counter)}"
+
+
+class ActivityLog:
+    """Fixed-capacity ring buffer of raw activity records
+    
+    Each record is a (monotonic_ns, level, event, args) tuple where event is a
+    %-style template. Timestamps and messages are only formatted when the log
+    is read, and records below `level` are dropped before any work is done.
+    """
+    def __init__(self, owner: str, capacity: int = 1000, level: LogLevel = LogLevel.DEBUG):
+        self.owner = owner
+        self.capacity = capacity
+        self.level = level
+        self._records: List[Optional[tuple]] = [None] * capacity
+        self._next = 0
+        self._size = 0
+    
+    def record(self, level: LogLevel, event: str, args: tuple = ()) -> None:
+        """Store a raw record, overwriting the oldest one when full"""
+        if level < self.level:
+            return
+        self._records[self._next] = (time.monotonic_ns(), level, event, args)
+        self._next = (self._next + 1) % self.capacity
+        if self._size < self.capacity:
+            self._size += 1
+    
+    def records(self) -> List[tuple]:
+        """Raw records, oldest first"""
+        start = (self._next - self._size) % self.capacity
+        if start + self._size <= self.capacity:
+            return self._records[start:start + self._size]
+        return self._records[start:] + self._records[:self._next]
+    
+    def format(self, record: tuple) -> str:
+        """Render a raw record as a log line"""
+        monotonic_ns, _, event, args = record
+        timestamp = monotonic_to_datetime(monotonic_ns).strftime("%H:%M:%S")
+        activity = event % args if args else event
+        return f"[{timestamp}] {self.owner}: {activity}"
+    
+    def clear(self) -> None:
+        """Drop all records"""
+        self._records = [None] * self.capacity
+        self._next = 0
+        self._size = 0
+    
+    def __iter__(self):
+        return (self.format(record) for record in self.records())
+    
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.format(record) for record in self.records()[index]]
+        return self.format(self.records()[index])
+    
+    def __len__(self) -> int:
+        return self._size
+
+
 class Belief:
     """Represents an agent's belief about the world"""
+    __slots__ = ("predicate", "value", "confidence", "created_ns")
+    
     def __init__(self, predicate: str, value: Any, confidence: float = 1.0):
-        self.predicate = predicate
+        self.predicate = sys.intern(predicate)
         self.value = value
         self.confidence = confidence  # 0.0 to 1.0
-        self.timestamp = datetime.now()
+        self.created_ns = time.monotonic_ns()
+    
+    @property
+    def timestamp(self) -> datetime:
+        """Creation time as a datetime (converted on access)"""
+        return monotonic_to_datetime(self.created_ns)
     
     def __str__(self):
         return f"{self.predicate}({self.value}) [conf={self.confidence:.2f}]"
@@ -39,10 +151,95 @@ class Belief:
         return hash(self.predicate)
 
 
+class BeliefStore:
+    """Belief base indexed by predicate with per-predicate and global versions
+
+    Each predicate maps to exactly one Belief, so upserts and lookups are O(1).
+    Every change bumps the predicate's version and the store-wide version,
+    which lets callers cheaply detect whether anything they read has changed.
+    
+    Predicates can be watched: changes to a watched predicate are collected in
+    a dirty set that take_changes() drains, so reactive rules only run for
+    beliefs that were added or changed since they last fired.
+    """
+    def __init__(self, beliefs=None):
+        self._beliefs: Dict[str, Belief] = {}
+        self._versions: Dict[str, int] = {}
+        self._watched: Set[str] = set()
+        self._dirty: Dict[str, None] = {}  # Ordered set of changed, watched predicates
+        self.version = 0
+        for belief in beliefs or ():
+            self.upsert(belief)
+    
+    def upsert(self, belief: Belief) -> bool:
+        """Insert or replace the belief for its predicate; return True if it changed"""
+        current = self._beliefs.get(belief.predicate)
+        self._beliefs[belief.predicate] = belief
+        if current is not None and current == belief and current.confidence == belief.confidence:
+            return False
+        self._versions[belief.predicate] = self._versions.get(belief.predicate, 0) + 1
+        self.version += 1
+        if belief.predicate in self._watched:
+            self._dirty[belief.predicate] = None
+        return True
+    
+    def get(self, predicate: str) -> Optional[Belief]:
+        """Get the belief for a predicate, if any"""
+        return self._beliefs.get(predicate)
+    
+    def remove(self, predicate: str) -> Optional[Belief]:
+        """Remove and return the belief for a predicate, if any (agents use Agent.remove_belief, which is journaled)"""
+        belief = self._beliefs.pop(predicate, None)
+        if belief is not None:
+            self._versions[predicate] = self._versions.get(predicate, 0) + 1
+            self.version += 1
+            self._dirty.pop(predicate, None)
+        return belief
+    
+    def watch(self, predicate: str) -> None:
+        """Track changes to a predicate; an existing belief counts as a change"""
+        self._watched.add(predicate)
+        if predicate in self._beliefs:
+            self._dirty[predicate] = None
+    
+    def take_changes(self) -> List[Belief]:
+        """Return beliefs for watched predicates changed since the last call"""
+        if not self._dirty:
+            return []
+        changed = [self._beliefs[p] for p in self._dirty]
+        self._dirty.clear()
+        return changed
+    
+    def has_changes(self) -> bool:
+        """Check if take_changes() would return anything"""
+        return bool(self._dirty)
+    
+    def version_of(self, predicate: str) -> int:
+        """Number of changes seen for a predicate (0 if never set)"""
+        return self._versions.get(predicate, 0)
+    
+    def predicates(self):
+        """Predicates currently believed"""
+        return self._beliefs.keys()
+    
+    def __contains__(self, predicate) -> bool:
+        if isinstance(predicate, Belief):
+            predicate = predicate.predicate
+        return predicate in self._beliefs
+    
+    def __iter__(self):
+        return iter(list(self._beliefs.values()))
+    
+    def __len__(self) -> int:
+        return len(self._beliefs)
+
+
 class Desire:
     """Represents an agent's goal or desire"""
+    __slots__ = ("name", "priority", "achieved")
+    
     def __init__(self, name: str, priority: float = 0.5):
-        self.name = name
+        self.name = sys.intern(name)
         self.priority = priority  # 0.0 to 1.0
         self.achieved = False
     
@@ -51,76 +248,874 @@ class Desire:
         return f"{status} {self.name} (priority={self.priority:.2f})"
 
 
+class DesireAgenda:
+    """Priority agenda of desires with a name index
+    
+    Desires live in a heap ordered by priority (highest first, ties in
+    insertion order), giving O(log n) insert and O(1) amortized access to the
+    highest-priority unachieved desire. Achieved desires are dropped from the
+    heap lazily the next time the top is inspected. Membership is by desire
+    name and stays true once a desire was added, matching the old behaviour of
+    checking `any(d.name == name for d in desires)`.
+    """
+    def __init__(self, desires=None):
+        self._heap = []     # (-priority, seq, desire) for possibly unachieved desires
+        self._entries = []  # (-priority, seq, desire) for every desire, for ordered views
+        self._by_name: Dict[str, List[Desire]] = {}
+        self._seq = itertools.count()
+        self._ordered = True
+        for desire in desires or ():
+            self.add(desire)
+    
+    def add(self, desire: Desire) -> None:
+        """Add a desire to the agenda"""
+        entry = (-desire.priority, next(self._seq), desire)
+        self._entries.append(entry)
+        self._ordered = False
+        self._by_name.setdefault(desire.name, []).append(desire)
+        if not desire.achieved:
+            heapq.heappush(self._heap, entry)
+    
+    def peek(self) -> Optional[Desire]:
+        """Highest-priority unachieved desire, or None"""
+        heap = self._heap
+        while heap and heap[0][2].achieved:
+            heapq.heappop(heap)
+        return heap[0][2] if heap else None
+    
+    def get(self, name: str) -> Optional[Desire]:
+        """First desire added with the given name, or None"""
+        desires = self._by_name.get(name)
+        return desires[0] if desires else None
+    
+    def active(self) -> List[Desire]:
+        """Unachieved desires in priority order"""
+        return [d for d in self if not d.achieved]
+    
+    def __contains__(self, name) -> bool:
+        if isinstance(name, Desire):
+            name = name.name
+        return name in self._by_name
+    
+    def _ordered_entries(self) -> List[tuple]:
+        if not self._ordered:
+            self._entries.sort()
+            self._ordered = True
+        return self._entries
+    
+    def __iter__(self):
+        return iter([entry[2] for entry in self._ordered_entries()])
+    
+    def __getitem__(self, index):
+        entries = self._ordered_entries()
+        if isinstance(index, slice):
+            return [entry[2] for entry in entries[index]]
+        return entries[index][2]
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
 class Intention:
     """Represents an agent's intention to act"""
+    __slots__ = ("action", "params", "desire", "completed", "created_ns")
+    
     def __init__(self, action: str, params: Dict[str, Any], desire: Optional[Desire] = None):
-        self.action = action
+        self.action = sys.intern(action)
         self.params = params
         self.desire = desire
         self.completed = False
-        self.timestamp = datetime.now()
+        self.created_ns = time.monotonic_ns()
+    
+    @property
+    def timestamp(self) -> datetime:
+        """Creation time as a datetime (converted on access)"""
+        return monotonic_to_datetime(self.created_ns)
     
     def __str__(self):
         status = "✓" if self.completed else "○"
         return f"{status} {self.action}({', '.join([f'{k}={v}' for k,v in self.params.items()])})"
 
 
+class IntentionSet:
+    """Intentions in insertion order with O(1) add and removal"""
+    def __init__(self, intentions=None):
+        self._intentions: Dict[Intention, None] = dict.fromkeys(intentions or ())
+    
+    def append(self, intention: Intention) -> None:
+        """Add an intention"""
+        self._intentions[intention] = None
+    
+    def remove(self, intention: Intention) -> None:
+        """Remove an intention, raising ValueError if it is not present"""
+        try:
+            del self._intentions[intention]
+        except KeyError:
+            raise ValueError(f"{intention} is not an intention") from None
+    
+    def discard(self, intention: Intention) -> None:
+        """Remove an intention if present"""
+        self._intentions.pop(intention, None)
+    
+    def pending(self) -> List[Intention]:
+        """Snapshot of intentions that are not completed"""
+        return [i for i in self._intentions if not i.completed]
+    
+    def __contains__(self, intention) -> bool:
+        return intention in self._intentions
+    
+    def __iter__(self):
+        return iter(list(self._intentions))
+    
+    def __len__(self) -> int:
+        return len(self._intentions)
+
+
+class ActionRegistry:
+    """Maps intention actions to handlers and counts how often each one ran
+    
+    A handler is called with the intention and returns True once the
+    intention is completed; returning False leaves it pending for a later cycle.
+    """
+    def __init__(self):
+        self._handlers: Dict[str, Callable[[Intention], bool]] = {}
+        self.counts: Counter = Counter()  # Executions per action
+    
+    def register(self, action: str, handler: Callable[[Intention], bool]) -> None:
+        """Register (or replace) the handler for an action"""
+        self._handlers[action] = handler
+    
+    def get(self, action: str) -> Optional[Callable[[Intention], bool]]:
+        """Get the handler for an action, if any"""
+        return self._handlers.get(action)
+    
+    def __contains__(self, action: str) -> bool:
+        return action in self._handlers
+
+
 class Message:
-    """Message format for agent communication"""
-    def __init__(self, sender: str, receiver: str, speech_act: SpeechAct, content: Dict[str, Any], conversation_id: Optional[str] = None):
-        self.sender = sender
-        self.receiver = receiver
-        self.speech_act = speech_act
+    """Message format for agent communication
+    
+    Agent names are interned and the speech act is always the shared SpeechAct
+    member (string values are converted), so routing compares by identity.
+    `session` is the key of the sender's session (None for its default one);
+    the receiver interprets the message in its session with the same key.
+    """
+    __slots__ = ("sender", "receiver", "speech_act", "content", "created_ns", "conversation_id", "session")
+    
+    def __init__(self, sender: str, receiver: str, speech_act: SpeechAct, content: Dict[str, Any],
+                 conversation_id: Optional[str] = None, session: Optional[str] = None):
+        self.sender = sys.intern(sender)
+        self.receiver = sys.intern(receiver)
+        self.speech_act = speech_act if isinstance(speech_act, SpeechAct) else SpeechAct(speech_act)
         self.content = content
-        self.timestamp = datetime.now()
-        self.conversation_id = conversation_id or f"conv-{int(datetime.now().timestamp())}"
+        self.created_ns = time.monotonic_ns()
+        self.conversation_id = conversation_id or new_conversation_id()
+        self.session = session
+    
+    @property
+    def timestamp(self) -> datetime:
+        """Send time as a datetime (converted on access)"""
+        return monotonic_to_datetime(self.created_ns)
+    
+    def __getstate__(self):
+        # Published messages carry a read-only mappingproxy, which cannot be pickled
+        state = {slot: getattr(self, slot) for cls in type(self).__mro__ for slot in getattr(cls, "__slots__", ())}
+        shared = isinstance(self.content, MappingProxyType)
+        if shared:
+            state["content"] = dict(self.content)
+        return state, shared
+    
+    def __setstate__(self, state):
+        state, shared = state
+        self.session = None  # Not in messages pickled before sessions existed
+        for slot, value in state.items():
+            setattr(self, slot, value)
+        if shared:
+            self.content = MappingProxyType(self.content)
     
     def __str__(self):
         return f"Message({self.speech_act.value}: {self.sender} → {self.receiver})"
 
 
+class MessageBatch(Message):
+    """Several INFORMs from one sender to one receiver in one session, coalesced into one message
+    
+    The content merges the parts in send order (later keys override earlier
+    ones); the originals stay available in `messages`, e.g. for their
+    conversation ids.
+    """
+    __slots__ = ("messages",)
+    
+    def __init__(self, messages: List[Message]):
+        last = messages[-1]
+        content = {}
+        for message in messages:
+            content.update(message.content)
+        super().__init__(last.sender, last.receiver, last.speech_act, content, last.conversation_id, last.session)
+        self.created_ns = last.created_ns
+        self.messages = messages
+    
+    def __str__(self):
+        return f"MessageBatch({len(self.messages)} x {self.speech_act.value}: {self.sender} → {self.receiver})"
+
+
+class Mailbox:
+    """Bounded FIFO of incoming messages with O(1) enqueue and dequeue
+    
+    When the mailbox is full new messages are rejected and counted in `dropped`.
+    """
+    def __init__(self, capacity: int = 1000):
+        self.capacity = capacity
+        self.dropped = 0
+        self._messages = deque()
+    
+    def append(self, message: Message) -> bool:
+        """Enqueue a message; return False if the mailbox is full"""
+        if len(self._messages) >= self.capacity:
+            self.dropped += 1
+            return False
+        self._messages.append(message)
+        return True
+    
+    def popleft(self) -> Message:
+        """Dequeue the oldest message"""
+        return self._messages.popleft()
+    
+    def clear(self) -> None:
+        """Drop all queued messages"""
+        self._messages.clear()
+    
+    def __getitem__(self, index) -> Message:
+        return self._messages[index]
+    
+    def __iter__(self):
+        return iter(self._messages)
+    
+    def __len__(self) -> int:
+        return len(self._messages)
+
+
+class MessageDispatcher:
+    """Central outbox that delivers messages to mailboxes at cycle boundaries
+    
+    While an agent has a dispatcher, send_message() only posts the message here,
+    so nothing sent during a cycle is visible to any agent before deliver() is
+    called, regardless of the order in which agents are stepped.
+    
+    Each sender has its own outbox, so agents stepping on different threads
+    never contend, and deliver() always runs senders in registration order
+    (each in send order), which keeps delivery deterministic.
+    
+    With `coalesce`, consecutive INFORMs from one sender to one receiver in
+    one session are delivered as a single MessageBatch. Only INFORMs are
+    merged: they just state facts, so the latest value of each key is all a
+    receiver needs, whereas every REQUEST or QUERY asks for its own action and
+    reply. A non-INFORM message, or one from another session, ends the run so
+    the receiver still sees them in order.
+    """
+    def __init__(self, coalesce: bool = False):
+        self.coalesce = coalesce
+        self.coalesced = 0  # Messages merged into batches so far
+        self._outboxes: Dict[str, deque] = {}  # Sender name -> (message, receiver) in send order
+    
+    def register(self, agent: "Agent") -> None:
+        """Give an agent its outbox; registration order fixes delivery order"""
+        self._outboxes.setdefault(agent.name, deque())
+    
+    def post(self, message: Message, receiver: "Agent") -> None:
+        """Queue a message for delivery at the next cycle boundary"""
+        outbox = self._outboxes.get(message.sender)
+        if outbox is None:
+            outbox = self._outboxes.setdefault(message.sender, deque())
+        outbox.append((message, receiver))
+    
+    def deliver(self) -> int:
+        """Deliver all queued messages; return how many were delivered (batches count once)"""
+        if self.coalesce:
+            return self._deliver_coalesced()
+        delivered = 0
+        for outbox in self._outboxes.values():
+            while outbox:
+                message, receiver = outbox.popleft()
+                receiver.receive_message(message)
+                delivered += 1
+        return delivered
+    
+    def _deliver_coalesced(self) -> int:
+        delivered = 0
+        for outbox in self._outboxes.values():
+            if not outbox:
+                continue
+            groups = []  # (receiver, [messages]) in send order
+            open_runs = {}  # id(receiver) -> index in groups of the current INFORM run
+            while outbox:
+                message, receiver = outbox.popleft()
+                key = id(receiver)
+                if message.speech_act is SpeechAct.INFORM:
+                    index = open_runs.get(key)
+                    if index is not None and groups[index][1][0].session == message.session:
+                        groups[index][1].append(message)
+                        continue
+                    open_runs[key] = len(groups)
+                else:
+                    open_runs.pop(key, None)
+                groups.append((receiver, [message]))
+            
+            for receiver, messages in groups:
+                if len(messages) == 1:
+                    receiver.receive_message(messages[0])
+                else:
+                    receiver.receive_message(MessageBatch(messages))
+                    self.coalesced += len(messages) - 1
+                delivered += 1
+        return delivered
+    
+    def pending(self) -> List[tuple]:
+        """All queued (message, receiver) pairs in delivery order, left in place"""
+        return [pair for outbox in self._outboxes.values() for pair in outbox]
+    
+    def drain(self) -> List[tuple]:
+        """Remove and return all queued (message, receiver) pairs in delivery order"""
+        pending = []
+        for outbox in self._outboxes.values():
+            pending.extend(outbox)
+            outbox.clear()
+        return pending
+    
+    def __len__(self) -> int:
+        return sum(len(outbox) for outbox in self._outboxes.values())
+
+
+class AgentDirectory:
+    """Registry of live agents, indexed by name, class, agent_type and capability
+    
+    Behaves like the list it replaces (append, extend, remove, clear, copy,
+    iteration in registration order) while lookups are dictionary hits
+    instead of scans over every agent. Each index maps a key to an
+    insertion-ordered dict of id(agent) -> agent, so removal is O(1) too.
+    """
+    def __init__(self):
+        self._agents: Dict[int, "Agent"] = {}
+        self._by_name: Dict[str, "Agent"] = {}
+        self._by_class: Dict[type, Dict[int, "Agent"]] = {}
+        self._by_type: Dict[str, Dict[int, "Agent"]] = {}
+        self._by_capability: Dict[str, Dict[int, "Agent"]] = {}
+        self._by_topic: Dict[str, Dict[int, "Agent"]] = {}
+    
+    def append(self, agent: "Agent") -> None:
+        """Register an agent (re-registering is a no-op)"""
+        key = id(agent)
+        if key in self._agents:
+            return
+        self._agents[key] = agent
+        self._by_name[agent.name] = agent  # The newest agent wins a name clash
+        for cls in type(agent).__mro__[:-1]:  # Every class except object
+            self._by_class.setdefault(cls, {})[key] = agent
+        self._by_type.setdefault(agent.agent_type, {})[key] = agent
+        for capability in agent.capabilities:
+            self._by_capability.setdefault(capability, {})[key] = agent
+        for topic in agent.subscriptions:
+            self._by_topic.setdefault(topic, {})[key] = agent
+    
+    def extend(self, agents) -> None:
+        for agent in agents:
+            self.append(agent)
+    
+    def remove(self, agent: "Agent") -> None:
+        """Unregister an agent; raises ValueError if it is not registered"""
+        key = id(agent)
+        if key not in self._agents:
+            raise ValueError(f"{agent.name} is not registered")
+        del self._agents[key]
+        for cls in type(agent).__mro__[:-1]:
+            self._by_class[cls].pop(key, None)
+        self._by_type[agent.agent_type].pop(key, None)
+        for capability in agent.capabilities:
+            self._by_capability[capability].pop(key, None)
+        for topic in agent.subscriptions:
+            self._by_topic[topic].pop(key, None)
+        if self._by_name.get(agent.name) is agent:
+            del self._by_name[agent.name]
+            # Fall back to the newest remaining agent with the same name
+            for other in reversed(self._agents.values()):
+                if other.name == agent.name:
+                    self._by_name[agent.name] = other
+                    break
+    
+    def clear(self) -> None:
+        self._agents.clear()
+        self._by_name.clear()
+        self._by_class.clear()
+        self._by_type.clear()
+        self._by_capability.clear()
+        self._by_topic.clear()
+    
+    def copy(self) -> List["Agent"]:
+        """The registered agents as a list, in registration order"""
+        return list(self._agents.values())
+    
+    def add_capability(self, agent: "Agent", capability: str) -> None:
+        """Index a capability declared after the agent was registered"""
+        if id(agent) in self._agents:
+            self._by_capability.setdefault(capability, {})[id(agent)] = agent
+    
+    def subscribe(self, agent: "Agent", topic: str) -> None:
+        """Index a topic subscription made after the agent was registered"""
+        if id(agent) in self._agents:
+            self._by_topic.setdefault(topic, {})[id(agent)] = agent
+    
+    def unsubscribe(self, agent: "Agent", topic: str) -> None:
+        self._by_topic.get(topic, {}).pop(id(agent), None)
+    
+    def get(self, name: str) -> Optional["Agent"]:
+        """The agent registered under `name`, if any"""
+        return self._by_name.get(name)
+    
+    def by_class(self, cls: type) -> List["Agent"]:
+        """Agents that are instances of `cls` (including subclasses)"""
+        return list(self._by_class.get(cls, {}).values())
+    
+    def by_type(self, agent_type: str) -> List["Agent"]:
+        """Agents with the given agent_type"""
+        return list(self._by_type.get(agent_type, {}).values())
+    
+    def with_capability(self, capability: str) -> List["Agent"]:
+        """Agents that declared `capability`"""
+        return list(self._by_capability.get(capability, {}).values())
+    
+    def subscribers(self, topic: str) -> List["Agent"]:
+        """Agents subscribed to `topic`"""
+        return list(self._by_topic.get(topic, {}).values())
+    
+    def __contains__(self, agent) -> bool:
+        return id(agent) in self._agents
+    
+    def __iter__(self):
+        return iter(list(self._agents.values()))
+    
+    def __len__(self) -> int:
+        return len(self._agents)
+
+
+class Conversation:
+    """An open REQUEST or QUERY waiting for its INFORM reply"""
+    __slots__ = ("conversation_id", "key", "request", "deadline_ns")
+    
+    def __init__(self, request: Message, key, deadline_ns: int):
+        self.conversation_id = request.conversation_id
+        self.key = key
+        self.request = request
+        self.deadline_ns = deadline_ns
+    
+    def __repr__(self):
+        return f"Conversation({self.conversation_id}, {self.key})"
+
+
+class ConversationTable:
+    """Open conversations of one agent, by conversation id and by request key
+    
+    The key (receiver, action or query) lets an agent check in O(1) whether an
+    equivalent request is still awaiting a reply. Deadlines sit in a heap;
+    closed conversations are skipped lazily when they reach the top.
+    """
+    def __init__(self, timeout: float = 5.0):
+        self.timeout = timeout  # Default seconds to wait for a reply
+        self._open: Dict[str, Conversation] = {}
+        self._by_key: Dict[Any, Conversation] = {}
+        self._deadlines = []  # Heap of (deadline_ns, conversation_id)
+    
+    def open(self, request: Message, key, timeout: Optional[float] = None) -> Conversation:
+        """Track a request until it is answered or times out"""
+        timeout = self.timeout if timeout is None else timeout
+        conversation = Conversation(request, key, request.created_ns + int(timeout * 1e9))
+        self._open[conversation.conversation_id] = conversation
+        self._by_key[key] = conversation
+        heapq.heappush(self._deadlines, (conversation.deadline_ns, conversation.conversation_id))
+        return conversation
+    
+    def _forget(self, conversation: Conversation) -> None:
+        del self._open[conversation.conversation_id]
+        if self._by_key.get(conversation.key) is conversation:
+            del self._by_key[conversation.key]
+    
+    def close(self, conversation_id: str) -> Optional[Conversation]:
+        """Mark a conversation as answered; returns it, or None if it was not open"""
+        conversation = self._open.get(conversation_id)
+        if conversation is not None:
+            self._forget(conversation)
+        return conversation
+    
+    def pending(self, key) -> bool:
+        """Check if a request with this key is still awaiting a reply"""
+        return key in self._by_key
+    
+    def get(self, conversation_id: str) -> Optional[Conversation]:
+        return self._open.get(conversation_id)
+    
+    def expire(self, now_ns: Optional[int] = None) -> List[Conversation]:
+        """Remove and return the conversations whose deadline has passed"""
+        now_ns = time.monotonic_ns() if now_ns is None else now_ns
+        expired = []
+        deadlines = self._deadlines
+        while deadlines and deadlines[0][0] <= now_ns:
+            _, conversation_id = heapq.heappop(deadlines)
+            conversation = self._open.get(conversation_id)
+            if conversation is not None and conversation.deadline_ns <= now_ns:
+                self._forget(conversation)
+                expired.append(conversation)
+        return expired
+    
+    def __contains__(self, conversation_id: str) -> bool:
+        return conversation_id in self._open
+    
+    def __len__(self) -> int:
+        return len(self._open)
+
+
+class Scheduler:
+    """Ready set of agents that have work to do
+    
+    Agents are woken when they receive a message, gain a belief, desire or
+    intention from outside their own step. Changes an agent makes during its
+    own step are handled by that step; whatever is left afterwards (queued
+    messages, unprocessed belief changes, pending intentions) keeps it ready.
+    The cycle loop only steps ready agents, and wait() returns as soon as an
+    agent is woken.
+    """
+    def __init__(self):
+        self._ready: Dict[int, "Agent"] = {}  # id(agent) -> agent, in wake order
+        self._stepping: Set[int] = set()
+        self._condition = threading.Condition()
+        self.woken = False  # An agent was woken since the last take_ready()
+        self.activity = 0  # Number of wake() calls, including ignored ones: a change counter
+    
+    def wake(self, agent: "Agent") -> None:
+        """Mark an agent as ready (ignored while it is being stepped)"""
+        with self._condition:
+            self.activity += 1
+            if id(agent) in self._stepping:
+                return
+            self._ready[id(agent)] = agent
+            self.woken = True
+            self._condition.notify_all()
+    
+    def wake_all(self, agents) -> None:
+        for agent in agents:
+            self.wake(agent)
+    
+    def take_ready(self) -> List["Agent"]:
+        """Remove and return the ready agents, which are now being stepped"""
+        with self._condition:
+            ready = list(self._ready.values())
+            self._ready.clear()
+            self._stepping.update(id(agent) for agent in ready)
+            self.woken = False
+        return ready
+    
+    def done(self, agent: "Agent") -> None:
+        """Finish an agent's step; it stays ready if work is left over"""
+        with self._condition:
+            self._stepping.discard(id(agent))
+            if agent.has_work():
+                self._ready[id(agent)] = agent
+    
+    def wait(self, timeout: float) -> bool:
+        """Wait up to `timeout` seconds for an agent to be woken; return whether one was"""
+        with self._condition:
+            if not self.woken and timeout > 0:
+                self._condition.wait(timeout)
+            return self.woken
+    
+    def __contains__(self, agent) -> bool:
+        return id(agent) in self._ready
+    
+    def __len__(self) -> int:
+        return len(self._ready)
+
+
+class Session:
+    """The beliefs, desires and intentions of one independent task, such as one user's analysis
+    
+    Every agent has a default session (key None) and creates a session per key
+    on first use. Work done for one key never sees or overwrites the state of
+    another, so many tasks can be pipelined through the same agents.
+    """
+    __slots__ = ("key", "agent", "beliefs", "desires", "intentions")
+    
+    def __init__(self, key, agent: "Agent", watched=()):
+        self.key = key
+        self.agent = agent
+        self.beliefs = BeliefStore()
+        for predicate in watched:
+            self.beliefs.watch(predicate)
+        self.desires = DesireAgenda()
+        self.intentions = IntentionSet()
+    
+    def has_work(self) -> bool:
+        """Check if the session has unprocessed belief changes or pending intentions"""
+        return self.beliefs.has_changes() or bool(self.intentions)
+    
+    def __repr__(self):
+        return f"Session({self.key!r} of {self.agent.name})"
+
+
+# The session being worked in; a context variable, so every thread and
+# asyncio task (which copies it when created) has its own
+_current_session: ContextVar[Optional[Session]] = ContextVar("current_session", default=None)
+
+
+def _is_plain_data(value) -> bool:
+    """Check if a value is built only from scalars, lists, tuples and str-keyed dicts"""
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return True
+    if isinstance(value, (list, tuple)):
+        return all(_is_plain_data(item) for item in value)
+    if isinstance(value, dict):
+        return all(isinstance(key, str) and _is_plain_data(item) for key, item in value.items())
+    return False
+
+
+# Speech acts that open a conversation awaiting an INFORM reply
+_REQUEST_ACTS = (SpeechAct.REQUEST, SpeechAct.QUERY)
+
+# Number of recent messages each agent keeps in memory
+MESSAGE_HISTORY_SIZE = 100
+
+# Default number of undelivered messages an agent's mailbox can hold
+MAILBOX_CAPACITY = 1000
+
+
 class Agent(ABC):
     """Base agent class with BDI architecture"""
     
     def __init__(self, name: str, agent_type: str = "generic"):
         self.name = name
         self.agent_type = agent_type
-        self.beliefs = set()  # Set of Belief objects
-        self.desires = []     # List of Desire objects
-        self.intentions = []  # List of Intention objects
+        self._default_session = Session(None, self)  # Beliefs, desires and intentions outside any session
+        self.sessions: Dict[Any, Session] = {None: self._default_session}  # Session key -> Session
+        self._ready_sessions: Dict[Any, None] = {}  # Keys of sessions with new work, in order
+        self.stepped_sessions: List[Session] = []  # Sessions run by the last step()
+        self.actions = ActionRegistry()  # Intention action -> handler
         self.completed_intentions = []  # History of completed intentions
-        self.message_queue = []  # Incoming messages
-        self.message_history = []  # All messages sent and received
-        self.log = []  # Activity log
+        self.message_queue = Mailbox(MAILBOX_CAPACITY)  # Incoming messages
+        self.dispatcher = None  # MessageDispatcher for deferred delivery, if any
+        self.asynchronous = False  # True while driven by the asyncio runtime
+        self.pending_tasks = set()  # In-flight asyncio tasks started by handlers
+        self.message_history = deque(maxlen=MESSAGE_HISTORY_SIZE)  # Recent messages sent and received
+        self.message_log = None  # Shared on-disk MessageLog, if the system keeps one
+        self.journal = None  # Shared event Journal, if the system keeps one
+        self.scheduler = None  # Scheduler to notify when work arrives, if any
+        self.log = ActivityLog(name)  # Bounded activity log
+        self.capabilities: Set[str] = set()  # Requests this agent can serve
+        self.subscriptions: Set[str] = set()  # Topics delivered to this agent by publish()
+        self.conversations = ConversationTable()  # Our requests awaiting replies
         
         # Add the agent to global registry
         agent_registry.append(self)
     
+    @property
+    def session(self) -> Session:
+        """The session being worked in (the default session outside in_session())"""
+        session = _current_session.get()
+        return session if session is not None and session.agent is self else self._default_session
+    
+    def get_session(self, key) -> Session:
+        """The session for `key`, created on first use (None is the default session)"""
+        session = self.sessions.get(key)
+        if session is None:
+            session = self.sessions[key] = Session(key, self, self._default_session.beliefs._watched)
+        return session
+    
+    @contextmanager
+    def in_session(self, key):
+        """Work in the session for `key` until the block ends
+        
+        Beliefs, desires and intentions then refer to that session's, messages
+        sent are tagged with its key, and asyncio tasks started by handlers
+        stay in it.
+        """
+        token = _current_session.set(self.get_session(key))
+        try:
+            yield self.session
+        finally:
+            _current_session.reset(token)
+    
+    def end_session(self, key) -> Optional[Session]:
+        """Forget a finished session and return it (the default session cannot be ended)"""
+        if key is None:
+            raise ValueError("The default session cannot be ended")
+        self._ready_sessions.pop(key, None)
+        session = self.sessions.pop(key, None)
+        if session is not None and self.journal is not None:
+            self._record("end", session)
+        return session
+    
+    @property
+    def beliefs(self) -> BeliefStore:
+        """The belief store of the current session"""
+        return self.session.beliefs
+    
+    @beliefs.setter
+    def beliefs(self, beliefs) -> None:
+        """Replace all beliefs of the current session (accepts a BeliefStore or any iterable of Belief)"""
+        session = self.session
+        self._replace_beliefs(session, beliefs)
+        if self.journal is not None:
+            self._record("beliefs", session, beliefs=[
+                {"predicate": belief.predicate, "value": belief.value, "confidence": belief.confidence,
+                 "t": monotonic_to_wall_ns(belief.created_ns)}
+                for belief in session.beliefs
+            ])
+    
+    @staticmethod
+    def _replace_beliefs(session: Session, beliefs) -> None:
+        store = beliefs if isinstance(beliefs, BeliefStore) else BeliefStore(beliefs)
+        # Keep existing subscriptions
+        for predicate in session.beliefs._watched:
+            store.watch(predicate)
+        session.beliefs = store
+    
+    @property
+    def desires(self) -> DesireAgenda:
+        """Desires of the current session, ordered by priority"""
+        return self.session.desires
+    
+    @desires.setter
+    def desires(self, desires: DesireAgenda) -> None:
+        self.session.desires = desires
+    
+    @property
+    def intentions(self) -> IntentionSet:
+        """Pending intentions of the current session"""
+        return self.session.intentions
+    
+    @intentions.setter
+    def intentions(self, intentions: IntentionSet) -> None:
+        self.session.intentions = intentions
+    
+    def watch(self, predicate: str) -> None:
+        """Track changes to a predicate in every session (see BeliefStore.watch)"""
+        for session in self.sessions.values():
+            session.beliefs.watch(predicate)
+    
+    def _note_work(self, session: Session) -> None:
+        """Mark a session as having new work and wake the agent"""
+        if session.key is not None:
+            self._ready_sessions[session.key] = None
+        if self.scheduler is not None:
+            self.scheduler.wake(self)
+    
+    def _record(self, kind: str, session: Session, created_ns: Optional[int] = None, **fields) -> None:
+        """Journal an event, tagged with its session unless it is the default one"""
+        if session.key is not None:
+            fields["s"] = session.key
+        self.journal.record(kind, self.name, created_ns, **fields)
+    
     def add_belief(self, belief: Belief) -> None:
         """Add a new belief or update existing one"""
-        # Remove any existing belief with the same predicate
-        self.beliefs = {b for b in self.beliefs if b.predicate != belief.predicate}
-        self.beliefs.add(belief)
-        self.log_activity(f"Updated belief: {belief}")
+        session = self.session
+        if session.beliefs.upsert(belief):
+            if self.journal is not None:
+                self._journal_belief(belief, session)
+            self._note_work(session)
+        self.log_activity("Updated belief: %s", belief, level=LogLevel.DEBUG)
+    
+    def add_beliefs(self, content: Dict[str, Any]) -> None:
+        """Add or update one belief per key of a message's content, logged once"""
+        session = self.session
+        upsert = session.beliefs.upsert
+        journal = self.journal
+        changed = False
+        for key, value in content.items():
+            belief = Belief(key, value)
+            if upsert(belief):
+                changed = True
+                if journal is not None:
+                    self._journal_belief(belief, session)
+        if changed:
+            self._note_work(session)
+        if self.log.level <= LogLevel.DEBUG:
+            self.log_activity("Updated beliefs: %s", list(content), level=LogLevel.DEBUG)
+    
+    def remove_belief(self, predicate: str) -> Optional[Belief]:
+        """Remove and return a belief of the current session, if any"""
+        session = self.session
+        belief = session.beliefs.remove(predicate)
+        if belief is not None:
+            if self.journal is not None:
+                self._record("retract", session, predicate=predicate)
+            self.log_activity("Removed belief: %s", predicate, level=LogLevel.DEBUG)
+        return belief
+    
+    def _journal_belief(self, belief: Belief, session: Session) -> None:
+        self._record("belief", session, belief.created_ns, predicate=belief.predicate,
+                     value=belief.value, confidence=belief.confidence)
     
     def get_belief(self, predicate: str) -> Optional[Belief]:
-        """Get a belief by predicate"""
-        for belief in self.beliefs:
-            if belief.predicate == predicate:
-                return belief
-        return None
+        """Get a belief of the current session by predicate"""
+        return self.session.beliefs.get(predicate)
     
     def add_desire(self, desire: Desire) -> None:
         """Add a new desire"""
-        self.desires.append(desire)
-        # Sort by priority (highest first)
-        self.desires.sort(key=lambda d: d.priority, reverse=True)
-        self.log_activity(f"Added desire: {desire}")
+        session = self.session
+        session.desires.add(desire)
+        if self.journal is not None:
+            self._record("desire", session, name=desire.name, priority=desire.priority)
+        self._note_work(session)
+        self.log_activity("Added desire: %s (priority=%.2f)", desire.name, desire.priority, level=LogLevel.DEBUG)
+    
+    def achieve_desire(self, desire: Desire) -> None:
+        """Mark a desire as achieved"""
+        desire.achieved = True
+        if self.journal is not None:
+            self._record("achieve", self.session, name=desire.name)
     
     def add_intention(self, intention: Intention) -> None:
         """Add a new intention"""
-        self.intentions.append(intention)
-        self.log_activity(f"Added intention: {intention}")
+        session = self.session
+        session.intentions.append(intention)
+        if self.journal is not None:
+            self._record("intention", session, intention.created_ns, action=intention.action,
+                         params=intention.params, desire=intention.desire.name if intention.desire else None)
+        self._note_work(session)
+        self.log_activity("Added intention: %s %s", intention.action, intention.params, level=LogLevel.DEBUG)
+    
+    def declare_capability(self, capability: str) -> None:
+        """Advertise a request this agent can serve, for directory lookups"""
+        self.capabilities.add(capability)
+        agent_registry.add_capability(self, capability)
+    
+    def subscribe(self, topic: str) -> None:
+        """Receive messages published on `topic`"""
+        self.subscriptions.add(topic)
+        agent_registry.subscribe(self, topic)
+    
+    def unsubscribe(self, topic: str) -> None:
+        self.subscriptions.discard(topic)
+        agent_registry.unsubscribe(self, topic)
+    
+    def register_action(self, action: str, handler: Callable[[Intention], bool]) -> None:
+        """Register the handler that executes intentions for an action"""
+        self.actions.register(action, handler)
+    
+    def execute_intentions(self) -> int:
+        """Run each pending intention's handler once; return how many completed
+        
+        Intentions added while handlers run are picked up on the next cycle.
+        """
+        completed = 0
+        for intention in self.intentions.pending():
+            handler = self.actions.get(intention.action)
+            if handler is None:
+                continue
+            self.log_activity("Executing intention: %s", intention.action, level=LogLevel.DEBUG)
+            self.actions.counts[intention.action] += 1
+            if handler(intention):
+                self.complete_intention(intention)
+                self.intentions.discard(intention)
+                completed += 1
+        return completed
     
     def complete_intention(self, intention: Intention) -> None:
         """Mark an intention as completed and move it to history"""
@@ -129,28 +1124,100 @@ class Agent(ABC):
         self.completed_intentions.append(intention)
         if len(self.completed_intentions) > 5:
             self.completed_intentions.pop(0)  # Remove oldest
-        self.log_activity(f"Completed intention: {intention.action}")
+        session = self.session
+        if self.journal is not None:
+            self._record("complete", session, action=intention.action, params=intention.params)
+        self._note_work(session)  # Counts as progress; may unblock the next intention
+        self.log_activity("Completed intention: %s", intention.action, level=LogLevel.DEBUG)
     
     def send_message(self, receiver, speech_act: SpeechAct, content: Dict[str, Any], conversation_id: Optional[str] = None) -> Message:
-        """Send a message to another agent"""
-        message = Message(self.name, receiver.name, speech_act, content, conversation_id)
+        """Send a message to another agent, tagged with the current session"""
+        message = Message(self.name, receiver.name, speech_act, content, conversation_id, self.session.key)
+        if speech_act in _REQUEST_ACTS:
+            self.conversations.open(message, self.request_key(receiver.name, content))
         self.message_history.append(message)
-        self.log_activity(f"Sent {speech_act.value} message to {receiver.name}")
-        receiver.receive_message(message)
+        # Messages are persisted once, by the sender
+        if self.message_log is not None:
+            self.message_log.append(message)
+        if self.journal is not None:
+            self.journal.record_message(message)
+        self.log_activity("Sent %s message to %s", speech_act.value, receiver.name, level=LogLevel.DEBUG)
+        if self.dispatcher is not None:
+            self.dispatcher.post(message, receiver)
+        else:
+            receiver.receive_message(message)
         return message
     
+    def publish(self, topic: str, content: Dict[str, Any], speech_act: SpeechAct = SpeechAct.INFORM,
+                conversation_id: Optional[str] = None) -> Message:
+        """Send one message to every subscriber of `topic` (except ourselves)
+        
+        A single Message with read-only content is shared by all receivers and
+        logged once; its receiver is recorded as "topic:<topic>", along with
+        the names of the subscribers it was delivered to.
+        """
+        message = Message(self.name, f"topic:{topic}", speech_act, MappingProxyType(dict(content)),
+                          conversation_id, self.session.key)
+        if speech_act in _REQUEST_ACTS:
+            self.conversations.open(message, self.request_key(message.receiver, content))
+        self.message_history.append(message)
+        subscribers = [agent for agent in agent_registry.subscribers(topic) if agent is not self]
+        if self.message_log is not None or self.journal is not None:
+            names = [agent.name for agent in subscribers]
+            if self.message_log is not None:
+                self.message_log.append(message, names)
+            if self.journal is not None:
+                self.journal.record_message(message, names)
+        
+        self.log_activity("Published %s message on %s to %s subscribers", speech_act.value, topic, len(subscribers), level=LogLevel.DEBUG)
+        for receiver in subscribers:
+            if self.dispatcher is not None:
+                self.dispatcher.post(message, receiver)
+            else:
+                receiver.receive_message(message)
+        return message
+    
+    def request_key(self, receiver: str, content: Dict[str, Any]):
+        """Key identifying equivalent requests: (receiver, requested action or query, session key)"""
+        return (receiver, content.get("action") or content.get("query"), self.session.key)
+    
     def receive_message(self, message: Message) -> None:
         """Receive a message from another agent"""
-        self.message_queue.append(message)
+        if not self.message_queue.append(message):
+            self.log_activity("Mailbox full, dropped %s message from %s", message.speech_act.value, message.sender)
+            return
         self.message_history.append(message)
-        self.log_activity(f"Received {message.speech_act.value} message from {message.sender}")
+        if self.scheduler is not None:
+            self.scheduler.wake(self)
+        self.log_activity("Received %s message from %s", message.speech_act.value, message.sender, level=LogLevel.DEBUG)
     
-    def log_activity(self, activity: str) -> None:
-        """Log an agent activity"""
-        timestamp = datetime.now().strftime("%H:%M:%S")
-        log_entry = f"[{timestamp}] {self.name}: {activity}"
-        self.log.append(log_entry)
+    def schedule(self, result):
+        """Run an awaitable returned by a rule handler
         
+        Inside a running event loop the awaitable becomes a task tracked in
+        pending_tasks, so slow handlers overlap instead of blocking the cycle;
+        otherwise it is run to completion. Other results are returned as-is.
+        """
+        if not inspect.isawaitable(result):
+            return result
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(_await(result))
+        task = loop.create_task(_await(result))
+        self.pending_tasks.add(task)
+        task.add_done_callback(self.pending_tasks.discard)
+        return task
+    
+    def log_activity(self, activity: str, *args, level: LogLevel = LogLevel.INFO) -> None:
+        """Log an agent activity
+        
+        `activity` is a %-style template filled in with `args` only when the
+        log is read, so hot paths should pass arguments instead of f-strings
+        (and check self.log.level before building costly ones).
+        """
+        self.log.record(level, activity, args)
+    
 
     @abstractmethod
     def execute(self) -> None:
@@ -159,38 +1226,151 @@ class Agent(ABC):
     
     def process_messages(self) -> bool:
         """Process messages in queue"""
-        if not self.message_queue:
+        queue = self.message_queue
+        if not queue:
             return False
         
-        # Process all messages
-        processed = len(self.message_queue) > 0
-        for message in self.message_queue:
-            self.interpret_message(message)
+        # Process the messages queued so far; anything arriving meanwhile waits for the next step
+        for _ in range(len(queue)):
+            message = queue.popleft()
+            if message.session is None:
+                self._interpret(message)
+                continue
+            # Interpret the message in the session it was sent from
+            self._ready_sessions[message.session] = None
+            token = _current_session.set(self.get_session(message.session))
+            try:
+                self._interpret(message)
+            finally:
+                _current_session.reset(token)
+        return True
+    
+    def _interpret(self, message: Message) -> None:
+        conversations = self.conversations
+        if type(message) is MessageBatch:
+            if conversations:
+                for part in message.messages:
+                    conversations.close(part.conversation_id)
+            self.interpret_batch(message)
+            return
+        if message.speech_act is SpeechAct.INFORM and conversations:
+            conversations.close(message.conversation_id)  # A reply to one of our requests
+        self.interpret_message(message)
+    
+    def has_work(self) -> bool:
+        """Check if stepping the agent now would have something to act on"""
+        return bool(self.message_queue) or bool(self._ready_sessions) or self._default_session.has_work()
+    
+    def get_state(self) -> Dict[str, Any]:
+        """The agent's mental state and plain-data attributes, for snapshots
         
-        self.message_queue = []
-        return processed
+        Handlers, logs and other wiring are rebuilt by the constructor, and
+        open conversations are not kept (their deadlines would be stale).
+        The default session's state is at the top level, other sessions' under
+        "sessions".
+        """
+        default = self._default_session
+        return {
+            "beliefs": list(default.beliefs),
+            "desires": list(default.desires),
+            "intentions": list(default.intentions),
+            "sessions": {
+                key: {
+                    "beliefs": list(session.beliefs),
+                    "desires": list(session.desires),
+                    "intentions": list(session.intentions)
+                }
+                for key, session in self.sessions.items() if key is not None
+            },
+            "completed_intentions": list(self.completed_intentions),
+            "action_counts": dict(self.actions.counts),
+            "mailbox": list(self.message_queue),
+            "attributes": {
+                key: value for key, value in vars(self).items()
+                if not key.startswith("_") and _is_plain_data(value)
+            }
+        }
+    
+    def set_state(self, state: Dict[str, Any]) -> None:
+        """Restore a state produced by get_state()"""
+        self.sessions = {None: self._default_session}
+        self._ready_sessions.clear()
+        sessions = dict(state.get("sessions", {}))
+        sessions[None] = state
+        for key, session_state in sessions.items():
+            session = self.get_session(key)
+            self._replace_beliefs(session, session_state["beliefs"])
+            session.beliefs.take_changes()  # Already acted on before the snapshot
+            session.desires = DesireAgenda(session_state["desires"])
+            session.intentions = IntentionSet(session_state["intentions"])
+            if key is not None and session.intentions:
+                self._ready_sessions[key] = None
+        self.completed_intentions = list(state["completed_intentions"])
+        self.actions.counts = Counter(state["action_counts"])
+        self.message_queue.clear()
+        for message in state["mailbox"]:
+            self.message_queue.append(message)
+        for key, value in state["attributes"].items():
+            setattr(self, key, value)
     
     @abstractmethod
     def interpret_message(self, message: Message) -> None:
         """Interpret and act on a message"""
         pass
     
+    def interpret_batch(self, batch: MessageBatch) -> None:
+        """Interpret coalesced INFORMs
+        
+        By default the merged content is interpreted as one message, so each
+        key is applied once; override to inspect the parts in batch.messages.
+        """
+        self.interpret_message(batch)
+    
     def step(self) -> bool:
-        """Perform one agent reasoning cycle (BDI loop)"""
+        """Perform one agent reasoning cycle (BDI loop)
+        
+        The default session is reasoned about on every step; other sessions
+        only when they have new work (a message, a change or a pending intention).
+        """
         # Process incoming messages
         messages_processed = self.process_messages()
         
-        # BDI cycle - only for non-reactive agents
-        if self.agent_type != "reactive":
-            self.deliberate()  # Update desires based on beliefs
-            self.plan()        # Create intentions based on desires
+        # Give up on requests that went unanswered for too long
+        if self.conversations:
+            for conversation in self.conversations.expire():
+                self.log_activity("Request %s timed out: %s", conversation.conversation_id, conversation.key)
         
-        # Execute is always called as it's required for all agent types
-        self.execute()     # Execute intentions
+        ready, self._ready_sessions = self._ready_sessions, {}
+        sessions = [self._default_session]
+        sessions.extend(self.sessions[key] for key in ready if key in self.sessions)
+        for session in sessions:
+            token = _current_session.set(session)
+            try:
+                # BDI cycle - only for non-reactive agents
+                if self.agent_type != "reactive":
+                    self.deliberate()  # Update desires based on beliefs
+                    self.plan()        # Create intentions based on desires
+                
+                # Execute is always called as it's required for all agent types
+                self.execute()     # Execute intentions
+            finally:
+                _current_session.reset(token)
+            
+            # Changes made while reasoning are picked up by this pass; only leftovers need another
+            if session.key is not None:
+                self._ready_sessions.pop(session.key, None)
+                if session.has_work():
+                    self._ready_sessions[session.key] = None
+        self.stepped_sessions = sessions
         
         # Return whether the agent did anything
-        return messages_processed or len(self.intentions) > 0
+        return messages_processed or any(session.intentions for session in sessions)
+
+
+async def _await(awaitable):
+    """Wrap any awaitable in a coroutine"""
+    return await awaitable
 
 
 # Global agent registry
-agent_registry = [] 
\ No newline at end of file
+agent_registry = AgentDirectory() 
\ No newline at end of file
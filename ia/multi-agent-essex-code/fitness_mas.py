@@ -1,18 +1,44 @@
 #!/usr/bin/env python3
 
+import asyncio
+import heapq
+import inspect
+import os
+import pickle
 import time
 import random
-from typing import Dict, List, Any
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any, Iterable, Iterator, Optional, Tuple
 
-from base_agent import agent_registry, SpeechAct
+from base_agent import agent_registry, monotonic_to_wall_ns, LogLevel, MessageDispatcher, Scheduler, SpeechAct, MAILBOX_CAPACITY
+from journal import Journal, replay
+from message_log import MessageLog
+from sharding import ShardedRunner
 from specialized_agents import FitnessDataAgent, AnalysisAgent, UserInterfaceAgent
 from fitness_ontology import fitness_ontology, convert_fitness_data_to_ontology, create_fitness_report_in_ontology
 
 
+# Format version of files written by FitnessMAS.snapshot()
+SNAPSHOT_VERSION = 1
+
+# Marks the end of analyze_batch()'s user ids (any value, even None, may be an id)
+_NO_MORE_USERS = object()
+
+
+def _shift_times(objects, shift_ns: int) -> None:
+    """Move created_ns stamps from a snapshot's monotonic clock to this process's"""
+    seen = set()
+    for obj in objects:
+        if id(obj) not in seen:
+            seen.add(id(obj))
+            obj.created_ns += shift_ns
+
+
 class FitnessMAS:
     """Multi-Agent System for fitness analysis and reporting"""
     
-    def __init__(self):
+    def __init__(self, message_log_dir: Optional[str] = None, mailbox_capacity: int = MAILBOX_CAPACITY,
+                 coalesce_messages: bool = True, journal_path: Optional[str] = None):
         # Clear any existing agents
         global agent_registry
         agent_registry.clear()
@@ -22,110 +48,560 @@ class FitnessMAS:
         self.analysis_agent = AnalysisAgent("AnalysisAgent")
         self.ui_agent = UserInterfaceAgent("UserInterfaceAgent")
         
+        # Optionally persist every message once, in a log shared by all agents
+        self.message_log = MessageLog(message_log_dir) if message_log_dir else None
+        
+        # Optionally record every state change, for replay (see replay())
+        self.journal = Journal(journal_path) if journal_path else None
+        fitness_ontology.journal = self.journal
+        
+        # Messages are delivered centrally at cycle boundaries, with INFORMs
+        # from one sender to one receiver coalesced per cycle
+        self.dispatcher = MessageDispatcher(coalesce=coalesce_messages)
+        
+        # Only agents with work to do are stepped
+        self.scheduler = Scheduler()
+        self.batch_stats: Dict[str, Any] = {}  # Progress of the last analyze_batch()
+        self.mailbox_capacity = mailbox_capacity
+        for agent in agent_registry:
+            self._attach(agent)
+        
         print("Fitness Multi-Agent System initialized with 3 specialized agents:")
         print(f"- {self.data_agent.name} (Reactive Agent)")
         print(f"- {self.analysis_agent.name} (Deliberative Agent)")
         print(f"- {self.ui_agent.name} (Hybrid Agent)")
     
     def start_analysis(self, user_id="default_user"):
-        """Start the fitness analysis process"""
-        print(f"\nStarting fitness analysis for user {user_id}...")
+        """Start the fitness analysis process
         
-        # UI agent initiates the process
-        self.ui_agent.send_message(
-            self.data_agent,
-            SpeechAct.REQUEST,
-            {"action": "retrieve_fitness_data", "user_id": user_id}
-        )
+        The analysis runs in a session keyed by `user_id` in every agent, so
+        analyses for different users can be started together without
+        overwriting each other's beliefs, desires and intentions.
+        """
+        print(f"\nStarting fitness analysis for user {user_id}...")
+        self._request_analysis(user_id)
         
         # Clear existing ontology instances for clean demo
         self._clear_ontology_instances()
     
+    def _request_analysis(self, user_id: str) -> None:
+        """Have the UI agent request the user's data, in the user's session"""
+        with self.ui_agent.in_session(user_id):
+            self.ui_agent.send_message(
+                self.data_agent,
+                SpeechAct.REQUEST,
+                {"action": "retrieve_fitness_data", "user_id": user_id}
+            )
+    
+    def get_report(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """The latest fitness report generated for a user, if any"""
+        return self.ui_agent.reports.get(user_id)
+    
     def _clear_ontology_instances(self):
         """Clear existing ontology instances for a fresh start"""
         fitness_ontology.instances = {}
     
+    def _attach(self, agent):
+        """Wire an agent into the system's message infrastructure"""
+        agent.message_log = self.message_log
+        agent.journal = self.journal
+        if self.journal is not None:
+            self.journal.record_agent(agent)
+        agent.dispatcher = self.dispatcher
+        agent.scheduler = self.scheduler
+        agent.message_queue.capacity = self.mailbox_capacity
+        self.dispatcher.register(agent)
+    
+    def add_agent(self, agent):
+        """Add an extra agent (already in the registry) to the system"""
+        if agent not in agent_registry:
+            agent_registry.append(agent)
+        self._attach(agent)
+        return agent
+    
+    def snapshot(self, path: str) -> None:
+        """Save the state of every agent, undelivered messages and ontology instances
+        
+        Everything goes into one pickle file, written to a temporary name and
+        then renamed so an interrupted snapshot never replaces a good one.
+        """
+        state = {
+            "version": SNAPSHOT_VERSION,
+            "wall_offset_ns": monotonic_to_wall_ns(0),
+            "agents": [(type(agent), agent.name, agent.get_state()) for agent in agent_registry],
+            "outbox": [(message, receiver.name) for message, receiver in self.dispatcher.pending()],
+            "ontology": fitness_ontology.instances
+        }
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "wb") as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, path)
+    
+    def restore(self, path: str) -> None:
+        """Load a file written by snapshot() into this system
+        
+        The file is read in one sequential read. Agents are matched by name;
+        agents missing from this system are created and added. Snapshots are
+        pickles, so only restore files you wrote yourself.
+        """
+        with open(path, "rb") as f:
+            state = pickle.loads(f.read())
+        if state.get("version") != SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported snapshot version {state.get('version')}")
+        
+        # Timestamps were taken on the snapshotting process's monotonic clock
+        shift_ns = state["wall_offset_ns"] - monotonic_to_wall_ns(0)
+        
+        # Shifted in one pass: a published message shared by several mailboxes
+        # (and the outbox) is one object and must move only once
+        if shift_ns:
+            objects = [message for message, _ in state["outbox"]]
+            for _, _, agent_state in state["agents"]:
+                objects += (agent_state["beliefs"] + agent_state["intentions"]
+                            + agent_state["completed_intentions"] + agent_state["mailbox"])
+                for session_state in agent_state.get("sessions", {}).values():
+                    objects += session_state["beliefs"] + session_state["intentions"]
+            _shift_times(objects, shift_ns)
+        
+        for agent_class, name, agent_state in state["agents"]:
+            agent = agent_registry.get(name)
+            if agent is None:
+                agent = self.add_agent(agent_class(name))
+            agent.set_state(agent_state)
+        
+        self.dispatcher.drain()
+        for message, receiver in state["outbox"]:
+            self.dispatcher.post(message, agent_registry.get(receiver))
+        
+        fitness_ontology.instances = state["ontology"]
+    
+    def replay(self, journal_path: str, until_cycle: Optional[int] = None) -> Dict[str, Any]:
+        """Rebuild the state recorded in a journal on this (fresh) system
+        
+        Replays every event up to the end of `until_cycle` (default: all),
+        without running handlers, sleeping or generating data; agents are
+        matched by name and created if missing. Returns replay statistics.
+        """
+        def create_agent(agent_class, name):
+            return agent_registry.get(name) or self.add_agent(agent_class(name))
+        
+        journal = Journal(journal_path)
+        try:
+            return replay(journal, create_agent, fitness_ontology, until_cycle)
+        finally:
+            journal.close()
+    
+    def set_log_level(self, level: LogLevel) -> None:
+        """Change the activity log level of every agent at runtime
+        
+        LogLevel.INFO drops hot-path records, LogLevel.OFF disables logging.
+        """
+        for agent in agent_registry:
+            agent.log.level = level
+    
     def process_user_command(self, command: str) -> str:
         """Process a user command via the UI agent"""
         return self.ui_agent.process_user_input(command)
     
-    def run_cycle(self, wait_time=0.2, max_cycles=15):
-        """Run the BDI reasoning cycle for all agents"""
-        for cycle in range(max_cycles):
-            any_activity = False
+    def run_cycle(self, wait_time=0.2, max_cycles=15, runtime="sync", workers=4):
+        """Run the BDI reasoning cycle until the system is quiescent or max_cycles
+        
+        runtime="threads" steps agents concurrently on a pool of `workers`
+        threads; runtime="processes" partitions the agents across `workers`
+        processes (see sharding.ShardedRunner); runtime="async" runs the cycle
+        on an asyncio event loop instead (see run_cycle_async). Returns the
+        number of cycles run.
+        """
+        return self._run(runtime, workers, wait_time, max_cycles=max_cycles)
+    
+    def run_until_quiescent(self, timeout: Optional[float] = None, runtime="sync", workers=4, wait_time=0.2) -> int:
+        """Run cycles until the system is quiescent; return the number of cycles
+        
+        Unlike run_cycle() there is no cycle limit: the run ends as soon as
+        is_quiescent() holds (for runtime="processes", the sharded equivalent),
+        or raises TimeoutError after `timeout` seconds.
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        return self._run(runtime, workers, wait_time, deadline=deadline)
+    
+    def _run(self, runtime, workers, wait_time, max_cycles=None, deadline=None) -> int:
+        if runtime == "processes":
+            try:
+                return ShardedRunner(list(agent_registry), self.dispatcher, shards=workers).run(max_cycles, deadline)
+            finally:
+                for agent in agent_registry:
+                    self._update_ontology(agent, agent.sessions.values())
+        if runtime == "async":
+            return asyncio.run(self.run_cycle_async(wait_time, max_cycles, deadline))
+        if runtime == "threads":
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="agent") as executor:
+                return self._run_cycles(wait_time, max_cycles, executor, deadline)
+        if runtime != "sync":
+            raise ValueError(f"Unknown runtime: {runtime}")
+        return self._run_cycles(wait_time, max_cycles, None, deadline)
+    
+    def pending_work(self) -> Dict[str, int]:
+        """Count the work left in the system (scans every agent)"""
+        return {
+            "undelivered_messages": len(self.dispatcher),
+            "queued_messages": sum(len(agent.message_queue) for agent in agent_registry),
+            "pending_intentions": sum(len(agent.intentions) for agent in agent_registry),
+            "running_tasks": sum(len(agent.pending_tasks) for agent in agent_registry),
+            "ready_agents": len(self.scheduler)
+        }
+    
+    def is_quiescent(self, activity_before: Optional[int] = None) -> bool:
+        """Check if no further cycle can change anything
+        
+        The system is quiescent when no message is undelivered and no agent is
+        ready (so no queued message, unprocessed belief change or pending
+        intention is left). Pending intentions alone do not count when the
+        last cycle, which began at scheduler activity `activity_before`, made
+        no change at all: their agents are blocked waiting for input that
+        nothing in the system will send. Running asyncio tasks are checked by
+        the async loop.
+        """
+        if self.dispatcher:
+            return False
+        if not self.scheduler:
+            return True
+        return activity_before is not None and self.scheduler.activity == activity_before
+    
+    def _check_deadline(self, deadline) -> None:
+        if deadline is not None and time.monotonic() >= deadline:
+            raise TimeoutError(f"System not quiescent before the timeout: {self.pending_work()}")
+    
+    def _step_agents(self, agents, executor=None, update_ontology=True) -> bool:
+        """Step the given agents once; return whether any agent was active
+        
+        With an executor the agents step concurrently. This is race-free because
+        during a step an agent only touches its own state: messages go to its
+        own dispatcher outbox and are delivered after every step has finished,
+        which acts as the cycle barrier. Shared state (the ontology) is only
+        updated after that barrier, in stepping order.
+        """
+        if executor is None:
+            results = []
+            for agent in agents:
+                results.append(agent.step())
+                self.scheduler.done(agent)
+                # Store data in ontology when available
+                if update_ontology:
+                    self._update_ontology(agent)
+        else:
+            results = list(executor.map(lambda agent: agent.step(), agents))
+            for agent in agents:
+                self.scheduler.done(agent)
+                if update_ontology:
+                    self._update_ontology(agent)
+        return any(results)
+    
+    def _run_cycles(self, wait_time, max_cycles=None, executor=None, deadline=None) -> int:
+        """Cycle loop shared by the sequential and thread-pool runtimes
+        
+        Every agent is stepped in the first cycle; after that only the agents
+        in the scheduler's ready set are. A new cycle starts immediately while
+        there is new work. If the only ready agents are ones still holding
+        pending intentions, the loop waits up to `wait_time` for new work first.
+        The loop ends once the system is quiescent.
+        """
+        self.scheduler.wake_all(agent_registry)
+        cycle = 0
+        while max_cycles is None or cycle < max_cycles:
+            self._check_deadline(deadline)
+            cycle += 1
+            if self.journal is not None:
+                self.journal.begin_cycle()
             
-            print(f"\nRunning agent cycle {cycle+1}...")
+            # Deliver messages sent since the last cycle boundary (waking their receivers)
+            self.dispatcher.deliver()
             
-            # Run each agent's reasoning cycle
+            print(f"\nRunning agent cycle {cycle}...")
+            
+            # Run the reasoning cycle of each agent with work to do
+            activity = self.scheduler.activity
+            self._step_agents(self.scheduler.take_ready(), executor)
+            
+            if self.is_quiescent(activity):
+                print(f"All agents idle, stopping after {cycle} cycles")
+                break
+            
+            # Back off only while nothing new has happened
+            if not self.scheduler.woken and not self.dispatcher:
+                self.scheduler.wait(wait_time)
+        return cycle
+    
+    def analyze_batch(self, user_ids: Iterable[str], concurrency: int = 250, runtime="sync",
+                      workers=4, wait_time=0.2) -> Iterator[Tuple[str, Optional[Dict[str, Any]]]]:
+        """Analyze many users as a pipeline, yielding (user_id, report) as reports complete
+        
+        Up to `concurrency` analyses are in flight at once, each in its own
+        session, and a new one starts as soon as one finishes, so retrieval,
+        analysis and report generation for different users overlap in every
+        cycle. `user_ids` is consumed lazily. With runtime="async" the data
+        retrievals of all in-flight users overlap; "threads" steps the agents
+        concurrently. Each agent receives up to about two messages per
+        in-flight user per cycle, so keep `concurrency` well below the
+        mailbox capacity.
+        
+        Reports are yielded in completion order; an analysis that stalls
+        (for instance because a message was dropped) is yielded with None
+        once nothing else is running. Finished sessions are ended in every
+        agent and the ontology is not updated, so memory stays bounded by
+        `concurrency`; closing the generator early ends the sessions still
+        in flight. A user id of None is rejected with ValueError, since None
+        is the key of the default session. A repeated user id is analyzed
+        again, once its earlier analysis has finished, so there is one result
+        per input id. Progress is kept in `batch_stats`: users, failed,
+        cycles, seconds and users_per_second.
+        """
+        if runtime not in ("sync", "threads", "async"):
+            raise ValueError(f"Unknown runtime: {runtime}")
+        pending_users = iter(user_ids)
+        in_flight = set()
+        deferred = []  # Repeated ids waiting for their earlier analysis to finish
+        ui_agent = self.ui_agent
+        stats = self.batch_stats = {"users": 0, "failed": 0, "cycles": 0, "seconds": 0.0, "users_per_second": 0.0}
+        start = time.perf_counter()
+        
+        def finish(user_id, report):
+            in_flight.discard(user_id)
             for agent in agent_registry:
-                active = agent.step()
-                any_activity = any_activity or active
+                agent.end_session(user_id)
+            stats["users"] += 1
+            stats["failed"] += report is None
+            stats["seconds"] = time.perf_counter() - start
+            stats["users_per_second"] = stats["users"] / stats["seconds"] if stats["seconds"] else 0.0
+            return user_id, report
+        
+        executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="agent") if runtime == "threads" else None
+        loop = asyncio.new_event_loop() if runtime == "async" else None
+        for agent in agent_registry:
+            agent.asynchronous = loop is not None
+        self.scheduler.wake_all(agent_registry)
+        try:
+            while True:
+                # Keep the pipeline full
+                while len(in_flight) < concurrency:
+                    user_id = next((user_id for user_id in deferred if user_id not in in_flight), _NO_MORE_USERS)
+                    if user_id is not _NO_MORE_USERS:
+                        deferred.remove(user_id)
+                    elif len(deferred) >= concurrency:
+                        break
+                    else:
+                        user_id = next(pending_users, _NO_MORE_USERS)
+                        if user_id is _NO_MORE_USERS:
+                            break
+                        if user_id is None:
+                            raise ValueError("analyze_batch() user ids cannot be None")
+                        if user_id in in_flight:
+                            deferred.append(user_id)
+                            continue
+                    self._request_analysis(user_id)
+                    in_flight.add(user_id)
+                if not in_flight:
+                    break
                 
-                # Store data in ontology when available
-                self._update_ontology(agent)
+                stats["cycles"] += 1
+                if self.journal is not None:
+                    self.journal.begin_cycle()
+                activity = self.scheduler.activity
+                if loop is not None:
+                    running = loop.run_until_complete(self._batch_cycle_async(wait_time))
+                else:
+                    self.dispatcher.deliver()
+                    self._step_agents(self.scheduler.take_ready(), executor, update_ontology=False)
+                    running = False
                 
-            # If no agent did anything, we can stop
-            if not any_activity and cycle > 0:
-                print(f"All agents idle, stopping after {cycle+1} cycles")
-                break
+                # Reports are compiled by the UI agent, in the user's session
+                for session in ui_agent.stepped_sessions:
+                    report = ui_agent.reports.pop(session.key, None)
+                    if report is not None and session.key in in_flight:
+                        yield finish(session.key, report)
                 
-            # Wait between cycles
-            time.sleep(wait_time)
+                # Nothing left can complete the remaining analyses
+                if not running and self.is_quiescent(activity):
+                    for user_id in list(in_flight):
+                        yield finish(user_id, None)
+        finally:
+            # Analyses abandoned by an early close (or an error) leave no sessions behind
+            for user_id in in_flight:
+                for agent in agent_registry:
+                    agent.end_session(user_id)
+            if executor is not None:
+                executor.shutdown()
+            if loop is not None:
+                for agent in agent_registry:
+                    agent.asynchronous = False
+                    for task in list(agent.pending_tasks):
+                        task.cancel()
+                loop.run_until_complete(asyncio.sleep(0))  # Let cancelled tasks finish
+                loop.close()
     
-    def _update_ontology(self, agent):
-        """Update ontology with agent's belief data"""
-        fitness_data = agent.get_belief("fitness_data")
-        if fitness_data and hasattr(fitness_data, "value"):
-            # Store fitness data in ontology
-            convert_fitness_data_to_ontology(fitness_data.value)
+    async def _batch_cycle_async(self, wait_time) -> bool:
+        """One analyze_batch() cycle on the event loop; return whether handler tasks are running"""
+        self.dispatcher.deliver()
+        for agent in self.scheduler.take_ready():
+            active = agent.step()
+            if inspect.isawaitable(active):
+                await active
+            self.scheduler.done(agent)
         
-        # Store report in ontology if available
-        report = agent.get_belief("fitness_report")
-        if report and hasattr(report, "value"):
-            create_fitness_report_in_ontology(report.value)
+        in_flight = set()
+        for agent in agent_registry:
+            in_flight.update(agent.pending_tasks)
+        if in_flight and not self.scheduler.woken and not self.dispatcher:
+            # Only tasks can produce new work: wait until one finishes
+            await asyncio.wait(in_flight, timeout=wait_time if self.scheduler else None,
+                               return_when=asyncio.FIRST_COMPLETED)
+        else:
+            await asyncio.sleep(0)
+        return any(agent.pending_tasks for agent in agent_registry)
+    
+    async def run_cycle_async(self, wait_time=0.2, max_cycles=15, deadline=None):
+        """Run the BDI reasoning cycle on an asyncio event loop
+        
+        Agent steps may be coroutines, and rule handlers that return awaitables
+        (such as FitnessDataAgent's data retrieval) run as tasks, so many
+        fetches are in flight at once on a single thread. Ticks and idle waits
+        await instead of blocking. Running tasks keep the system from being
+        quiescent. `deadline` is a time.monotonic() value after which
+        TimeoutError is raised.
+        """
+        for agent in agent_registry:
+            agent.asynchronous = True
+        self.scheduler.wake_all(agent_registry)
+        cycle = 0
+        try:
+            while max_cycles is None or cycle < max_cycles:
+                self._check_deadline(deadline)
+                cycle += 1
+                if self.journal is not None:
+                    self.journal.begin_cycle()
+                
+                # Deliver messages sent since the last cycle boundary
+                self.dispatcher.deliver()
+                
+                print(f"\nRunning agent cycle {cycle}...")
+                
+                # Run the reasoning cycle of each agent with work to do
+                activity = self.scheduler.activity
+                for agent in self.scheduler.take_ready():
+                    active = agent.step()
+                    if inspect.isawaitable(active):
+                        active = await active
+                    self.scheduler.done(agent)
+                    
+                    # Store data in ontology when available
+                    self._update_ontology(agent)
+                
+                in_flight = set()
+                for agent in agent_registry:
+                    in_flight.update(agent.pending_tasks)
+                
+                if not in_flight and self.is_quiescent(activity):
+                    print(f"All agents idle, stopping after {cycle} cycles")
+                    break
+                
+                if self.scheduler.woken or self.dispatcher:
+                    # New work: start the next cycle right away, letting tasks run first
+                    await asyncio.sleep(0)
+                elif in_flight:
+                    # Only tasks can produce new work: wake as soon as one finishes
+                    timeout = wait_time if self.scheduler else None
+                    if deadline is not None:
+                        remaining = max(0, deadline - time.monotonic())
+                        timeout = remaining if timeout is None else min(timeout, remaining)
+                    await asyncio.wait(in_flight, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                else:
+                    # Only pending intentions: back off without blocking in-flight tasks
+                    await asyncio.sleep(wait_time)
+        finally:
+            for agent in agent_registry:
+                agent.asynchronous = False
+                for task in list(agent.pending_tasks):
+                    task.cancel()
+        return cycle
+    
+    def _update_ontology(self, agent, sessions=None):
+        """Update ontology with agent's belief data
+        
+        Only the sessions the agent reasoned about in its last step are read,
+        unless `sessions` is given.
+        """
+        for session in agent.stepped_sessions if sessions is None else sessions:
+            fitness_data = session.beliefs.get("fitness_data")
+            if fitness_data and hasattr(fitness_data, "value"):
+                # Store fitness data in ontology
+                convert_fitness_data_to_ontology(fitness_data.value)
+            
+            # Store report in ontology if available
+            report = session.beliefs.get("fitness_report")
+            if report and hasattr(report, "value"):
+                create_fitness_report_in_ontology(report.value)
+    
+    @staticmethod
+    def _sessions_with(agent, attribute):
+        """(label, session) for the agent's sessions whose `attribute` is not empty"""
+        return [
+            ("" if key is None else f"  [session {key}]", session)
+            for key, session in agent.sessions.items() if getattr(session, attribute)
+        ]
     
     def display_agent_beliefs(self):
-        """Display the current beliefs of all agents"""
+        """Display the current beliefs of all agents, by session"""
         print("\n=== AGENT BELIEFS ===")
         for agent in agent_registry:
             print(f"\n{agent.name} ({agent.agent_type} agent) Beliefs:")
-            if not agent.beliefs:
+            sessions = self._sessions_with(agent, "beliefs")
+            if not sessions:
                 print("  No beliefs")
-            for belief in agent.beliefs:
-                # Truncate large belief values for display
-                value_str = str(belief.value)
-                if len(value_str) > 100:
-                    value_str = value_str[:100] + "..."
-                print(f"  • {belief.predicate}: {value_str}")
+            for label, session in sessions:
+                if label:
+                    print(label)
+                for belief in session.beliefs:
+                    # Truncate large belief values for display
+                    value_str = str(belief.value)
+                    if len(value_str) > 100:
+                        value_str = value_str[:100] + "..."
+                    print(f"  • {belief.predicate}: {value_str}")
     
     def display_agent_desires(self):
-        """Display the current desires of all agents"""
+        """Display the current desires of all agents, by session"""
         print("\n=== AGENT DESIRES ===")
         for agent in agent_registry:
             print(f"\n{agent.name} ({agent.agent_type} agent) Desires:")
-            if not agent.desires:
+            sessions = self._sessions_with(agent, "desires")
+            if not sessions:
                 print("  No active desires")
-            for desire in agent.desires:
-                status = "✓" if desire.achieved else "○"
-                print(f"  {status} {desire.name} (priority: {desire.priority:.2f})")
+            for label, session in sessions:
+                if label:
+                    print(label)
+                for desire in session.desires:
+                    status = "✓" if desire.achieved else "○"
+                    print(f"  {status} {desire.name} (priority: {desire.priority:.2f})")
     
     def display_agent_intentions(self):
-        """Display the current intentions of all agents"""
+        """Display the current intentions of all agents, by session"""
         print("\n=== AGENT INTENTIONS ===")
         for agent in agent_registry:
             print(f"\n{agent.name} ({agent.agent_type} agent) Intentions:")
             
             # Display active intentions
-            if not agent.intentions:
+            sessions = self._sessions_with(agent, "intentions")
+            if not sessions:
                 print("  No active intentions")
             else:
                 print("  Active intentions:")
-                for intention in agent.intentions:
-                    status = "✓" if intention.completed else "○"
-                    print(f"    {status} {intention.action}")
-                    print(f"        params: {intention.params}")
-                    if intention.desire:
-                        print(f"        for desire: {intention.desire.name}")
+                for label, session in sessions:
+                    if label:
+                        print(label)
+                    for intention in session.intentions:
+                        status = "✓" if intention.completed else "○"
+                        print(f"    {status} {intention.action}")
+                        print(f"        params: {intention.params}")
+                        if intention.desire:
+                            print(f"        for desire: {intention.desire.name}")
             
             # Display recently completed intentions
             if agent.completed_intentions:
@@ -135,25 +611,32 @@ class FitnessMAS:
                     print(f"        params: {intention.params}")
                     if intention.desire:
                         print(f"        for desire: {intention.desire.name}")
+            
+            # Display how often each action has been executed
+            if agent.actions.counts:
+                counts = ", ".join(f"{action} x{count}" for action, count in agent.actions.counts.items())
+                print(f"\n  Action executions: {counts}")
     
     def display_communication_log(self, max_messages=10):
         """Display the recent communications between agents"""
         print("\n=== AGENT COMMUNICATION LOG ===")
         
-        # Collect all messages from agents
-        all_messages = []
-        for agent in agent_registry:
-            all_messages.extend(agent.message_history)
-        
-        # Sort by timestamp and take most recent
-        all_messages.sort(key=lambda m: m.timestamp, reverse=True)
-        recent_messages = all_messages[:max_messages]
+        if self.message_log is not None:
+            recent_messages = self.message_log.recent(max_messages)
+        else:
+            # Merge the in-memory tails; sender and receiver share message objects
+            unique_messages = {}
+            for agent in agent_registry:
+                for message in agent.message_history:
+                    unique_messages[id(message)] = message
+            recent_messages = heapq.nlargest(max_messages, unique_messages.values(), key=lambda m: m.created_ns)
+            recent_messages.reverse()
         
         if not recent_messages:
             print("  No messages exchanged yet")
         
-        # Display in reverse order to show most recent last
-        for msg in reversed(recent_messages):
+        # Display oldest first to show most recent last
+        for msg in recent_messages:
             print(f"  {msg.timestamp.strftime('%H:%M:%S')} | {msg.sender} → {msg.receiver}: " 
                   f"{msg.speech_act.value.upper()} {str(msg.content)[:50]}")
     
@@ -66,6 +66,7 @@ class FitnessOntology:
         self.classes = {}
         self.relations = {}
         self.instances = {}
+        self.journal = None  # Event journal recording inserts, if any
         
         # Define the ontology
         self._build_ontology()
@@ -133,6 +134,8 @@ class FitnessOntology:
                 "type": class_name,
                 "data": data
             }
+            if self.journal is not None:
+                self.journal.record("ontology", None, class_name=class_name, instance_id=instance_id, data=data)
             return True
         return False
     
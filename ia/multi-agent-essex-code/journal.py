@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+
+import importlib
+import json
+import os
+import threading
+import time
+from array import array
+from types import MappingProxyType
+from typing import Dict, List, Any, Callable, Iterator, Optional
+
+from base_agent import (Agent, Belief, Desire, Intention, Message, SpeechAct,
+                        monotonic_to_wall_ns, wall_to_monotonic_ns)
+
+
+def _encode(value):
+    """JSON form of the non-JSON values that occur in events; anything else is an error"""
+    if isinstance(value, (memoryview, array)):
+        return value.tolist()
+    if isinstance(value, MappingProxyType):
+        return dict(value)
+    raise TypeError(f"Cannot journal a value of type {type(value).__name__}: {value!r}")
+
+
+class Journal:
+    """Append-only journal of every state-changing event in a MAS
+
+    Each event is one JSON line: {"n": sequence number, "c": cycle,
+    "t": wall-clock ns, "k": kind, "a": agent, ...kind-specific fields}.
+    Kinds are "agent", "cycle", "send", "belief", "beliefs" (all beliefs of a
+    session replaced), "retract" (a belief removed), "desire", "achieve",
+    "intention", "complete", "end" (a session ended) and "ontology". Events in an agent session other
+    than the default one (and messages sent from one) carry its key as "s";
+    published messages list their subscribers as "to".
+    The cycle number advances with begin_cycle() and continues across runs
+    when an existing file is reopened.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.sequence = 0
+        self.cycle = 0
+        self._lock = threading.Lock()
+
+        # Resume numbering after the events of a previous run
+        if os.path.exists(path):
+            for event in self.events():
+                self.sequence = event["n"] + 1
+                self.cycle = event["c"]
+        self._file = open(path, "a", encoding="utf-8")
+
+    def record(self, kind: str, agent: Optional[str], created_ns: Optional[int] = None, **fields) -> None:
+        """Append an event; `created_ns` is the monotonic time it happened (default: now)
+
+        Raises TypeError for values that JSON cannot represent, rather than
+        writing an event that would replay differently.
+        """
+        event = {
+            "t": monotonic_to_wall_ns(time.monotonic_ns() if created_ns is None else created_ns),
+            "k": kind,
+            "a": agent
+        }
+        event.update(fields)
+        with self._lock:
+            event["n"] = self.sequence
+            event["c"] = self.cycle
+            line = json.dumps(event, default=_encode)
+            self.sequence += 1
+            self._file.write(line + "\n")
+
+    def record_agent(self, agent: Agent) -> None:
+        cls = type(agent)
+        self.record("agent", agent.name, cls=f"{cls.__module__}.{cls.__qualname__}")
+
+    def record_message(self, message: Message, receivers: Optional[List[str]] = None) -> None:
+        fields = {} if message.session is None else {"s": message.session}
+        if receivers is not None:
+            fields["to"] = receivers
+        self.record("send", message.sender, message.created_ns,
+                    receiver=message.receiver, act=message.speech_act.value,
+                    content=dict(message.content), conversation=message.conversation_id, **fields)
+
+    def begin_cycle(self) -> int:
+        """Start the next cycle; later events are stamped with its number"""
+        with self._lock:
+            self.cycle += 1
+        self.record("cycle", None)
+        return self.cycle
+
+    def flush(self) -> None:
+        with self._lock:
+            self._file.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+    def events(self, until_cycle: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """Stream recorded events in order, optionally only up to the end of `until_cycle`"""
+        if getattr(self, "_file", None) is not None and not self._file.closed:
+            self.flush()
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                event = json.loads(line)
+                if until_cycle is not None and event["c"] > until_cycle:
+                    break
+                yield event
+
+    def __len__(self) -> int:
+        return self.sequence
+
+
+def _load_class(path: str) -> type:
+    module, _, name = path.rpartition(".")
+    return getattr(importlib.import_module(module), name)
+
+
+def replay(journal: Journal, create_agent: Callable[[type, str], Agent], ontology,
+           until_cycle: Optional[int] = None) -> Dict[str, Any]:
+    """Rebuild agent state and ontology instances from a journal
+
+    Events are applied directly to the agents' stores: no handlers run, so
+    there are no sleeps, no random data and no new messages. Messages sent
+    after the last replayed cycle began were not delivered by then, so they
+    are posted to their receivers' dispatcher again. `create_agent`
+    returns the (fresh) agent to rebuild for a recorded class and name.
+    Desires and intentions are matched by name, action and params within
+    their session when they are achieved or completed. Returns statistics
+    about the replay.
+    """
+    agents: Dict[str, Agent] = {}
+    undelivered = []  # (message, receiver names) sent since the last cycle began
+    applied = 0
+    cycle = 0
+    start = time.perf_counter()
+
+    for event in journal.events(until_cycle):
+        kind = event["k"]
+        agent = agents.get(event["a"])
+        session = agent.get_session(event.get("s")) if agent is not None else None
+        created_ns = wall_to_monotonic_ns(event["t"])
+        cycle = event["c"]
+
+        if kind == "belief":
+            belief = Belief(event["predicate"], event["value"], event["confidence"])
+            belief.created_ns = created_ns
+            session.beliefs.upsert(belief)
+        elif kind == "beliefs":
+            beliefs = []
+            for fields in event["beliefs"]:
+                belief = Belief(fields["predicate"], fields["value"], fields["confidence"])
+                belief.created_ns = wall_to_monotonic_ns(fields["t"])
+                beliefs.append(belief)
+            agent._replace_beliefs(session, beliefs)
+        elif kind == "retract":
+            session.beliefs.remove(event["predicate"])
+        elif kind == "end":
+            agent.end_session(event["s"])
+        elif kind == "send":
+            message = Message(event["a"], event["receiver"], SpeechAct(event["act"]),
+                              event["content"], event["conversation"], event.get("s"))
+            message.created_ns = created_ns
+            agent.message_history.append(message)
+            receivers = event.get("to")
+            if receivers is not None:
+                message.content = MappingProxyType(message.content)
+            undelivered.append((message, [event["receiver"]] if receivers is None else receivers))
+        elif kind == "desire":
+            session.desires.add(Desire(event["name"], event["priority"]))
+        elif kind == "achieve":
+            for desire in session.desires:
+                if desire.name == event["name"] and not desire.achieved:
+                    desire.achieved = True
+                    break
+        elif kind == "intention":
+            desire = session.desires.get(event["desire"]) if event["desire"] else None
+            intention = Intention(event["action"], event["params"], desire)
+            intention.created_ns = created_ns
+            session.intentions.append(intention)
+        elif kind == "complete":
+            for intention in session.intentions:
+                if intention.action == event["action"] and intention.params == event["params"]:
+                    session.intentions.discard(intention)
+                    intention.completed = True
+                    agent.completed_intentions.append(intention)
+                    if len(agent.completed_intentions) > 5:
+                        agent.completed_intentions.pop(0)
+                    break
+        elif kind == "ontology":
+            ontology.instances[event["instance_id"]] = {"type": event["class_name"], "data": event["data"]}
+        elif kind == "agent":
+            agents[event["a"]] = create_agent(_load_class(event["cls"]), event["a"])
+        elif kind == "cycle":
+            # Every cycle starts by delivering what was sent before it
+            undelivered.clear()
+        applied += 1
+
+    for message, receivers in undelivered:
+        sender = agents[message.sender]
+        for name in receivers:
+            if sender.dispatcher is not None:
+                sender.dispatcher.post(message, agents[name])
+            else:
+                agents[name].receive_message(message)
+
+    # Rules only react to changes made after the replayed state
+    for agent in agents.values():
+        for session in agent.sessions.values():
+            session.beliefs.take_changes()
+
+    elapsed = time.perf_counter() - start
+    return {
+        "events": applied,
+        "cycles": cycle,
+        "seconds": elapsed,
+        "events_per_second": applied / elapsed if elapsed else float("inf")
+    }
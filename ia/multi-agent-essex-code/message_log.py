@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+
+import heapq
+import json
+import os
+import threading
+from datetime import datetime
+from typing import Dict, List, Any, Iterator, Optional, Sequence, Set
+
+from base_agent import Message, monotonic_to_wall_ns, wall_to_monotonic_ns
+
+
+class Segment:
+    """Metadata for one on-disk segment of the message log
+
+    Messages are not necessarily written in time order (shards and threads
+    append in turn), so the time range is the earliest and latest message
+    time rather than those of the first and last messages written.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.count = 0
+        self.min_ns = None  # Wall-clock time of the earliest message
+        self.max_ns = None  # Wall-clock time of the latest message
+        self.agents: Set[str] = set()  # Senders, receivers and topic subscribers in this segment
+
+    def add(self, record: Dict[str, Any]) -> None:
+        """Account for a record written to this segment"""
+        t = record["t"]
+        if self.min_ns is None or t < self.min_ns:
+            self.min_ns = t
+        if self.max_ns is None or t > self.max_ns:
+            self.max_ns = t
+        self.agents.add(record["s"])
+        self.agents.add(record["r"])
+        self.agents.update(record.get("d", ()))
+        self.count += 1
+
+    def overlaps(self, start_ns: Optional[int], end_ns: Optional[int]) -> bool:
+        """Check if any message in the segment may fall in [start_ns, end_ns]"""
+        if self.min_ns is None:
+            return False
+        if start_ns is not None and self.max_ns < start_ns:
+            return False
+        if end_ns is not None and self.min_ns > end_ns:
+            return False
+        return True
+
+
+class MessageLog:
+    """Append-only message log shared by all agents, stored as on-disk segments
+
+    Each message is written once, as a JSON line, to the newest segment file;
+    a new segment is started every `segment_size` messages. Only small
+    per-segment metadata (time range and agents involved) is kept in memory,
+    so queries stream matching segments from disk instead of loading the
+    whole history.
+    """
+
+    SEGMENT_PREFIX = "segment-"
+    SEGMENT_SUFFIX = ".jsonl"
+
+    def __init__(self, directory: str, segment_size: int = 10000):
+        self.directory = directory
+        self.segment_size = segment_size
+        self.segments: List[Segment] = []
+        self._file = None
+        self._lock = threading.Lock()
+
+        os.makedirs(directory, exist_ok=True)
+        self._load_segments()
+
+    def _load_segments(self) -> None:
+        """Rebuild segment metadata from files left by a previous run"""
+        names = sorted(
+            name for name in os.listdir(self.directory)
+            if name.startswith(self.SEGMENT_PREFIX) and name.endswith(self.SEGMENT_SUFFIX)
+        )
+        for name in names:
+            segment = Segment(os.path.join(self.directory, name))
+            for record in self._read_segment(segment):
+                segment.add(record)
+            self.segments.append(segment)
+
+    def _open_segment(self) -> None:
+        """Start a new segment file"""
+        if self._file is not None:
+            self._file.close()
+        name = f"{self.SEGMENT_PREFIX}{len(self.segments) + 1:06d}{self.SEGMENT_SUFFIX}"
+        segment = Segment(os.path.join(self.directory, name))
+        self.segments.append(segment)
+        self._file = open(segment.path, "a", encoding="utf-8")
+
+    def append(self, message: Message, receivers: Optional[Sequence[str]] = None) -> None:
+        """Persist a message
+
+        `receivers` names the agents a published message was delivered to
+        (its receiver is "topic:<topic>"), so queries by agent find it.
+        """
+        record = {
+            "t": monotonic_to_wall_ns(message.created_ns),
+            "s": message.sender,
+            "r": message.receiver,
+            "a": message.speech_act.value,
+            "c": message.conversation_id,
+            "m": dict(message.content)
+        }
+        if message.session is not None:
+            record["e"] = message.session
+        if receivers is not None:
+            record["d"] = list(receivers)
+        line = json.dumps(record, default=str) + "\n"
+
+        with self._lock:
+            if self._file is None or self.segments[-1].count >= self.segment_size:
+                self._open_segment()
+            self._file.write(line)
+            self.segments[-1].add(record)
+
+    def flush(self) -> None:
+        """Flush buffered writes to disk"""
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+
+    def close(self) -> None:
+        """Close the current segment file"""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def _read_segment(self, segment: Segment) -> Iterator[Dict[str, Any]]:
+        """Stream the raw records of a segment"""
+        with open(segment.path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+    @staticmethod
+    def _to_message(record: Dict[str, Any]) -> Message:
+        """Rebuild a Message from a stored record, keeping its original time"""
+        message = Message(record["s"], record["r"], record["a"], record["m"], record["c"], record.get("e"))
+        message.created_ns = wall_to_monotonic_ns(record["t"])
+        return message
+
+    def query(self, start: Optional[datetime] = None, end: Optional[datetime] = None,
+              agent: Optional[str] = None, conversation_id: Optional[str] = None) -> Iterator[Message]:
+        """Stream logged messages matching all given filters, in the order they were logged
+
+        `agent` matches the sender, the receiver or a subscriber a published
+        message was delivered to. Segments whose time
+        range or agent set cannot match are skipped without being read.
+        """
+        start_ns = int(start.timestamp() * 1e9) if start else None
+        end_ns = int(end.timestamp() * 1e9) if end else None
+        self.flush()
+
+        for segment in list(self.segments):
+            if not segment.overlaps(start_ns, end_ns):
+                continue
+            if agent is not None and agent not in segment.agents:
+                continue
+            for record in self._read_segment(segment):
+                if start_ns is not None and record["t"] < start_ns:
+                    continue
+                if end_ns is not None and record["t"] > end_ns:
+                    continue
+                if (agent is not None and agent != record["s"] and agent != record["r"]
+                        and agent not in record.get("d", ())):
+                    continue
+                if conversation_id is not None and record["c"] != conversation_id:
+                    continue
+                yield self._to_message(record)
+
+    def recent(self, count: int) -> List[Message]:
+        """The `count` messages with the latest times, oldest first (ties in logging order)"""
+        if count <= 0:
+            return []
+        self.flush()
+        segments = list(self.segments)
+        needed = count
+        first_segment = len(segments)
+        # Find the newest segments that together hold enough messages
+        while first_segment > 0 and needed > 0:
+            first_segment -= 1
+            needed -= segments[first_segment].count
+        records = [record for segment in segments[first_segment:] for record in self._read_segment(segment)]
+        # Older segments can still hold later messages than some of those
+        if first_segment > 0 and len(records) >= count:
+            cutoff = heapq.nlargest(count, (record["t"] for record in records))[-1]
+            older = [segment for segment in segments[:first_segment] if segment.max_ns >= cutoff]
+            records[:0] = [record for segment in older for record in self._read_segment(segment)]
+        latest = heapq.nlargest(count, enumerate(records), key=lambda item: (item[1]["t"], item[0]))
+        return [self._to_message(record) for _, record in reversed(latest)]
+
+    def __len__(self) -> int:
+        return sum(segment.count for segment in self.segments)
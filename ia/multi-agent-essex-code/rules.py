@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+
+import json
+import math
+import operator
+import os
+from functools import lru_cache
+from typing import Dict, List, Any, Mapping, Optional, Sequence, Tuple, Union
+
+try:
+    import numpy as np
+except ImportError:  # Optional: batches are then evaluated one record at a time
+    np = None
+
+from streaming_stats import SPIKE_HEART_RATE, heart_rate_stats
+
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fitness_rules.json")
+
+OPERATORS = {
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "==": operator.eq,
+    "!=": operator.ne
+}
+
+# A rule set can hold at most this many rules (one bit each in a batch outcome code)
+MAX_RULES = 64
+
+
+# Metrics derived from the heart-rate series: the StreamingStats attribute read
+# for one record, and a function of the (NaN-padded) heart-rate matrix and the
+# spike heart rate for a batch. Any other metric is read from the record.
+DERIVED_METRICS = {
+    "avg_heart_rate": ("mean", lambda matrix, spike: np.nanmean(matrix, axis=1)),
+    "min_heart_rate": ("min", lambda matrix, spike: np.nanmin(matrix, axis=1)),
+    "max_heart_rate": ("max", lambda matrix, spike: np.nanmax(matrix, axis=1)),
+    "heart_rate_variance": ("variance", lambda matrix, spike: np.nanvar(matrix, axis=1)),
+    "heart_rate_spikes": ("exceedances", lambda matrix, spike: np.count_nonzero(matrix > spike, axis=1))
+}
+
+
+class Rule:
+    """One row of a rule table: `message` applies when every condition holds
+
+    Conditions are (metric, operator, threshold) triples; rules with a higher
+    priority come first.
+    """
+    __slots__ = ("conditions", "message", "priority")
+
+    def __init__(self, conditions: Sequence[Tuple[str, str, Any]], message: str, priority: float = 0):
+        for metric, op, threshold in conditions:
+            if op not in OPERATORS:
+                raise ValueError(f"Unknown operator {op!r} in rule {message!r}")
+        self.conditions = tuple(tuple(condition) for condition in conditions)
+        self.message = message
+        self.priority = priority
+
+    @classmethod
+    def from_dict(cls, row: Mapping) -> "Rule":
+        """A rule from a table row: metric, operator, threshold, message, priority and optional "and" conditions"""
+        conditions = [(row["metric"], row["operator"], row["threshold"])]
+        conditions += [(extra["metric"], extra["operator"], extra["threshold"]) for extra in row.get("and", ())]
+        return cls(conditions, row["message"], row.get("priority", 0))
+
+    def __repr__(self):
+        conditions = " and ".join(f"{metric} {op} {threshold}" for metric, op, threshold in self.conditions)
+        return f"Rule({conditions} -> {self.message!r}, priority={self.priority})"
+
+
+class RuleSet:
+    """A rule table compiled once into a scalar and a batch evaluator
+
+    In mode "all" a record gets the messages of every matching rule, highest
+    priority first (ties keep table order), or [default] when none match. In
+    mode "first" it gets the message of the highest-priority matching rule,
+    or default.
+    """
+
+    def __init__(self, name: str, rules: Sequence[Rule], mode: str = "all",
+                 default: Optional[str] = None, spike_heart_rate: float = SPIKE_HEART_RATE):
+        if mode not in ("all", "first"):
+            raise ValueError(f"Unknown mode {mode!r} for rule set {name!r}")
+        if len(rules) > MAX_RULES:
+            raise ValueError(f"Rule set {name!r} has {len(rules)} rules, at most {MAX_RULES} are supported")
+        self.name = name
+        self.mode = mode
+        self.default = default
+        self.spike_heart_rate = spike_heart_rate
+        self.rules = sorted(rules, key=lambda rule: -rule.priority)
+
+        # Each metric is computed once per record, however many rules use it
+        self.metrics = tuple(dict.fromkeys(metric for rule in self.rules for metric, _, _ in rule.conditions))
+        self._evaluate = self._compile()
+        self._checks = tuple(
+            (tuple((self.metrics.index(metric), OPERATORS[op], threshold) for metric, op, threshold in rule.conditions),
+             rule.message)
+            for rule in self.rules
+        )
+        # Batch outcome (messages) for each combination of matching rules seen so far
+        self._outcomes: Dict[int, Union[str, List[str]]] = {}
+
+    def _compile(self):
+        """Generate the scalar evaluator: one straight-line comparison per condition
+
+        Metric names, thresholds and messages are bound as constants of the
+        generated function rather than written into its source.
+        """
+        namespace = {"spike": self.spike_heart_rate, "default": self.default, "heart_rate_stats": heart_rate_stats}
+        lines = ["def evaluate(data):"]
+        if any(metric in DERIVED_METRICS for metric in self.metrics):
+            # One summary serves every heart-rate metric (precomputed when the record carries one)
+            lines.append("    stats = heart_rate_stats(data, spike)")
+        for index, metric in enumerate(self.metrics):
+            if metric in DERIVED_METRICS:
+                lines.append(f"    m{index} = stats.{DERIVED_METRICS[metric][0]}")
+            else:
+                namespace[f"key_{index}"] = metric
+                lines.append(f"    m{index} = data[key_{index}]")
+        if self.mode == "all":
+            lines.append("    messages = []")
+        for number, rule in enumerate(self.rules):
+            tests = []
+            for metric, op, threshold in rule.conditions:
+                name = f"threshold_{number}_{len(tests)}"
+                namespace[name] = threshold
+                tests.append(f"m{self.metrics.index(metric)} {op} {name}")
+            namespace[f"message_{number}"] = rule.message
+            lines.append(f"    if {' and '.join(tests)}:")
+            if self.mode == "first":
+                lines.append(f"        return message_{number}")
+            else:
+                lines.append(f"        messages.append(message_{number})")
+        lines.append("    return default" if self.mode == "first" else "    return messages or [default]")
+        exec(compile("\n".join(lines), f"<rule set {self.name}>", "exec"), namespace)
+        return namespace["evaluate"]
+
+    def evaluate(self, data: Mapping) -> Union[str, List[str]]:
+        """Evaluate the rules for one record such as a fitness_data dict"""
+        return self._evaluate(data)
+
+    def evaluate_batch(self, data: Mapping[str, Any]) -> List[Union[str, List[str]]]:
+        """Evaluate the rules for N records given as columns, as evaluate() would for each
+
+        Each column holds one value per record; "heart_rate" is an N x samples
+        matrix whose shorter series are padded with NaN. With NumPy every
+        condition is one vectorized comparison over all records; without it
+        the records are evaluated one at a time.
+        """
+        if np is None:
+            names = list(data)
+            records = []
+            for row in zip(*data.values()):
+                record = dict(zip(names, row))
+                if "heart_rate" in record:
+                    record["heart_rate"] = [hr for hr in record["heart_rate"] if not math.isnan(hr)]
+                records.append(self.evaluate(record))
+            return records
+
+        spike = self.spike_heart_rate
+        if any(metric in DERIVED_METRICS for metric in self.metrics):
+            matrix = np.asarray(data["heart_rate"], dtype=float)
+        columns = [
+            DERIVED_METRICS[metric][1](matrix, spike) if metric in DERIVED_METRICS else np.asarray(data[metric])
+            for metric in self.metrics
+        ]
+
+        # One bit per rule, in priority order
+        codes = np.zeros(len(next(iter(data.values()))), dtype=np.uint64)
+        for bit, (conditions, _) in enumerate(self._checks):
+            matches = np.logical_and.reduce([op(columns[index], threshold) for index, op, threshold in conditions])
+            codes |= matches.astype(np.uint64) << np.uint64(bit)
+
+        codes = codes.tolist()
+        outcomes = {code: self._outcome(code) for code in set(codes)}
+        if self.mode == "first":
+            return [outcomes[code] for code in codes]
+        return [list(outcomes[code]) for code in codes]
+
+    def _outcome(self, code: int) -> Union[str, List[str]]:
+        outcome = self._outcomes.get(code)
+        if outcome is None:
+            messages = [message for bit, (_, message) in enumerate(self._checks) if code >> bit & 1]
+            if self.mode == "first":
+                outcome = messages[0] if messages else self.default
+            else:
+                outcome = messages or [self.default]
+            self._outcomes[code] = outcome
+        return outcome
+
+    def __repr__(self):
+        return f"RuleSet({self.name!r}, {len(self.rules)} rules, mode={self.mode!r})"
+
+
+@lru_cache(maxsize=None)
+def load_rules(path: str = DEFAULT_RULES_PATH) -> Dict[str, RuleSet]:
+    """Compile every rule set in a rules file
+
+    Files are compiled once and cached by path; call load_rules.cache_clear()
+    to pick up edits to a file that was already loaded.
+    """
+    with open(path, encoding="utf-8") as f:
+        table = json.load(f)
+    spike = table.get("spike_heart_rate", SPIKE_HEART_RATE)
+    try:
+        return {
+            name: RuleSet(name, [Rule.from_dict(row) for row in spec["rules"]],
+                          spec.get("mode", "all"), spec.get("default"), spike)
+            for name, spec in table["rule_sets"].items()
+        }
+    except KeyError as e:
+        raise ValueError(f"Missing field {e} in rules file {path}") from None
+
+
+def rule_set(name: str, path: Optional[str] = None) -> RuleSet:
+    """The compiled rule set `name` from a rules file (default: fitness_rules.json)"""
+    return load_rules(path or DEFAULT_RULES_PATH)[name]
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+
+import multiprocessing
+import time
+import traceback
+from typing import Dict, List, Any, Optional, Tuple
+
+from base_agent import Agent, Message, MessageDispatcher, Scheduler, agent_registry
+
+
+class ShardDispatcher(MessageDispatcher):
+    """Dispatcher for one shard
+
+    Messages for agents on this shard are queued as usual; messages for agents
+    on other shards are set aside, with the receiver's name (a published
+    message names its topic, not a receiver), so the coordinator can route them.
+    """
+    def __init__(self, local_names, coalesce: bool = False):
+        super().__init__(coalesce)
+        self.local_names = set(local_names)
+        self.remote: List[Tuple[Message, str]] = []
+
+    def post(self, message: Message, receiver: Agent) -> None:
+        if receiver.name in self.local_names:
+            super().post(message, receiver)
+        else:
+            self.remote.append((message, receiver.name))
+
+    def take_remote(self) -> List[Tuple[Message, str]]:
+        """Remove and return the (message, receiver name) pairs bound for other shards"""
+        remote, self.remote = self.remote, []
+        return remote
+
+
+class ShardRecorder:
+    """Stands in for the MessageLog and Journal of agents on a shard
+
+    Sent messages and journal events are kept in order and handed to the
+    coordinator after every step, which writes them to the real log and
+    journal, so a sharded run records the same messages and events as a
+    single-process one.
+    """
+    def __init__(self):
+        self.messages: List[Tuple[Message, Optional[List[str]]]] = []
+        self.events: List[Tuple[str, Optional[str], int, Dict[str, Any]]] = []
+
+    def append(self, message: Message, receivers: Optional[List[str]] = None) -> None:
+        self.messages.append((message, receivers))
+
+    def record(self, kind: str, agent: Optional[str], created_ns: Optional[int] = None, **fields) -> None:
+        self.events.append((kind, agent, time.monotonic_ns() if created_ns is None else created_ns, fields))
+
+    def record_message(self, message: Message, receivers: Optional[List[str]] = None) -> None:
+        self.events.append(("send", None, message.created_ns, {"message": message, "receivers": receivers}))
+
+    def take(self) -> Tuple[list, list]:
+        """Remove and return the messages and events recorded since the last call"""
+        messages, self.messages = self.messages, []
+        events, self.events = self.events, []
+        return messages, events
+
+
+def _run_shard(specs, local_names, coalesce, conn) -> None:
+    """Worker process: build the agents and step the local ones on command
+
+    Every agent is instantiated so registry lookups and isinstance checks work
+    as in a single process, but only the agents assigned to this shard are
+    stepped; the others are inert stand-ins that messages are routed past.
+    As in a single process, every local agent is stepped in the first cycle
+    and only the ready ones after that. Each step reports how many local
+    agents are still ready and whether anything woke an agent during it.
+    """
+    try:
+        agent_registry.clear()
+        dispatcher = ShardDispatcher(local_names, coalesce)
+        recorder = ShardRecorder()
+        scheduler = Scheduler()
+        agents = {}
+        for agent_class, name, state, logged, journaled in specs:
+            agent = agent_class(name)
+            agent.set_state(state)
+            agent.dispatcher = dispatcher
+            if agent.name in dispatcher.local_names:
+                agent.message_log = recorder if logged else None
+                agent.journal = recorder if journaled else None
+                agent.scheduler = scheduler
+            dispatcher.register(agent)
+            agents[name] = agent
+        scheduler.wake_all(agent for agent in agents.values() if agent.name in dispatcher.local_names)
+
+        while True:
+            command, payload = conn.recv()
+            if command == "step":
+                # Messages from other shards join the local outboxes, so deliver()
+                # keeps the same sender order as a single-process run
+                for message, receiver in payload:
+                    dispatcher.post(message, agents[receiver])
+                dispatcher.deliver()
+                activity = scheduler.activity
+                for agent in scheduler.take_ready():
+                    agent.step()
+                    scheduler.done(agent)
+                conn.send(("ok", (len(scheduler), scheduler.activity != activity, dispatcher.take_remote(),
+                                  len(dispatcher), recorder.take())))
+            elif command == "collect":
+                states = {name: agents[name].get_state() for name in local_names}
+                undelivered = [(message, receiver.name) for message, receiver in dispatcher.drain()]
+                undelivered += dispatcher.take_remote()
+                conn.send(("ok", (states, undelivered)))
+            elif command == "stop":
+                break
+    except Exception:
+        conn.send(("error", traceback.format_exc()))
+    finally:
+        conn.close()
+
+
+class ShardedRunner:
+    """Runs a population of agents partitioned across worker processes
+
+    Agents are assigned to shards round-robin in registry order. Each shard
+    process runs its own step loop; the coordinator acts as the cycle barrier
+    and routes cross-shard messages over pipes, so a message sent in cycle N
+    is delivered at the start of cycle N+1 exactly as with MessageDispatcher.
+
+    The run ends on the same condition as MessageDispatcher-driven runs (see
+    FitnessMAS.is_quiescent): no message is pending or in transit between
+    shards, and either no agent is ready or the last cycle woke none.
+
+    Agents must be constructible as `cls(name)`. Their full state (see
+    Agent.get_state) is shipped to the shards and copied back when the run
+    ends. Messages sent and journal events recorded on a shard are written
+    to the coordinator's message log and journal after every cycle, shard by
+    shard.
+    """
+    def __init__(self, agents: List[Agent], dispatcher: MessageDispatcher, shards: int = 2):
+        self.agents = list(agents)
+        self.dispatcher = dispatcher
+        self.shards = max(1, min(shards, len(self.agents)))
+        self.assignment = {agent.name: i % self.shards for i, agent in enumerate(self.agents)}
+
+    @staticmethod
+    def _exited(process) -> RuntimeError:
+        """The error for a shard process that died without reporting one (killed, or failed to start)"""
+        process.join(timeout=5)
+        return RuntimeError(f"Shard failed: worker process {process.pid} exited with code {process.exitcode}")
+
+    def _send(self, conn, process, command: str, payload) -> None:
+        try:
+            conn.send((command, payload))
+        except OSError as e:
+            raise self._exited(process) from e
+
+    def _receive(self, conn, process):
+        try:
+            status, payload = conn.recv()
+        except (EOFError, OSError) as e:
+            raise self._exited(process) from e
+        if status == "error":
+            raise RuntimeError(f"Shard failed:\n{payload}")
+        return payload
+
+    @staticmethod
+    def _record(agents: Dict[str, Agent], sent: list, events: list) -> None:
+        """Write what a shard's agents sent and journaled through the coordinator's agents"""
+        for message, receivers in sent:
+            agent = agents[message.sender]
+            agent.message_history.append(message)
+            agent.message_log.append(message, receivers)
+        for kind, name, created_ns, fields in events:
+            if kind == "send":
+                message = fields["message"]
+                agents[message.sender].journal.record_message(message, fields["receivers"])
+            else:
+                agents[name].journal.record(kind, name, created_ns, **fields)
+
+    def run(self, max_cycles: Optional[int] = 15, deadline: Optional[float] = None) -> int:
+        """Run until quiescent or max_cycles (None: no limit); return the number of cycles
+
+        Raises TimeoutError once time.monotonic() passes `deadline`, after the
+        agents' state has been copied back.
+        """
+        specs = [
+            (type(agent), agent.name, agent.get_state(), agent.message_log is not None, agent.journal is not None)
+            for agent in self.agents
+        ]
+        agents = {agent.name: agent for agent in self.agents}
+        journal = next((agent.journal for agent in self.agents if agent.journal is not None), None)
+
+        # Hand messages that are still waiting for delivery to their shards
+        inbound = [[] for _ in range(self.shards)]
+        for message, receiver in self.dispatcher.drain():
+            inbound[self.assignment[receiver.name]].append((message, receiver.name))
+
+        context = multiprocessing.get_context("spawn")
+        conns, processes = [], []
+        for shard in range(self.shards):
+            local_names = [name for name, assigned in self.assignment.items() if assigned == shard]
+            parent_conn, child_conn = context.Pipe()
+            process = context.Process(target=_run_shard, args=(specs, local_names, self.dispatcher.coalesce, child_conn), daemon=True)
+            process.start()
+            child_conn.close()
+            conns.append(parent_conn)
+            processes.append(process)
+
+        cycles = 0
+        timed_out = False
+        try:
+            while max_cycles is None or cycles < max_cycles:
+                if deadline is not None and time.monotonic() >= deadline:
+                    timed_out = True
+                    break
+                cycles += 1
+                print(f"\nRunning agent cycle {cycles} on {self.shards} shards...")
+                if journal is not None:
+                    journal.begin_cycle()
+                for conn, process, messages in zip(conns, processes, inbound):
+                    self._send(conn, process, "step", messages)
+
+                inbound = [[] for _ in range(self.shards)]
+                ready = pending = 0
+                woken = False
+                for conn, process in zip(conns, processes):
+                    shard_ready, shard_woken, remote, local_pending, (sent, events) = self._receive(conn, process)
+                    ready += shard_ready
+                    woken = woken or shard_woken
+                    pending += local_pending
+                    self._record(agents, sent, events)
+                    for message, receiver in remote:
+                        inbound[self.assignment[receiver]].append((message, receiver))
+
+                # Pending intentions alone do not keep the run going once a cycle woke nobody
+                if not pending and not any(inbound) and (not ready or not woken):
+                    print(f"All agents idle, stopping after {cycles} cycles")
+                    break
+
+            # Copy the final state back into the coordinator's agents
+            undelivered = [pair for pairs in inbound for pair in pairs]
+            for conn, process in zip(conns, processes):
+                self._send(conn, process, "collect", None)
+            for conn, process in zip(conns, processes):
+                states, shard_undelivered = self._receive(conn, process)
+                undelivered.extend(shard_undelivered)
+                for name, state in states.items():
+                    agents[name].set_state(state)
+
+            # Messages still in flight (when max_cycles was reached) go back to the dispatcher
+            for message, receiver in undelivered:
+                self.dispatcher.post(message, agents[receiver])
+            if timed_out:
+                raise TimeoutError(f"Shards not quiescent before the timeout: {len(undelivered)} messages "
+                                   f"undelivered after {cycles} cycles")
+        finally:
+            for conn in conns:
+                try:
+                    conn.send(("stop", None))
+                except (BrokenPipeError, OSError):
+                    pass
+            for process in processes:
+                process.join(timeout=5)
+                if process.is_alive():
+                    process.terminate()
+        return cycles
@@ -1,11 +1,14 @@
 #!/usr/bin/env python3
 
+import asyncio
 import random
 import time
 from datetime import datetime
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Sequence
 
-from base_agent import Agent, Belief, Desire, Intention, SpeechAct, Message
+from base_agent import Agent, Belief, Desire, Intention, LogLevel, SpeechAct, Message
+from rules import DEFAULT_RULES_PATH, rule_set
+from streaming_stats import SPIKE_HEART_RATE, StreamingStats, heart_rate_stats
 
 
 class ReactiveAgent(Agent):
@@ -18,7 +21,9 @@ class ReactiveAgent(Agent):
     def add_rule(self, stimulus: str, response_func):
         """Add a reactive rule (stimulus -> response)"""
         self.reactive_rules[stimulus] = response_func
-        self.log_activity(f"Added reactive rule for stimulus: {stimulus}")
+        self.watch(stimulus)
+        self.subscribe(stimulus)
+        self.log_activity("Added reactive rule for stimulus: %s", stimulus)
     
     # def deliberate(self) -> None:
     #     """Reactive agents don't deliberate extensively"""
@@ -29,24 +34,25 @@ class ReactiveAgent(Agent):
     #     pass
     
     def execute(self) -> None:
-        """Execute reactive rules based on current beliefs"""
-        for belief in self.beliefs:
+        """Execute reactive rules for beliefs added or changed since the last step"""
+        for belief in self.beliefs.take_changes():
             if belief.predicate in self.reactive_rules:
-                self.log_activity(f"Triggering rule for {belief.predicate}")
-                self.reactive_rules[belief.predicate](self, belief.value)
+                self.log_activity("Triggering rule for %s", belief.predicate, level=LogLevel.DEBUG)
+                self.schedule(self.reactive_rules[belief.predicate](self, belief.value))
     
     def interpret_message(self, message: Message) -> None:
         """React to messages based on speech act"""
         # Convert message content to beliefs
         if message.speech_act == SpeechAct.INFORM:
-            for key, value in message.content.items():
-                self.add_belief(Belief(key, value))
+            self.add_beliefs(message.content)
                 
         # Directly execute requests if we have a rule for it
         elif message.speech_act == SpeechAct.REQUEST:
             action = message.content.get("action")
             if action in self.reactive_rules:
-                self.reactive_rules[action](self, message.content)
+                # Pass the conversation along so the reply can be correlated
+                params = dict(message.content, conversation_id=message.conversation_id)
+                self.schedule(self.reactive_rules[action](self, params))
 
 
 class DeliberativeAgent(Agent):
@@ -55,6 +61,8 @@ class DeliberativeAgent(Agent):
     def __init__(self, name: str):
         super().__init__(name, agent_type="deliberative")
         self.knowledge_base = {}  # For more complex reasoning
+        self.rules_path = DEFAULT_RULES_PATH  # Recommendation and fitness-level rule tables
+        self.register_action("analyze_fitness_data", self.handle_analyze_fitness_data)
     
     def deliberate(self) -> None:
         """Update desires based on current beliefs and knowledge"""
@@ -62,20 +70,16 @@ class DeliberativeAgent(Agent):
         # create a desire to generate recommendations
         fitness_belief = self.get_belief("fitness_level")
         if fitness_belief and fitness_belief.value == "Below target":
-            if not any(d.name == "generate_recommendations" for d in self.desires):
+            if "generate_recommendations" not in self.desires:
                 self.add_desire(Desire("generate_recommendations", priority=0.8))
     
     def plan(self) -> None:
         """Create intentions based on current desires"""
-        # Clear completed intentions
-        self.intentions = [i for i in self.intentions if not i.completed]
-        
         # Only plan if we don't have active intentions
         if not self.intentions:
             # Get the highest priority unachieved desire
-            active_desires = [d for d in self.desires if not d.achieved]
-            if active_desires:
-                desire = active_desires[0]
+            desire = self.desires.peek()
+            if desire:
                 if desire.name == "generate_recommendations":
                     self.add_intention(Intention(
                         "analyze_fitness_data",
@@ -85,86 +89,71 @@ class DeliberativeAgent(Agent):
     
     def execute(self) -> None:
         """Execute current intentions"""
-        for intention in self.intentions[:]:  # Create a copy to iterate over
-            if not intention.completed:
-                self.log_activity(f"Executing intention: {intention.action}")
-                
-                if intention.action == "analyze_fitness_data":
-                    # Find fitness data in beliefs
-                    steps_belief = self.get_belief("steps")
-                    hr_belief = self.get_belief("heart_rate")
-                    
-                    if steps_belief and hr_belief:
-                        recommendations = self.analyze_fitness_data(
-                            steps_belief.value, 
-                            hr_belief.value
-                        )
-                        self.add_belief(Belief("recommendations", recommendations))
-                        
-                        # Communicate results
-                        for agent in agent_registry:
-                            if agent.name != self.name:
-                                self.send_message(
-                                    agent,
-                                    SpeechAct.INFORM,
-                                    {"recommendations": recommendations}
-                                )
-                        
-                        # Mark intention as completed and move to history
-                        self.complete_intention(intention)
-                        self.intentions.remove(intention)
-                        
-                        # Mark desire as achieved if it exists
-                        if intention.desire:
-                            intention.desire.achieved = True
-    
-    def analyze_fitness_data(self, steps: int, heart_rate: List[int]) -> List[str]:
-        """Analyze fitness data and generate recommendations"""
-        recommendations = []
-        
-        avg_hr = sum(heart_rate) / len(heart_rate)
-        
-        if steps < 7500:
-            recommendations.append("Increase daily steps to at least 10,000")
-        
-        if avg_hr > 100:
-            recommendations.append("Consider more cardiovascular training")
-        
-        if not recommendations:
-            recommendations.append("Maintain current routine - progress looks good")
-            
-        self.log_activity(f"Generated {len(recommendations)} fitness recommendations")
+        self.execute_intentions()
+    
+    def handle_analyze_fitness_data(self, intention: Intention) -> bool:
+        """Action handler: analyze fitness data and share the recommendations"""
+        # Find fitness data in beliefs
+        steps_belief = self.get_belief("steps")
+        hr_belief = self.get_belief("heart_rate")
+        stats_belief = self.get_belief("heart_rate_stats")
+        
+        if not (steps_belief and hr_belief):
+            return False
+        
+        recommendations = self.analyze_fitness_data(
+            steps_belief.value, 
+            hr_belief.value,
+            stats_belief.value if stats_belief else None
+        )
+        self.add_belief(Belief("recommendations", recommendations))
+        
+        # Communicate results to subscribers
+        self.publish("recommendations", {"recommendations": recommendations})
+        
+        # Mark desire as achieved if it exists
+        if intention.desire:
+            self.achieve_desire(intention.desire)
+        return True
+    
+    def analyze_fitness_data(self, steps: int, heart_rate: List[int], heart_rate_summary=None) -> List[str]:
+        """Analyze fitness data and generate recommendations
+        
+        `heart_rate_summary` is the series' StreamingStats (or its dict form)
+        when it was computed as the samples arrived.
+        """
+        recommendations = rule_set("basic_recommendations", self.rules_path).evaluate(
+            {"steps": steps, "heart_rate": heart_rate, "heart_rate_stats": heart_rate_summary}
+        )
+        self.log_activity("Generated %s fitness recommendations", len(recommendations))
         return recommendations
     
     def interpret_message(self, message: Message) -> None:
         """Interpret messages using deliberative reasoning"""
         if message.speech_act == SpeechAct.INFORM:
             # Update beliefs from information
-            for key, value in message.content.items():
-                self.add_belief(Belief(key, value))
+            self.add_beliefs(message.content)
                 
         elif message.speech_act == SpeechAct.REQUEST:
             # Create a desire based on the request
             action = message.content.get("action")
             if action:
                 self.add_desire(Desire(action, priority=0.7))
-                self.log_activity(f"Created desire from request: {action}")
+                self.log_activity("Created desire from request: %s", action)
                 
         elif message.speech_act == SpeechAct.QUERY:
             # Respond to queries with our beliefs
             query_key = message.content.get("query")
             if query_key:
                 belief = self.get_belief(query_key)
-                if belief:
-                    for agent in agent_registry:
-                        if agent.name == message.sender:
-                            self.send_message(
-                                agent,
-                                SpeechAct.INFORM,
-                                {query_key: belief.value},
-                                message.conversation_id
-                            )
-                            break
+                sender = agent_registry.get(message.sender)
+                if belief and sender:
+                    self.send_message(
+                        sender,
+                        SpeechAct.INFORM,
+                        {query_key: belief.value},
+                        message.conversation_id
+                    )
 
 
 class HybridAgent(Agent):
@@ -174,10 +163,18 @@ class HybridAgent(Agent):
         super().__init__(name, agent_type="hybrid")
         self.reactive_rules = {}  # For reactive layer
         self.plans = {}           # For deliberative layer
+        self.rules_path = DEFAULT_RULES_PATH  # Fitness-level rule table
+        self.register_action("request_fitness_data", self.handle_request_fitness_data)
+        self.register_action("compile_fitness_report", self.handle_compile_fitness_report)
+        self.declare_capability("get_report")
+        self.subscribe("get_report")
+        self.subscribe("recommendations")
     
     def add_rule(self, stimulus: str, response_func):
         """Add a reactive rule"""
         self.reactive_rules[stimulus] = response_func
+        self.watch(stimulus)
+        self.subscribe(stimulus)
     
     def add_plan(self, goal: str, plan_func):
         """Add a plan for achieving a goal"""
@@ -186,31 +183,27 @@ class HybridAgent(Agent):
     def deliberate(self) -> None:
         """Update desires based on beliefs (deliberative layer)"""
         # Check if we need fitness data
-        if not self.get_belief("fitness_data") and not any(d.name == "get_fitness_data" for d in self.desires):
+        if not self.get_belief("fitness_data") and "get_fitness_data" not in self.desires:
             self.add_desire(Desire("get_fitness_data", priority=0.9))
         
         # Check if we need to generate a report
         recommendations = self.get_belief("recommendations")
         fitness_data = self.get_belief("fitness_data")
-        if recommendations and fitness_data and not any(d.name == "generate_report" for d in self.desires):
+        if recommendations and fitness_data and "generate_report" not in self.desires:
             self.add_desire(Desire("generate_report", priority=0.6))
     
     def plan(self) -> None:
         """Create intentions from desires (deliberative layer)"""
-        # Clear completed intentions
-        self.intentions = [i for i in self.intentions if not i.completed]
-        
         # Only plan if we don't have active intentions
         if not self.intentions:
             # Get highest priority unachieved desire
-            active_desires = [d for d in self.desires if not d.achieved]
-            if active_desires:
-                desire = active_desires[0]
+            desire = self.desires.peek()
+            if desire:
                 
                 if desire.name == "get_fitness_data":
                     self.add_intention(Intention(
                         "request_fitness_data",
-                        {"user_id": "current_user"},
+                        {"user_id": "current_user" if self.session.key is None else self.session.key},
                         desire
                     ))
                 
@@ -223,60 +216,48 @@ class HybridAgent(Agent):
     
     def execute(self) -> None:
         """Execute both reactive rules and deliberative plans"""
-        # First, reactive layer (higher priority)
-        for belief in self.beliefs:
+        # First, reactive layer (higher priority), fired only for changed beliefs
+        for belief in self.beliefs.take_changes():
             if belief.predicate in self.reactive_rules:
-                self.log_activity(f"Reactive: Triggering rule for {belief.predicate}")
-                self.reactive_rules[belief.predicate](self, belief.value)
+                self.log_activity("Reactive: Triggering rule for %s", belief.predicate, level=LogLevel.DEBUG)
+                self.schedule(self.reactive_rules[belief.predicate](self, belief.value))
         
         # Then, deliberative layer
-        for intention in self.intentions[:]:  # Create a copy to iterate over
-            if not intention.completed:
-                self.log_activity(f"Deliberative: Executing {intention.action}")
-                
-                if intention.action == "request_fitness_data":
-                    # Find an agent that can provide fitness data
-                    for agent in agent_registry:
-                        if agent.name != self.name:
-                            self.send_message(
-                                agent,
-                                SpeechAct.REQUEST,
-                                {
-                                    "action": "retrieve_fitness_data",
-                                    "user_id": intention.params["user_id"]
-                                }
-                            )
-                    # Mark as completed and move to history
-                    self.complete_intention(intention)
-                    self.intentions.remove(intention)
-                
-                elif intention.action == "compile_fitness_report":
-                    # Get the necessary data from beliefs
-                    fitness_data = self.get_belief("fitness_data")
-                    recommendations = self.get_belief("recommendations")
-                    
-                    if fitness_data and recommendations:
-                        report = self.generate_report(fitness_data.value, recommendations.value)
-                        self.add_belief(Belief("fitness_report", report))
-                        
-                        # Mark as completed and move to history
-                        self.complete_intention(intention)
-                        self.intentions.remove(intention)
-                        
-                        # Mark desire as achieved if it exists
-                        if intention.desire:
-                            intention.desire.achieved = True
-                            
-                        # Notify other agents
-                        for agent in agent_registry:
-                            if agent.name != self.name:
-                                self.send_message(
-                                    agent,
-                                    SpeechAct.INFORM,
-                                    {"report_available": True, "report_id": report["report_id"]}
-                                )
-                        
-                        self.log_activity(f"Generated report {report['report_id']}")
+        self.execute_intentions()
+    
+    def handle_request_fitness_data(self, intention: Intention) -> bool:
+        """Action handler: ask the agents that provide fitness data for it"""
+        for agent in agent_registry.with_capability("retrieve_fitness_data"):
+            # Don't repeat a request that is still awaiting its reply
+            request = {
+                "action": "retrieve_fitness_data",
+                "user_id": intention.params["user_id"]
+            }
+            if not self.conversations.pending(self.request_key(agent.name, request)):
+                self.send_message(agent, SpeechAct.REQUEST, request)
+        return True
+    
+    def handle_compile_fitness_report(self, intention: Intention) -> bool:
+        """Action handler: compile a report and announce it"""
+        # Get the necessary data from beliefs
+        fitness_data = self.get_belief("fitness_data")
+        recommendations = self.get_belief("recommendations")
+        
+        if not (fitness_data and recommendations):
+            return False
+        
+        report = self.generate_report(fitness_data.value, recommendations.value)
+        self.add_belief(Belief("fitness_report", report))
+        
+        # Mark desire as achieved if it exists
+        if intention.desire:
+            self.achieve_desire(intention.desire)
+            
+        # Notify subscribers
+        self.publish("report_available", {"report_available": True, "report_id": report["report_id"]})
+        
+        self.log_activity("Generated report %s", report['report_id'])
+        return True
     
     def generate_report(self, fitness_data, recommendations) -> Dict:
         """Generate a fitness report"""
@@ -286,7 +267,7 @@ class HybridAgent(Agent):
             "user_id": fitness_data.get("user_id", "default_user"),
             "metrics": {
                 "steps": fitness_data.get("steps", 0),
-                "heart_rate_avg": sum(fitness_data.get("heart_rate", [70])) / len(fitness_data.get("heart_rate", [70])),
+                "heart_rate_avg": heart_rate_stats(fitness_data).mean,
                 "calories": fitness_data.get("calories", 0),
                 "sleep_hours": fitness_data.get("sleep_hours", 0)
             },
@@ -294,48 +275,38 @@ class HybridAgent(Agent):
             "recommendations": recommendations
         }
         
-        self.log_activity(f"Generated report {report['report_id']}")
+        self.log_activity("Generated report %s", report['report_id'])
         return report
     
     def determine_fitness_level(self, fitness_data) -> str:
         """Determine fitness level based on data"""
-        steps = fitness_data.get("steps", 0)
-        heart_rate = fitness_data.get("heart_rate", [70])
-        avg_hr = sum(heart_rate) / len(heart_rate)
-        
-        if steps > 10000 and avg_hr < 85:
-            return "Excellent"
-        elif steps > 7500:
-            return "Good"
-        elif steps > 5000:
-            return "Average"
-        else:
-            return "Below target"
+        return rule_set("fitness_level", self.rules_path).evaluate({
+            "steps": fitness_data.get("steps", 0),
+            "heart_rate": fitness_data.get("heart_rate", [70]),
+            "heart_rate_stats": fitness_data.get("heart_rate_stats")
+        })
     
     def interpret_message(self, message: Message) -> None:
         """Process messages using both reactive and deliberative approaches"""
         # Reactive response to certain speech acts
         if message.speech_act == SpeechAct.INFORM:
             # Update beliefs from information
-            for key, value in message.content.items():
-                self.add_belief(Belief(key, value))
+            self.add_beliefs(message.content)
         
         # Deliberative processing for more complex messages
         if message.speech_act == SpeechAct.REQUEST:
             action = message.content.get("action")
             if action == "get_report":
                 report_belief = self.get_belief("fitness_report")
-                if report_belief:
-                    # Find the requesting agent
-                    for agent in agent_registry:
-                        if agent.name == message.sender:
-                            self.send_message(
-                                agent,
-                                SpeechAct.INFORM,
-                                {"fitness_report": report_belief.value},
-                                message.conversation_id
-                            )
-                            break
+                # Find the requesting agent
+                sender = agent_registry.get(message.sender)
+                if report_belief and sender:
+                    self.send_message(
+                        sender,
+                        SpeechAct.INFORM,
+                        {"fitness_report": report_belief.value},
+                        message.conversation_id
+                    )
 
 
 class FitnessDataAgent(ReactiveAgent):
@@ -343,25 +314,61 @@ class FitnessDataAgent(ReactiveAgent):
     
     def __init__(self, name: str):
         super().__init__(name)
+        self.fetch_delay = 0.5  # Simulated API latency in seconds
         
         # Add reactive rules
         self.add_rule("retrieve_fitness_data", self.retrieve_data)
+        self.declare_capability("retrieve_fitness_data")
     
     def retrieve_data(self, agent, params):
-        """Reactive rule to retrieve fitness data"""
+        """Reactive rule to retrieve fitness data
+        
+        Under the asyncio runtime this returns a coroutine that awaits the
+        fetch instead of blocking the whole system.
+        """
+        if self.asynchronous:
+            return self.retrieve_data_async(agent, params)
+        
         user_id = params.get("user_id", "default_user")
-        self.log_activity(f"Retrieving fitness data for user {user_id}")
+        self.log_activity("Retrieving fitness data for user %s", user_id)
         
         # Simulate API call delay
-        time.sleep(0.5)
+        time.sleep(self.fetch_delay)
+        
+        return self.publish_fitness_data(user_id, params.get("conversation_id"))
+    
+    async def retrieve_data_async(self, agent, params):
+        """Non-blocking variant of retrieve_data for the asyncio runtime"""
+        user_id = params.get("user_id", "default_user")
+        self.log_activity("Retrieving fitness data for user %s", user_id)
+        
+        # Simulate API call latency without blocking the event loop
+        await asyncio.sleep(self.fetch_delay)
         
+        return self.publish_fitness_data(user_id, params.get("conversation_id"))
+    
+    def publish_fitness_data(self, user_id: str, conversation_id: Optional[str] = None) -> Dict:
+        """Generate fitness data for a user, store it and inform interested agents
+        
+        `conversation_id` is that of the request being answered, if any.
+        """
         # Randomly generate fitness data
         # In a real-world scenario, this would be replaced with an API call to a fitness data provider
         # or a database query
         # For demonstration purposes, we generate random data
+        # Heart-rate samples arrive one at a time and are summarized as they do,
+        # so consumers read the summary instead of rescanning the series
+        heart_rate = []
+        heart_rate_summary = StreamingStats(SPIKE_HEART_RATE)
+        for _ in range(10):
+            sample = random.randint(60, 150)
+            heart_rate.append(sample)
+            heart_rate_summary.add(sample)
+        
         fitness_data = {
             "user_id": user_id,
-            "heart_rate": [random.randint(60, 150) for _ in range(10)],
+            "heart_rate": heart_rate,
+            "heart_rate_stats": heart_rate_summary.to_dict(),
             "steps": random.randint(5000, 15000),
             "calories": random.randint(1500, 3000),
             "sleep_hours": round(random.uniform(5.0, 9.0), 1),
@@ -373,13 +380,13 @@ class FitnessDataAgent(ReactiveAgent):
         self.add_belief(Belief("fitness_data", fitness_data))
         
         # Inform the requesting agent
-        for agent in agent_registry:
-            if isinstance(agent, DeliberativeAgent) or isinstance(agent, HybridAgent):
-                self.send_message(
-                    agent,
-                    SpeechAct.INFORM,
-                    {"fitness_data": fitness_data}
-                )
+        for agent in agent_registry.by_class(DeliberativeAgent) + agent_registry.by_class(HybridAgent):
+            self.send_message(
+                agent,
+                SpeechAct.INFORM,
+                {"fitness_data": fitness_data},
+                conversation_id
+            )
         
         return fitness_data
 
@@ -438,21 +445,11 @@ class AnalysisAgent(DeliberativeAgent):
             self.add_belief(Belief("calories", fitness_data["calories"]))
             
             # Determine fitness level
-            avg_hr = sum(fitness_data["heart_rate"]) / len(fitness_data["heart_rate"])
-            
-            if fitness_data["steps"] > 10000 and avg_hr < 85:
-                fitness_level = "Excellent"
-            elif fitness_data["steps"] > 7500:
-                fitness_level = "Good"
-            elif fitness_data["steps"] > 5000:
-                fitness_level = "Average"
-            else:
-                fitness_level = "Below target"
-                
+            fitness_level = rule_set("fitness_level", self.rules_path).evaluate(fitness_data)
             self.add_belief(Belief("fitness_level", fitness_level))
             
             # Create desire to analyze this data
-            if not any(d.name == "analyze_fitness" for d in self.desires):
+            if "analyze_fitness" not in self.desires:
                 self.add_desire(Desire("analyze_fitness", priority=0.9))
     
     def deliberate(self) -> None:
@@ -462,28 +459,24 @@ class AnalysisAgent(DeliberativeAgent):
         # Use means-end reasoning to determine what desires to create
         if self.check_condition("has_fitness_data") and not self.check_condition("has_recommendations"):
             # We have fitness data but no recommendations - create a desire to generate them
-            if not any(d.name == "analyze_fitness" for d in self.desires):
+            if "analyze_fitness" not in self.desires:
                 self.log_activity("Means-end reasoning: Creating 'analyze_fitness' desire based on available data")
                 self.add_desire(Desire("analyze_fitness", priority=0.9))
                 
         # If fitness level is below target, add a higher priority desire to generate detailed recommendations
         fitness_belief = self.get_belief("fitness_level")
         if fitness_belief and fitness_belief.value == "Below target":
-            if not any(d.name == "generate_recommendations" for d in self.desires):
+            if "generate_recommendations" not in self.desires:
                 self.log_activity("Means-end reasoning: Creating 'generate_recommendations' desire for below-target fitness")
                 self.add_desire(Desire("generate_recommendations", priority=1.0))  # Higher priority
     
     def plan(self) -> None:
         """Create intentions based on current desires using means-end reasoning"""
-        # Clear completed intentions
-        self.intentions = [i for i in self.intentions if not i.completed]
-        
         # Only plan if we don't have active intentions
         if not self.intentions:
             # Get the highest priority unachieved desire
-            active_desires = [d for d in self.desires if not d.achieved]
-            if active_desires:
-                desire = active_desires[0]
+            desire = self.desires.peek()
+            if desire:
                 
                 # Use means-end reasoning to select an action for the desire
                 if desire.name in self.action_library:
@@ -494,90 +487,82 @@ class AnalysisAgent(DeliberativeAgent):
                     
                     if preconditions_met:
                         # Create intention for the first action in the plan
-                        self.log_activity(f"Means-end reasoning: Selected action '{action_plan['actions'][0]}' for desire '{desire.name}'")
+                        self.log_activity("Means-end reasoning: Selected action '%s' for desire '%s'", action_plan['actions'][0], desire.name)
                         self.add_intention(Intention(
                             action_plan["actions"][0],
                             {"detail_level": "high" if desire.name == "generate_recommendations" else "standard"},
                             desire
                         ))
                     else:
-                        self.log_activity(f"Means-end reasoning: Cannot satisfy preconditions for desire '{desire.name}'")
+                        self.log_activity("Means-end reasoning: Cannot satisfy preconditions for desire '%s'", desire.name, level=LogLevel.DEBUG)
                 
-    def execute(self) -> None:
-        """Execute current intentions"""
-        for intention in self.intentions[:]:  # Create a copy to iterate over
-            if not intention.completed:
-                self.log_activity(f"Executing intention: {intention.action}")
-                
-                if intention.action == "analyze_fitness_data":
-                    # Get the fitness data from beliefs
-                    fitness_data = self.get_belief("fitness_data")
-                    
-                    if fitness_data:
-                        # Generate recommendations
-                        recommendations = self.analyze_fitness_data(
-                            fitness_data.value.get("steps", 0), 
-                            fitness_data.value.get("heart_rate", [70]),
-                            fitness_data.value.get("sleep_hours", 0)
-                        )
-                        
-                        # Store recommendations as belief
-                        self.add_belief(Belief("recommendations", recommendations))
-                        
-                        # Communicate results to UI agent
-                        for agent in agent_registry:
-                            if isinstance(agent, UserInterfaceAgent):
-                                self.send_message(
-                                    agent,
-                                    SpeechAct.INFORM,
-                                    {
-                                        "recommendations": recommendations,
-                                        "fitness_level": self.get_belief("fitness_level").value,
-                                        "fitness_data": fitness_data.value
-                                    }
-                                )
-                        
-                        # Mark intention as completed and move to history
-                        self.complete_intention(intention)
-                        self.intentions.remove(intention)
-                        
-                        # Mark desire as achieved if it exists
-                        if intention.desire:
-                            intention.desire.achieved = True
-    
-    def analyze_fitness_data(self, steps: int, heart_rate: List[int], sleep_hours: float) -> List[str]:
-        """Analyze fitness data and generate recommendations"""
-        self.log_activity(f"Analyzing fitness data: steps={steps}, heart_rate={heart_rate[:3]}..., sleep={sleep_hours}")
-        recommendations = []
-        
-        # Calculate average heart rate
-        avg_hr = sum(heart_rate) / len(heart_rate)
-        
-        # Generate personalized recommendations
-        if steps < 7500:
-            recommendations.append("Increase daily steps to at least 10,000 for better cardiovascular health")
-        
-        if avg_hr > 100:
-            recommendations.append("Consider more cardiovascular training to improve heart efficiency")
-        
-        if sleep_hours < 7:
-            recommendations.append("Aim for 7-8 hours of sleep for optimal recovery and performance")
-        
-        if len([hr for hr in heart_rate if hr > 140]) > 2:
-            recommendations.append("Your heart rate spikes suggest high intensity. Consider adding recovery sessions")
-        
-        # Always provide positive feedback
-        if steps > 8000:
-            recommendations.append("Good job on staying active with your step count!")
-        
-        if sleep_hours >= 7:
-            recommendations.append("You're getting adequate sleep which is excellent for recovery")
-        
-        # If no specific recommendations, add a general one
-        if not recommendations:
-            recommendations.append("Keep up your current routine - your fitness metrics look good")
-        
-        self.log_activity(f"Generated {len(recommendations)} fitness recommendations")
+    def handle_analyze_fitness_data(self, intention: Intention) -> bool:
+        """Action handler: analyze fitness data and send the results to the UI agent"""
+        # Get the fitness data from beliefs
+        fitness_data = self.get_belief("fitness_data")
+        
+        if not fitness_data:
+            return False
+        
+        # Generate recommendations
+        recommendations = self.analyze_fitness_data(
+            fitness_data.value.get("steps", 0), 
+            fitness_data.value.get("heart_rate", [70]),
+            fitness_data.value.get("sleep_hours", 0),
+            fitness_data.value.get("heart_rate_stats")
+        )
+        
+        # Store recommendations as belief
+        self.add_belief(Belief("recommendations", recommendations))
+        
+        # Communicate results to UI agent
+        for agent in agent_registry.by_class(UserInterfaceAgent):
+            self.send_message(
+                agent,
+                SpeechAct.INFORM,
+                {
+                    "recommendations": recommendations,
+                    "fitness_level": self.get_belief("fitness_level").value,
+                    "fitness_data": fitness_data.value
+                }
+            )
+        
+        # Mark desire as achieved if it exists
+        if intention.desire:
+            self.achieve_desire(intention.desire)
+        return True
+    
+    def analyze_fitness_data(self, steps: int, heart_rate: List[int], sleep_hours: float,
+                             heart_rate_summary=None) -> List[str]:
+        """Analyze fitness data and generate recommendations
+        
+        `heart_rate_summary` is the series' StreamingStats (or its dict form)
+        when it was computed as the samples arrived.
+        """
+        if self.log.level <= LogLevel.INFO:
+            self.log_activity("Analyzing fitness data: steps=%s, heart_rate=%s..., sleep=%s", steps, heart_rate[:3], sleep_hours)
+        recommendations = rule_set("recommendations", self.rules_path).evaluate({
+            "steps": steps,
+            "heart_rate": heart_rate,
+            "sleep_hours": sleep_hours,
+            "heart_rate_stats": heart_rate_summary
+        })
+        self.log_activity("Generated %s fitness recommendations", len(recommendations))
+        return recommendations
+    
+    def analyze_fitness_batch(self, steps: Sequence[int], heart_rate, sleep_hours: Sequence[float]) -> List[List[str]]:
+        """Recommendations for N users from columnar data, as analyze_fitness_data gives per user
+        
+        `steps` and `sleep_hours` hold one value per user and `heart_rate` one
+        row of samples per user: an N x samples matrix, with shorter series
+        padded with NaN. With NumPy each rule is one vectorized pass over all
+        users (see RuleSet.evaluate_batch); without it users are analyzed one
+        at a time.
+        """
+        recommendations = rule_set("recommendations", self.rules_path).evaluate_batch(
+            {"steps": steps, "heart_rate": heart_rate, "sleep_hours": sleep_hours}
+        )
+        self.log_activity("Generated fitness recommendations for %s users", len(recommendations))
         return recommendations
 
 
@@ -597,8 +582,9 @@ class UserInterfaceAgent(HybridAgent):
     def __init__(self, name: str):
         super().__init__(name)
         self.user_queries = []
-        self.last_report = None
-        self.processing_report = False  # Flag to prevent duplicate report generation
+        self.last_report = None  # Most recent report for any user
+        self.reports = {}  # Latest report per user_id
+        self.processing_reports = set()  # Keys of sessions generating a report, to prevent duplicates
         
         # Set up behavior layers for subsumption architecture
         # Lower layers are overridden by higher layers
@@ -614,34 +600,29 @@ class UserInterfaceAgent(HybridAgent):
     
     def handle_new_report(self, agent, report_id):
         """React to new report availability"""
-        self.log_activity(f"New report {report_id} is available")
+        self.log_activity("New report %s is available", report_id)
         
-        # Request the report
-        for agent in agent_registry:
-            if agent.name != self.name:
-                self.send_message(
-                    agent,
-                    SpeechAct.REQUEST,
-                    {"action": "get_report", "report_id": report_id}
-                )
+        # Request the report from the agents serving reports
+        self.publish("get_report", {"action": "get_report", "report_id": report_id}, SpeechAct.REQUEST)
     
     def interpret_message(self, message: Message) -> None:
         """Process messages with special handling for reports using subsumption architecture"""
         super().interpret_message(message)
         
         # Generate a report when we receive recommendations and fitness data (report_generation layer)
-        if message.speech_act == SpeechAct.INFORM and "recommendations" in message.content and not self.processing_report:
+        session_key = self.session.key
+        if message.speech_act == SpeechAct.INFORM and "recommendations" in message.content and session_key not in self.processing_reports:
             self.log_activity("Subsumption: Activating report_generation layer")
             
-            # Set flag to prevent duplicate report generation
-            self.processing_report = True
+            # Mark the session to prevent duplicate report generation
+            self.processing_reports.add(session_key)
             
             # Store the recommendations
             self.add_belief(Belief("recommendations", message.content["recommendations"]))
             
             if "fitness_data" in message.content:
-                # New analysis started - clear previous report
-                self.last_report = None
+                # New analysis started - clear the user's previous report
+                self.reports.pop(message.content["fitness_data"].get("user_id"), None)
                 
                 # Store new fitness data
                 self.add_belief(Belief("fitness_data", message.content["fitness_data"]))
@@ -650,14 +631,15 @@ class UserInterfaceAgent(HybridAgent):
                 self.add_belief(Belief("fitness_level", message.content["fitness_level"]))
             
             # Create desire to generate a report
-            if not any(d.name == "generate_report" for d in self.desires):
+            if "generate_report" not in self.desires:
                 self.add_desire(Desire("generate_report", priority=0.9))
                 
         # Store report when received from another agent (report_display layer)
         elif message.speech_act == SpeechAct.INFORM and "fitness_report" in message.content:
             self.log_activity("Subsumption: Activating report_display layer")
             self.last_report = message.content["fitness_report"]
-            self.log_activity(f"Received report {self.last_report['report_id']}")
+            self.reports[self.last_report["user_id"]] = self.last_report
+            self.log_activity("Received report %s", self.last_report['report_id'])
     
     def deliberate(self) -> None:
         """Update desires based on beliefs using subsumption architecture"""
@@ -665,7 +647,8 @@ class UserInterfaceAgent(HybridAgent):
         recommendations = self.get_belief("recommendations")
         fitness_data = self.get_belief("fitness_data")
         
-        if recommendations and fitness_data and not self.last_report and not any(d.name == "generate_report" for d in self.desires):
+        if (recommendations and fitness_data and fitness_data.value.get("user_id") not in self.reports
+                and "generate_report" not in self.desires):
             self.log_activity("Subsumption: report_generation layer creating desire")
             self.add_desire(Desire("generate_report", priority=0.9))
     
@@ -675,27 +658,23 @@ class UserInterfaceAgent(HybridAgent):
         active_layer = None
         
         # Determine which layer should be active based on current state
-        if any(d.name == "generate_report" for d in self.desires):
+        if "generate_report" in self.desires:
             active_layer = "report_generation"
         elif not self.get_belief("fitness_data"):
             active_layer = "data_collection"
         else:
             active_layer = "report_display"
             
-        self.log_activity(f"Subsumption: Active layer is '{active_layer}'")
+        self.log_activity("Subsumption: Active layer is '%s'", active_layer, level=LogLevel.DEBUG)
         
         # Call parent implementation for basic planning
         super().plan()
         
-        # Clear completed intentions
-        self.intentions = [i for i in self.intentions if not i.completed]
-        
         # Only plan if we don't have active intentions
         if not self.intentions:
             # Get highest priority unachieved desire
-            active_desires = [d for d in self.desires if not d.achieved]
-            if active_desires:
-                desire = active_desires[0]
+            desire = self.desires.peek()
+            if desire:
                 
                 # Handle different layers with appropriate intentions
                 if active_layer == "report_generation" and desire.name == "generate_report":
@@ -709,69 +688,55 @@ class UserInterfaceAgent(HybridAgent):
                     self.log_activity("Subsumption: Creating intention in data_collection layer")
                     self.add_intention(Intention(
                         "request_fitness_data",
-                        {"user_id": "current_user"},
+                        {"user_id": "current_user" if self.session.key is None else self.session.key},
                         desire
                     ))
     
-    def execute(self) -> None:
-        """Execute both reactive rules and deliberative plans using subsumption architecture"""
-        # First, reactive layer (higher priority)
-        for belief in self.beliefs:
-            if belief.predicate in self.reactive_rules:
-                self.log_activity(f"Reactive: Triggering rule for {belief.predicate}")
-                self.reactive_rules[belief.predicate](self, belief.value)
+    def handle_compile_fitness_report(self, intention: Intention) -> bool:
+        """Action handler: compile the report for display (report_generation layer)
         
-        # Then, deliberative layer
-        for intention in self.intentions[:]:  # Create a copy to iterate over
-            if not intention.completed:
-                self.log_activity(f"Deliberative: Executing {intention.action}")
-                
-                if intention.action == "compile_fitness_report":
-                    # Get the necessary data from beliefs
-                    fitness_data = self.get_belief("fitness_data")
-                    recommendations = self.get_belief("recommendations")
-                    fitness_level = self.get_belief("fitness_level")
-                    
-                    if fitness_data and recommendations:
-                        # Generate the report
-                        report = self.generate_report(
-                            fitness_data.value, 
-                            recommendations.value,
-                            fitness_level.value if fitness_level else "Unknown"
-                        )
-                        
-                        # Store the report
-                        self.last_report = report
-                        self.add_belief(Belief("fitness_report", report))
-                        
-                        # Mark as completed and move to history
-                        self.complete_intention(intention)
-                        self.intentions.remove(intention)
-                        
-                        self.log_activity(f"Generated fitness report {report['report_id']}")
-                        
-                        # Reset processing flag
-                        self.processing_report = False
-                            
-                # Handle other intentions with parent implementation
-                else:
-                    super().execute()
+        Other actions, such as request_fitness_data, use the HybridAgent handlers.
+        """
+        # Get the necessary data from beliefs
+        fitness_data = self.get_belief("fitness_data")
+        recommendations = self.get_belief("recommendations")
+        fitness_level = self.get_belief("fitness_level")
+        
+        if not (fitness_data and recommendations):
+            return False
+        
+        # Generate the report
+        report = self.generate_report(
+            fitness_data.value, 
+            recommendations.value,
+            fitness_level.value if fitness_level else "Unknown"
+        )
+        
+        # Store the report
+        self.last_report = report
+        self.reports[report["user_id"]] = report
+        self.add_belief(Belief("fitness_report", report))
+        
+        self.log_activity("Generated fitness report %s", report['report_id'])
+        
+        # Reset processing flag
+        self.processing_reports.discard(self.session.key)
+        return True
     
     def process_user_input(self, query: str) -> str:
         """Process user queries and commands"""
-        self.log_activity(f"Processing user input: {query}")
+        self.log_activity("Processing user input: %s", query)
         self.user_queries.append(query)
         
         # Simple command processing
         if "start analysis" in query.lower():
             # Request fitness data collection
-            for agent in agent_registry:
-                if isinstance(agent, FitnessDataAgent):
-                    self.send_message(
-                        agent,
-                        SpeechAct.REQUEST,
-                        {"action": "retrieve_fitness_data", "user_id": "current_user"}
-                    )
+            for agent in agent_registry.with_capability("retrieve_fitness_data"):
+                self.send_message(
+                    agent,
+                    SpeechAct.REQUEST,
+                    {"action": "retrieve_fitness_data", "user_id": "current_user"}
+                )
             return "Starting fitness analysis..."
         
         elif "show report" in query.lower():
@@ -820,7 +785,7 @@ RECOMMENDATIONS:
             "user_id": fitness_data.get("user_id", "default_user"),
             "metrics": {
                 "steps": fitness_data.get("steps", 0),
-                "heart_rate_avg": sum(fitness_data.get("heart_rate", [70])) / len(fitness_data.get("heart_rate", [70])),
+                "heart_rate_avg": heart_rate_stats(fitness_data).mean,
                 "calories": fitness_data.get("calories", 0),
                 "sleep_hours": fitness_data.get("sleep_hours", 0)
             },
@@ -828,23 +793,8 @@ RECOMMENDATIONS:
             "recommendations": recommendations
         }
         
-        self.log_activity(f"Generated report {report['report_id']}")
+        self.log_activity("Generated report %s", report['report_id'])
         return report
-    
-    def determine_fitness_level(self, fitness_data) -> str:
-        """Determine fitness level based on data"""
-        steps = fitness_data.get("steps", 0)
-        heart_rate = fitness_data.get("heart_rate", [70])
-        avg_hr = sum(heart_rate) / len(heart_rate)
-        
-        if steps > 10000 and avg_hr < 85:
-            return "Excellent"
-        elif steps > 7500:
-            return "Good"
-        elif steps > 5000:
-            return "Average"
-        else:
-            return "Below target"
 
 # Import at the end to avoid circular imports
 from base_agent import agent_registry 
\ No newline at end of file
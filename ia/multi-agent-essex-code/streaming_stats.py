@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+
+import math
+from typing import Dict, Any, Iterable, Mapping, Optional
+
+# Heart rate (BPM) above which a sample counts as a spike
+SPIKE_HEART_RATE = 140
+
+
+class StreamingStats:
+    """Running summary of a numeric series, updated one sample at a time
+
+    Tracks count, mean, min, max, variance and how many samples exceed
+    `threshold` without keeping the samples. The mean is the running total
+    divided by the count, so for integer samples it equals
+    sum(samples) / len(samples) exactly; the variance uses Welford's update,
+    which stays accurate for long series.
+    """
+    __slots__ = ("threshold", "count", "total", "min", "max", "exceedances", "_mean", "_m2")
+
+    def __init__(self, threshold: float = SPIKE_HEART_RATE, samples: Iterable[float] = ()):
+        self.threshold = threshold
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+        self.exceedances = 0
+        self._mean = 0.0  # Welford running mean, only used for the variance
+        self._m2 = 0.0
+        self.extend(samples)
+
+    def add(self, sample: float) -> None:
+        """Fold one sample into the summary"""
+        self.count += 1
+        self.total += sample
+        if self.min is None or sample < self.min:
+            self.min = sample
+        if self.max is None or sample > self.max:
+            self.max = sample
+        if sample > self.threshold:
+            self.exceedances += 1
+        delta = sample - self._mean
+        self._mean += delta / self.count
+        self._m2 += delta * (sample - self._mean)
+
+    def extend(self, samples: Iterable[float]) -> None:
+        """Fold a block of samples into the summary
+
+        The block is summarized in one linear pass (Welford's update for its
+        variance, with min, max and the exceedance count alongside) and then
+        merged with Chan et al.'s parallel update, which gives the same result
+        as calling add() for each sample.
+        """
+        iterator = iter(samples)
+        for first in iterator:
+            break
+        else:
+            return
+        threshold = self.threshold
+        count, total, mean, m2 = 1, first, first, 0.0
+        low = high = first
+        exceedances = 1 if first > threshold else 0
+        for sample in iterator:
+            count += 1
+            total += sample
+            delta = sample - mean
+            mean += delta / count
+            m2 += delta * (sample - mean)
+            if sample < low:
+                low = sample
+            elif sample > high:
+                high = sample
+            if sample > threshold:
+                exceedances += 1
+
+        self.total += total
+        if self.min is None or low < self.min:
+            self.min = low
+        if self.max is None or high > self.max:
+            self.max = high
+        self.exceedances += exceedances
+
+        combined = self.count + count
+        delta = mean - self._mean
+        self._m2 += m2 + delta * delta * self.count * count / combined
+        self._mean += delta * count / combined
+        self.count = combined
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else math.nan
+
+    @property
+    def variance(self) -> float:
+        """Population variance of the samples so far"""
+        return self._m2 / self.count if self.count else math.nan
+
+    @property
+    def stdev(self) -> float:
+        return math.sqrt(self.variance)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Plain values, so a summary can travel in message content and journals"""
+        return {
+            "count": self.count,
+            "total": self.total,
+            "min": self.min,
+            "max": self.max,
+            "threshold": self.threshold,
+            "exceedances": self.exceedances,
+            "welford_mean": self._mean,
+            "m2": self._m2
+        }
+
+    @classmethod
+    def from_dict(cls, data: Mapping[str, Any]) -> "StreamingStats":
+        stats = cls(data["threshold"])
+        stats.count = data["count"]
+        stats.total = data["total"]
+        stats.min = data["min"]
+        stats.max = data["max"]
+        stats.exceedances = data["exceedances"]
+        stats._mean = data["welford_mean"]
+        stats._m2 = data["m2"]
+        return stats
+
+    def __repr__(self):
+        return (f"StreamingStats(count={self.count}, mean={self.mean:.1f}, min={self.min}, max={self.max}, "
+                f"variance={self.variance:.1f}, exceedances={self.exceedances} > {self.threshold})")
+
+
+def heart_rate_stats(fitness_data: Mapping[str, Any], threshold: Optional[float] = None,
+                     default: Iterable[float] = (70,)) -> StreamingStats:
+    """The heart-rate summary of a fitness_data record
+
+    Uses the summary shipped in "heart_rate_stats" (a StreamingStats or its
+    to_dict() form) when its spike threshold matches `threshold`, or any
+    threshold when None. Otherwise the samples in "heart_rate" (or `default`
+    when there are none) are summarized in a single pass.
+    """
+    summary = fitness_data.get("heart_rate_stats")
+    if summary is not None:
+        if not isinstance(summary, StreamingStats):
+            summary = StreamingStats.from_dict(summary)
+        if threshold is None or summary.threshold == threshold:
+            return summary
+    return StreamingStats(SPIKE_HEART_RATE if threshold is None else threshold,
+                          fitness_data.get("heart_rate", default))
@@ -2,20 +2,36 @@
 
 import sys
 import os
+import json
+import pickle
+import tempfile
+import threading
+import time
 import unittest
 from unittest.mock import patch, MagicMock
 import random
+import statistics
 from enum import Enum
-from datetime import datetime
+from datetime import datetime, timedelta
 
 # Add parent directory to path so we can import our modules
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 # Import the modules we want to test
-from base_agent import Agent, Belief, Desire, Intention, SpeechAct, Message, agent_registry
+from base_agent import Agent, ActivityLog, Belief, BeliefStore, ConversationTable, Scheduler, Desire, DesireAgenda, Intention, LogLevel, Mailbox, MessageDispatcher, SpeechAct, Message, agent_registry, monotonic_to_wall_ns
 from specialized_agents import ReactiveAgent, DeliberativeAgent, HybridAgent, FitnessDataAgent, AnalysisAgent, UserInterfaceAgent
 from fitness_ontology import FitnessOntology, OntologyClass, fitness_ontology, convert_fitness_data_to_ontology
 from fitness_mas import FitnessMAS
+from journal import Journal
+from message_log import MessageLog
+from rules import DEFAULT_RULES_PATH, Rule, RuleSet, rule_set
+from streaming_stats import SPIKE_HEART_RATE, StreamingStats, heart_rate_stats
+from wire import compare_formats, decode_message, encode_message
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 class TestBaseAgent(unittest.TestCase):
     """Test cases for the base Agent classes and BDI components"""
@@ -90,6 +106,215 @@ class TestBaseAgent(unittest.TestCase):
         self.assertEqual(message.content, {"data": "test_data"})
 
 
+class TestValueObjects(unittest.TestCase):
+    """Test cases for the slotted Belief, Desire, Intention and Message classes"""
+    
+    def test_slots(self):
+        """Test that value objects carry no per-instance __dict__"""
+        objects = [
+            Belief("steps", 1000),
+            Desire("analyze_fitness"),
+            Intention("analyze_fitness_data", {}),
+            Message("A", "B", SpeechAct.INFORM, {})
+        ]
+        for obj in objects:
+            self.assertFalse(hasattr(obj, "__dict__"), type(obj).__name__)
+    
+    def test_lazy_timestamps(self):
+        """Test that monotonic creation times convert to datetimes"""
+        before = datetime.now()
+        belief = Belief("steps", 1000)
+        message = Message("A", "B", "inform", {"steps": 1000})
+        self.assertIsInstance(belief.timestamp, datetime)
+        self.assertLess(abs((belief.timestamp - before).total_seconds()), 1)
+        self.assertLessEqual(belief.created_ns, message.created_ns)
+        self.assertIs(message.speech_act, SpeechAct.INFORM)
+    
+    def test_str_and_eq_preserved(self):
+        """Test that string forms and equality are unchanged"""
+        self.assertEqual(str(Belief("steps", 1000)), "steps(1000) [conf=1.00]")
+        self.assertEqual(Belief("steps", 1000), Belief("steps", 1000, confidence=0.5))
+        self.assertNotEqual(Belief("steps", 1000), Belief("steps", 2000))
+        self.assertEqual(str(Desire("goal", priority=0.5)), "○ goal (priority=0.50)")
+        self.assertEqual(str(Intention("act", {"a": 1})), "○ act(a=1)")
+        self.assertEqual(str(Message("A", "B", SpeechAct.QUERY, {})), "Message(query: A → B)")
+
+
+class TestBeliefStore(unittest.TestCase):
+    """Test cases for the indexed, versioned belief store"""
+    
+    def setUp(self):
+        self.store = BeliefStore()
+    
+    def test_upsert_and_lookup(self):
+        """Test that one belief is kept per predicate"""
+        self.assertTrue(self.store.upsert(Belief("steps", 1000)))
+        self.assertTrue(self.store.upsert(Belief("steps", 2000)))
+        self.assertEqual(len(self.store), 1)
+        self.assertEqual(self.store.get("steps").value, 2000)
+        self.assertIn("steps", self.store)
+        self.assertIsNone(self.store.get("sleep_hours"))
+    
+    def test_versions(self):
+        """Test per-predicate and global version counters"""
+        self.store.upsert(Belief("steps", 1000))
+        self.store.upsert(Belief("sleep_hours", 7.5))
+        self.store.upsert(Belief("steps", 2000))
+        self.assertEqual(self.store.version_of("steps"), 2)
+        self.assertEqual(self.store.version_of("sleep_hours"), 1)
+        self.assertEqual(self.store.version, 3)
+        
+        # Re-asserting the same value is not a change
+        self.assertFalse(self.store.upsert(Belief("steps", 2000)))
+        self.assertEqual(self.store.version_of("steps"), 2)
+        
+        self.store.remove("steps")
+        self.assertNotIn("steps", self.store)
+        self.assertEqual(self.store.version, 4)
+    
+    def test_iteration(self):
+        """Test that the store iterates over Belief objects"""
+        self.store.upsert(Belief("steps", 1000))
+        self.store.upsert(Belief("sleep_hours", 7.5))
+        self.assertEqual({b.predicate for b in self.store}, {"steps", "sleep_hours"})
+
+
+class TestDesireAgenda(unittest.TestCase):
+    """Test cases for the heap-based desire agenda"""
+    
+    def setUp(self):
+        self.agenda = DesireAgenda()
+    
+    def test_peek_highest_priority(self):
+        """Test that peek returns the highest-priority unachieved desire"""
+        self.agenda.add(Desire("low", priority=0.1))
+        self.agenda.add(Desire("high", priority=0.9))
+        self.agenda.add(Desire("medium", priority=0.5))
+        self.assertEqual(self.agenda.peek().name, "high")
+        self.assertEqual([d.name for d in self.agenda], ["high", "medium", "low"])
+    
+    def test_achieved_desires_are_skipped(self):
+        """Test lazy removal of achieved desires from the agenda top"""
+        high = Desire("high", priority=0.9)
+        self.agenda.add(high)
+        self.agenda.add(Desire("low", priority=0.1))
+        high.achieved = True
+        self.assertEqual(self.agenda.peek().name, "low")
+        self.assertEqual([d.name for d in self.agenda.active()], ["low"])
+        
+        # Achieved desires are still known by name and still listed
+        self.assertIn("high", self.agenda)
+        self.assertEqual(len(self.agenda), 2)
+    
+    def test_ties_keep_insertion_order(self):
+        """Test that equal priorities are served first-come first-served"""
+        self.agenda.add(Desire("first", priority=0.5))
+        self.agenda.add(Desire("second", priority=0.5))
+        self.assertEqual(self.agenda.peek().name, "first")
+        self.assertEqual(self.agenda[1].name, "second")
+
+
+class TestIntentionExecutor(unittest.TestCase):
+    """Test cases for table-driven intention dispatch"""
+    
+    def setUp(self):
+        self.agent = DeliberativeAgent("TestExecutorAgent")
+    
+    def test_dispatch_and_counts(self):
+        """Test that handlers run once per cycle and completed intentions are removed"""
+        calls = []
+        
+        def handler(intention):
+            calls.append(intention.params["n"])
+            # Queue a follow-up intention; it must wait for the next cycle
+            if intention.params["n"] == 1:
+                self.agent.add_intention(Intention("count", {"n": 2}))
+            return True
+        
+        self.agent.register_action("count", handler)
+        self.agent.add_intention(Intention("count", {"n": 1}))
+        
+        self.assertEqual(self.agent.execute_intentions(), 1)
+        self.assertEqual(calls, [1])
+        self.assertEqual(len(self.agent.intentions), 1)
+        
+        self.agent.execute_intentions()
+        self.assertEqual(calls, [1, 2])
+        self.assertEqual(len(self.agent.intentions), 0)
+        self.assertEqual(self.agent.actions.counts["count"], 2)
+        self.assertEqual(self.agent.completed_intentions[-1].params["n"], 2)
+    
+    def test_incomplete_intention_stays_pending(self):
+        """Test that a handler returning False keeps its intention"""
+        self.agent.register_action("wait", lambda intention: False)
+        intention = Intention("wait", {})
+        self.agent.add_intention(intention)
+        
+        self.assertEqual(self.agent.execute_intentions(), 0)
+        self.assertIn(intention, self.agent.intentions)
+        self.assertFalse(intention.completed)
+        
+        self.agent.intentions.remove(intention)
+        self.assertEqual(len(self.agent.intentions), 0)
+        with self.assertRaises(ValueError):
+            self.agent.intentions.remove(intention)
+
+
+class TestActivityLog(unittest.TestCase):
+    """Test cases for the ring-buffer activity log"""
+    
+    def test_capacity_and_lazy_formatting(self):
+        """Test that the log keeps only the newest records and formats on read"""
+        log = ActivityLog("TestAgent", capacity=3)
+        for i in range(5):
+            log.record(LogLevel.INFO, "event %s", (i,))
+        
+        self.assertEqual(len(log), 3)
+        self.assertEqual([record[3] for record in log.records()], [(2,), (3,), (4,)])
+        lines = list(log)
+        self.assertTrue(lines[0].endswith("TestAgent: event 2"))
+        self.assertTrue(log[-1].endswith("TestAgent: event 4"))
+    
+    def test_log_levels(self):
+        """Test that hot-path logging can be switched off at runtime"""
+        agent = DeliberativeAgent("TestLogAgent")
+        agent.add_belief(Belief("steps", 1000))
+        self.assertTrue(any("Updated belief: steps(1000)" in line for line in agent.log))
+        
+        agent.log.clear()
+        agent.log.level = LogLevel.INFO
+        agent.add_belief(Belief("steps", 2000))
+        agent.log_activity("Milestone")
+        self.assertEqual(len(agent.log), 1)
+        
+        agent.log.level = LogLevel.OFF
+        agent.log_activity("Milestone")
+        self.assertEqual(len(agent.log), 1)
+    
+    def test_no_log_arguments_built_when_off(self):
+        """Test that hot paths do not build log arguments that would be discarded"""
+        class WatchedList(list):
+            slices = 0
+            def __getitem__(self, index):
+                WatchedList.slices += isinstance(index, slice)
+                return super().__getitem__(index)
+        
+        class WatchedDict(dict):
+            iterations = 0
+            def __iter__(self):
+                WatchedDict.iterations += 1
+                return super().__iter__()
+        
+        analysis = AnalysisAgent("QuietAnalysis")
+        agent = DeliberativeAgent("QuietAgent")
+        for log_agent in (analysis, agent):
+            log_agent.log.level = LogLevel.OFF
+        analysis.analyze_fitness_data(9000, WatchedList([70, 80, 90]), 8.0)
+        agent.add_beliefs(WatchedDict(steps=1000))
+        self.assertEqual((WatchedList.slices, WatchedDict.iterations), (0, 0))
+        self.assertEqual(agent.get_belief("steps").value, 1000)
+
+
 class TestReactiveAgent(unittest.TestCase):
     """Test cases for reactive agent behavior"""
     
@@ -122,6 +347,467 @@ class TestReactiveAgent(unittest.TestCase):
         args = mock_rule.call_args[0]
         self.assertEqual(args[0], self.agent)
         self.assertEqual(args[1]["param"], "value")
+    
+    def test_rule_fires_only_on_change(self):
+        """Test that belief-triggered rules fire once per added or changed belief"""
+        mock_rule = MagicMock()
+        self.agent.add_rule("report_available", mock_rule)
+        
+        self.agent.add_belief(Belief("report_available", "FR-1"))
+        self.agent.execute()
+        self.agent.execute()
+        mock_rule.assert_called_once_with(self.agent, "FR-1")
+        
+        # Re-asserting the same value does not re-fire the rule
+        self.agent.add_belief(Belief("report_available", "FR-1"))
+        self.agent.execute()
+        self.assertEqual(mock_rule.call_count, 1)
+        
+        # A changed value does
+        self.agent.add_belief(Belief("report_available", "FR-2"))
+        self.agent.execute()
+        self.assertEqual(mock_rule.call_count, 2)
+        self.assertEqual(mock_rule.call_args[0][1], "FR-2")
+
+
+class TestMessageDispatcher(unittest.TestCase):
+    """Test cases for mailboxes and deferred delivery"""
+    
+    def setUp(self):
+        self.dispatcher = MessageDispatcher()
+        self.sender = DeliberativeAgent("DispatchSender")
+        self.receiver = DeliberativeAgent("DispatchReceiver")
+        self.sender.dispatcher = self.dispatcher
+    
+    def test_delivery_at_cycle_boundary(self):
+        """Test that messages are only visible after deliver()"""
+        self.sender.send_message(self.receiver, SpeechAct.INFORM, {"steps": 1000})
+        self.sender.send_message(self.receiver, SpeechAct.INFORM, {"steps": 2000})
+        self.assertEqual(len(self.receiver.message_queue), 0)
+        self.assertEqual(len(self.dispatcher), 2)
+        
+        self.assertEqual(self.dispatcher.deliver(), 2)
+        self.assertEqual(len(self.dispatcher), 0)
+        self.assertEqual([m.content["steps"] for m in self.receiver.message_queue], [1000, 2000])
+        
+        # Messages are interpreted in arrival order
+        self.receiver.process_messages()
+        self.assertEqual(self.receiver.get_belief("steps").value, 2000)
+        self.assertEqual(len(self.receiver.message_queue), 0)
+    
+    def test_coalescing(self):
+        """Test that consecutive INFORMs to one receiver are delivered as one batch"""
+        dispatcher = MessageDispatcher(coalesce=True)
+        self.sender.dispatcher = dispatcher
+        first = self.sender.send_message(self.receiver, SpeechAct.INFORM, {"steps": 1000, "calories": 2000})
+        second = self.sender.send_message(self.receiver, SpeechAct.INFORM, {"steps": 2000})
+        self.sender.send_message(self.receiver, SpeechAct.REQUEST, {"action": "analyze"})
+        self.sender.send_message(self.receiver, SpeechAct.INFORM, {"sleep_hours": 7.5})
+        
+        # The REQUEST ends the first run, so ordering is preserved
+        self.assertEqual(dispatcher.deliver(), 3)
+        self.assertEqual(dispatcher.coalesced, 1)
+        batch = self.receiver.message_queue[0]
+        self.assertEqual(batch.messages, [first, second])
+        self.assertEqual(batch.content, {"steps": 2000, "calories": 2000})
+        self.assertEqual(self.receiver.message_queue[1].speech_act, SpeechAct.REQUEST)
+        
+        # Batches go through interpret_batch; later keys win
+        with patch.object(DeliberativeAgent, "interpret_batch", autospec=True,
+                          side_effect=DeliberativeAgent.interpret_batch) as interpret_batch:
+            self.receiver.process_messages()
+        interpret_batch.assert_called_once_with(self.receiver, batch)
+        self.assertEqual(self.receiver.get_belief("steps").value, 2000)
+        self.assertEqual(self.receiver.get_belief("calories").value, 2000)
+        self.assertEqual(self.receiver.get_belief("sleep_hours").value, 7.5)
+    
+    def test_mailbox_capacity(self):
+        """Test that a full mailbox rejects and counts new messages"""
+        mailbox = Mailbox(capacity=2)
+        for i in range(3):
+            mailbox.append(Message("A", "B", SpeechAct.INFORM, {"n": i}))
+        self.assertEqual(len(mailbox), 2)
+        self.assertEqual(mailbox.dropped, 1)
+        self.assertEqual(mailbox.popleft().content["n"], 0)
+
+
+class TestAgentDirectory(unittest.TestCase):
+    """Test cases for indexed agent lookup"""
+    
+    def setUp(self):
+        self.original_registry = agent_registry.copy()
+        agent_registry.clear()
+        self.data_agent = FitnessDataAgent("DirData")
+        self.analysis_agent = AnalysisAgent("DirAnalysis")
+        self.ui_agent = UserInterfaceAgent("DirUI")
+    
+    def tearDown(self):
+        agent_registry.clear()
+        agent_registry.extend(self.original_registry)
+    
+    def test_list_behaviour(self):
+        """Test that the directory keeps registration order and list operations"""
+        self.assertEqual(agent_registry.copy(), [self.data_agent, self.analysis_agent, self.ui_agent])
+        self.assertIn(self.ui_agent, agent_registry)
+        agent_registry.append(self.ui_agent)  # Re-registering is a no-op
+        self.assertEqual(len(agent_registry), 3)
+    
+    def test_indexes(self):
+        """Test lookups by name, class, agent_type and capability"""
+        self.assertIs(agent_registry.get("DirAnalysis"), self.analysis_agent)
+        self.assertIsNone(agent_registry.get("Nobody"))
+        self.assertEqual(agent_registry.by_class(DeliberativeAgent), [self.analysis_agent])
+        self.assertEqual(agent_registry.by_class(HybridAgent), [self.ui_agent])
+        self.assertEqual(len(agent_registry.by_class(Agent)), 3)
+        self.assertEqual(agent_registry.by_type("reactive"), [self.data_agent])
+        self.assertEqual(agent_registry.with_capability("retrieve_fitness_data"), [self.data_agent])
+        
+        # Capabilities declared after registration are indexed too
+        self.analysis_agent.declare_capability("analyze")
+        self.assertEqual(agent_registry.with_capability("analyze"), [self.analysis_agent])
+    
+    def test_remove(self):
+        """Test that removal updates every index"""
+        agent_registry.remove(self.data_agent)
+        self.assertNotIn(self.data_agent, agent_registry)
+        self.assertIsNone(agent_registry.get("DirData"))
+        self.assertEqual(agent_registry.by_class(ReactiveAgent), [])
+        self.assertEqual(agent_registry.with_capability("retrieve_fitness_data"), [])
+        with self.assertRaises(ValueError):
+            agent_registry.remove(self.data_agent)
+
+
+class TestPublishSubscribe(unittest.TestCase):
+    """Test cases for topic-based publish/subscribe"""
+    
+    def setUp(self):
+        self.publisher = DeliberativeAgent("PubPublisher")
+        self.subscriber = DeliberativeAgent("PubSubscriber")
+        self.bystander = DeliberativeAgent("PubBystander")
+        self.subscriber.subscribe("recommendations")
+    
+    def test_delivered_only_to_subscribers(self):
+        """Test that one shared, read-only message reaches subscribers only"""
+        self.publisher.subscribe("recommendations")  # Publishers never receive their own messages
+        message = self.publisher.publish("recommendations", {"recommendations": ["Walk more"]})
+        
+        self.assertEqual(len(self.bystander.message_queue), 0)
+        self.assertEqual(len(self.publisher.message_queue), 0)
+        self.assertIs(self.subscriber.message_queue[0], message)
+        self.assertEqual(message.receiver, "topic:recommendations")
+        with self.assertRaises(TypeError):
+            message.content["recommendations"] = []
+        
+        self.subscriber.process_messages()
+        self.assertEqual(self.subscriber.get_belief("recommendations").value, ["Walk more"])
+    
+    def test_unsubscribe(self):
+        """Test that unsubscribed agents stop receiving messages"""
+        self.subscriber.unsubscribe("recommendations")
+        self.publisher.publish("recommendations", {"recommendations": []})
+        self.assertEqual(len(self.subscriber.message_queue), 0)
+    
+    def test_logged_for_subscribers(self):
+        """Test that the message log finds a published message by each subscriber"""
+        with tempfile.TemporaryDirectory() as directory:
+            log = MessageLog(directory)
+            self.publisher.message_log = log
+            self.publisher.publish("recommendations", {"recommendations": ["Stretch"]})
+            log.close()
+            
+            self.assertEqual(len(self.subscriber.message_queue), 1)
+            self.assertEqual(len(list(log.query(agent="PubSubscriber"))), 1)
+            self.assertEqual(len(list(log.query(agent="PubBystander"))), 0)
+            # The index survives reopening the log
+            self.assertEqual(len(list(MessageLog(directory).query(agent="PubSubscriber"))), 1)
+    
+    def test_pickle_round_trip(self):
+        """Test that published messages survive pickling (used by the sharded runtime)"""
+        message = self.publisher.publish("recommendations", {"recommendations": ["Rest"]})
+        copy = pickle.loads(pickle.dumps(message))
+        self.assertEqual(dict(copy.content), {"recommendations": ["Rest"]})
+        self.assertEqual(copy.created_ns, message.created_ns)
+        with self.assertRaises(TypeError):
+            copy.content["recommendations"] = []
+
+
+class TestConversations(unittest.TestCase):
+    """Test cases for conversation ids, reply correlation and timeouts"""
+    
+    def setUp(self):
+        self.requester = DeliberativeAgent("ConvRequester")
+        self.responder = DeliberativeAgent("ConvResponder")
+        self.responder.add_belief(Belief("steps", 8000))
+    
+    def test_unique_ids(self):
+        """Test that messages created together get distinct conversation ids"""
+        ids = {Message("A", "B", SpeechAct.INFORM, {}).conversation_id for _ in range(100)}
+        self.assertEqual(len(ids), 100)
+    
+    def test_reply_closes_conversation(self):
+        """Test that an INFORM reply is correlated with its QUERY"""
+        query = self.requester.send_message(self.responder, SpeechAct.QUERY, {"query": "steps"})
+        key = self.requester.request_key(self.responder.name, {"query": "steps"})
+        self.assertIn(query.conversation_id, self.requester.conversations)
+        self.assertTrue(self.requester.conversations.pending(key))
+        
+        self.responder.process_messages()
+        self.requester.process_messages()
+        self.assertEqual(self.requester.get_belief("steps").value, 8000)
+        self.assertNotIn(query.conversation_id, self.requester.conversations)
+        self.assertFalse(self.requester.conversations.pending(key))
+    
+    def test_timeout(self):
+        """Test that unanswered requests expire at their deadline"""
+        table = ConversationTable(timeout=1.0)
+        request = Message("A", "B", SpeechAct.REQUEST, {"action": "x"})
+        table.open(request, ("B", "x"))
+        self.assertEqual(table.expire(request.created_ns), [])
+        expired = table.expire(request.created_ns + int(1e9))
+        self.assertEqual([c.conversation_id for c in expired], [request.conversation_id])
+        self.assertFalse(table.pending(("B", "x")))
+        self.assertEqual(len(table), 0)
+    
+    def test_no_duplicate_requests(self):
+        """Test that a hybrid agent does not re-request data while waiting for it"""
+        data_agent = FitnessDataAgent("ConvDataAgent")
+        hybrid = HybridAgent("ConvHybrid")
+        for _ in range(3):
+            hybrid.step()
+        requests = [m for m in data_agent.message_queue if m.sender == hybrid.name]
+        self.assertEqual(len(requests), 1)
+    
+    def test_falsy_session_keys_are_kept(self):
+        """Test that data is requested for session keys such as "" and 0, not for current_user"""
+        hybrid = HybridAgent("KeyHybrid")
+        for key in ("", 0):
+            with hybrid.in_session(key):
+                hybrid.add_desire(Desire("get_fitness_data"))
+                hybrid.plan()
+                self.assertEqual([intention.params["user_id"] for intention in hybrid.intentions], [key])
+
+
+class TestSessions(unittest.TestCase):
+    """Test cases for per-session beliefs, desires and intentions"""
+    
+    def setUp(self):
+        self.sender = DeliberativeAgent("SessionSender")
+        self.receiver = DeliberativeAgent("SessionReceiver")
+    
+    def test_isolation(self):
+        """Test that sessions do not see each other's mental state"""
+        with self.receiver.in_session("alice"):
+            self.receiver.add_belief(Belief("steps", 1000))
+            self.receiver.add_desire(Desire("analyze_fitness"))
+        with self.receiver.in_session("bob"):
+            self.receiver.add_belief(Belief("steps", 2000))
+            self.assertNotIn("analyze_fitness", self.receiver.desires)
+        
+        self.assertIsNone(self.receiver.get_belief("steps"))
+        self.assertEqual(self.receiver.sessions["alice"].beliefs.get("steps").value, 1000)
+        self.assertEqual(self.receiver.sessions["bob"].beliefs.get("steps").value, 2000)
+        self.assertTrue(self.receiver.has_work())
+        
+        self.receiver.end_session("alice")
+        self.assertNotIn("alice", self.receiver.sessions)
+        with self.assertRaises(ValueError):
+            self.receiver.end_session(None)
+    
+    def test_messages_stay_in_session(self):
+        """Test that a message is interpreted in the receiver's session with the sender's key"""
+        with self.sender.in_session("alice"):
+            message = self.sender.send_message(self.receiver, SpeechAct.INFORM, {"steps": 4000})
+        self.sender.send_message(self.receiver, SpeechAct.INFORM, {"steps": 9000})
+        self.assertEqual(message.session, "alice")
+        
+        self.receiver.step()
+        self.assertEqual(self.receiver.sessions["alice"].beliefs.get("steps").value, 4000)
+        self.assertEqual(self.receiver.get_belief("steps").value, 9000)
+        self.assertIn(self.receiver.sessions["alice"], self.receiver.stepped_sessions)
+    
+    def test_no_coalescing_across_sessions(self):
+        """Test that INFORMs from different sessions are not merged"""
+        dispatcher = MessageDispatcher(coalesce=True)
+        for agent in (self.sender, self.receiver):
+            agent.dispatcher = dispatcher
+            dispatcher.register(agent)
+        for user in ("alice", "bob"):
+            with self.sender.in_session(user):
+                self.sender.send_message(self.receiver, SpeechAct.INFORM, {"steps": len(user)})
+        dispatcher.deliver()
+        self.assertEqual([m.session for m in self.receiver.message_queue], ["alice", "bob"])
+    
+    def test_concurrent_analyses(self):
+        """Test that analyses for many users run together without overwriting each other"""
+        mas = FitnessMAS()
+        mas.data_agent.fetch_delay = 0
+        users = [f"user_{i}" for i in range(20)]
+        for user in users:
+            mas.start_analysis(user)
+        cycles = mas.run_until_quiescent(timeout=5, wait_time=0)
+        
+        self.assertLess(cycles, 10)
+        for user in users:
+            fitness_data = mas.analysis_agent.sessions[user].beliefs.get("fitness_data").value
+            self.assertEqual(fitness_data["user_id"], user)
+            report = mas.get_report(user)
+            self.assertEqual(report["user_id"], user)
+            self.assertEqual(report["metrics"]["steps"], fitness_data["steps"])
+            self.assertEqual(report["recommendations"],
+                             mas.analysis_agent.sessions[user].beliefs.get("recommendations").value)
+        self.assertEqual(mas.ui_agent.processing_reports, set())
+
+
+class TestWireFormat(unittest.TestCase):
+    """Test cases for the binary message codec"""
+    
+    def setUp(self):
+        self.fitness_data = {
+            "user_id": "wire_user",
+            "heart_rate": [random.randint(60, 150) for _ in range(50)],
+            "steps": 12000,
+            "sleep_hours": 7.5,
+            "timestamp": datetime.now().isoformat()
+        }
+        self.message = Message("FitnessDataAgent", "AnalysisAgent", SpeechAct.INFORM,
+                               {"fitness_data": self.fitness_data}, "conv-wire")
+    
+    def test_round_trip(self):
+        """Test that every field and value survives encoding"""
+        content = {
+            "nested": {"flags": [True, False, None], "mixed": [1, "two", 3.0]},
+            "floats": [0.5, 1, -2.25],
+            "large": [2**40, -1],
+            "huge": [2**64, -2**63 - 1, 2**63 - 1],
+            "big": 10**30,
+            "empty": [],
+            "text": "héllo",
+            "raw": b"\x00\x01"
+        }
+        message = Message("A", "B", SpeechAct.QUERY, content, session="wire_user")
+        decoded = decode_message(encode_message(message))
+        self.assertEqual(decoded.session, "wire_user")
+        self.assertIsNone(decode_message(encode_message(self.message)).session)
+        self.assertEqual(decoded.sender, "A")
+        self.assertEqual(decoded.receiver, "B")
+        self.assertIs(decoded.speech_act, SpeechAct.QUERY)
+        self.assertEqual(decoded.conversation_id, message.conversation_id)
+        self.assertEqual(decoded.created_ns, message.created_ns)
+        self.assertEqual(decoded.content, content)
+        # Mixed lists keep their ints as ints
+        self.assertEqual([type(value) for value in decoded.content["floats"]], [float, int, float])
+        
+        # Integer session keys (as used by analyze_batch) round-trip too
+        decoded = decode_message(encode_message(Message("A", "B", SpeechAct.INFORM, {"n": 1}, session=7)))
+        self.assertEqual(decoded.session, 7)
+        self.assertEqual(decoded.content, {"n": 1})
+    
+    def test_zero_copy_arrays(self):
+        """Test that packed arrays decode as lists, or as memoryviews over the buffer on request"""
+        data = encode_message(self.message)
+        self.assertEqual(decode_message(data).content["fitness_data"]["heart_rate"], self.fitness_data["heart_rate"])
+        heart_rate = decode_message(data, copy=False).content["fitness_data"]["heart_rate"]
+        self.assertIsInstance(heart_rate, memoryview)
+        self.assertIs(heart_rate.obj, data)
+        self.assertEqual(heart_rate.tolist(), self.fitness_data["heart_rate"])
+        self.assertEqual(sum(heart_rate) / len(heart_rate),
+                         sum(self.fitness_data["heart_rate"]) / len(self.fitness_data["heart_rate"]))
+    
+    def test_versioning(self):
+        """Test that unknown versions and unsupported values are rejected"""
+        data = bytearray(encode_message(self.message))
+        data[2] = 99
+        with self.assertRaises(ValueError):
+            decode_message(bytes(data))
+        with self.assertRaises(TypeError):
+            encode_message(Message("A", "B", SpeechAct.INFORM, {"when": datetime.now()}))
+        with self.assertRaises(TypeError):
+            encode_message(Message("A", "B", SpeechAct.INFORM, {1: "int key"}))
+        with self.assertRaises(TypeError):
+            encode_message(Message("A", "B", SpeechAct.INFORM, {}, session=("tuple", "key")))
+    
+    def test_compare_formats(self):
+        """Test the size/speed comparison against pickle and JSON"""
+        results = compare_formats(self.message, rounds=10)
+        self.assertEqual(set(results), {"wire", "pickle", "json"})
+        self.assertLess(results["wire"]["bytes"], results["pickle"]["bytes"])
+        self.assertLess(results["wire"]["bytes"], results["json"]["bytes"])
+
+
+class TestMessageLog(unittest.TestCase):
+    """Test cases for bounded message history and the on-disk message log"""
+    
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.log = MessageLog(self.tmpdir.name, segment_size=3)
+        self.sender = DeliberativeAgent("LogSender")
+        self.receiver = DeliberativeAgent("LogReceiver")
+        self.sender.message_log = self.log
+        self.receiver.message_log = self.log
+    
+    def tearDown(self):
+        self.log.close()
+        self.tmpdir.cleanup()
+    
+    def test_messages_stored_once(self):
+        """Test that each message is persisted once and segments roll over"""
+        for i in range(7):
+            self.sender.send_message(self.receiver, SpeechAct.INFORM, {"n": i}, f"conv-{i % 2}")
+        
+        self.assertEqual(len(self.log), 7)
+        self.assertEqual(len(self.log.segments), 3)
+        self.assertEqual([m.content["n"] for m in self.log.recent(4)], [3, 4, 5, 6])
+    
+    def test_messages_logged_out_of_time_order(self):
+        """Test that time queries and recent() use message times, not logging order"""
+        messages = [Message("LogSender", "LogReceiver", SpeechAct.INFORM, {"n": n}) for n in range(5)]
+        for n, message in enumerate(messages):
+            message.created_ns = messages[0].created_ns + n * 1_000_000  # 1 ms apart
+        for n in (1, 0, 4, 2, 3):  # One segment holds 1, 0, 4 and the next 2, 3
+            self.log.append(messages[n])
+        
+        first = datetime.fromtimestamp(monotonic_to_wall_ns(messages[0].created_ns) / 1e9)
+        window = timedelta(microseconds=500)
+        self.assertEqual([m.content["n"] for m in self.log.query(start=first - window, end=first + window)], [0])
+        self.assertEqual([m.content["n"] for m in self.log.recent(3)], [2, 3, 4])
+        self.assertEqual([m.content["n"] for m in self.log.recent(10)], [0, 1, 2, 3, 4])
+    
+    def test_queries(self):
+        """Test filtering by agent, conversation and time range"""
+        start = datetime.now()
+        self.sender.send_message(self.receiver, SpeechAct.INFORM, {"n": 1}, "conv-a")
+        self.receiver.send_message(self.sender, SpeechAct.INFORM, {"n": 2}, "conv-b")
+        other = DeliberativeAgent("LogOther")
+        other.message_log = self.log
+        other.send_message(self.sender, SpeechAct.QUERY, {"query": "steps"}, "conv-a")
+        
+        self.assertEqual([m.content["n"] for m in self.log.query(conversation_id="conv-b")], [2])
+        self.assertEqual(len(list(self.log.query(agent="LogReceiver"))), 2)
+        self.assertEqual(len(list(self.log.query(agent="Nobody"))), 0)
+        self.assertEqual(len(list(self.log.query(start=start))), 3)
+        self.assertEqual(len(list(self.log.query(end=start))), 0)
+        
+        queried = next(self.log.query(agent="LogOther"))
+        self.assertEqual(queried.speech_act, SpeechAct.QUERY)
+        self.assertGreaterEqual(queried.timestamp, start.replace(microsecond=0))
+    
+    def test_reopen_existing_log(self):
+        """Test that segment metadata is rebuilt from disk"""
+        for i in range(4):
+            self.sender.send_message(self.receiver, SpeechAct.INFORM, {"n": i})
+        self.log.close()
+        
+        reopened = MessageLog(self.tmpdir.name, segment_size=3)
+        self.assertEqual(len(reopened), 4)
+        self.assertEqual(len(list(reopened.query(agent="LogSender"))), 4)
+    
+    def test_history_is_bounded(self):
+        """Test that agents keep only a bounded in-memory tail"""
+        limit = self.sender.message_history.maxlen
+        for i in range(limit + 5):
+            self.sender.send_message(self.receiver, SpeechAct.INFORM, {"n": i})
+        self.assertEqual(len(self.sender.message_history), limit)
+        self.assertEqual(self.sender.message_history[-1].content["n"], limit + 4)
 
 
 class TestOntology(unittest.TestCase):
@@ -223,6 +909,12 @@ class TestFitnessDataAgent(unittest.TestCase):
         belief = self.agent.get_belief("fitness_data")
         self.assertIsNotNone(belief)
         self.assertEqual(belief.value["user_id"], "test_user")
+        
+        # The heart-rate summary is built as the samples are generated
+        summary = StreamingStats.from_dict(result["heart_rate_stats"])
+        self.assertEqual(summary.count, len(result["heart_rate"]))
+        self.assertEqual(summary.mean, sum(result["heart_rate"]) / len(result["heart_rate"]))
+        self.assertEqual(summary.max, max(result["heart_rate"]))
 
 
 class TestAnalysisAgent(unittest.TestCase):
@@ -313,6 +1005,150 @@ class TestAnalysisAgent(unittest.TestCase):
         self.assertTrue(any("good job" in rec.lower() for rec in recommendations_good) or
                         any("adequate sleep" in rec.lower() for rec in recommendations_good),
                         "Should provide positive feedback for good metrics")
+    
+    def test_batch_matches_per_user_analysis(self):
+        """Columnar batch analysis gives each user the same recommendations as the scalar path"""
+        rng = random.Random(7)
+        steps = [rng.randint(3000, 15000) for _ in range(500)] + [7500, 8000, 3000]
+        heart_rate = [[rng.randint(60, 150) for _ in range(10)] for _ in range(500)]
+        heart_rate += [[100] * 10, [141, 141, 141] + [60] * 7, [150] * 10]
+        sleep_hours = [round(rng.uniform(5.0, 9.0), 1) for _ in range(500)] + [7.0, 6.9, 8.0]
+        if np is not None:
+            columns = (np.array(steps), np.array(heart_rate), np.array(sleep_hours))
+        else:
+            columns = (steps, heart_rate, sleep_hours)
+        
+        expected = [self.agent.analyze_fitness_data(*row) for row in zip(steps, heart_rate, sleep_hours)]
+        batch = self.agent.analyze_fitness_batch(*columns)
+        self.assertEqual(batch, expected)
+        
+        # Each user gets a list of their own
+        batch[0].append("extra")
+        self.assertNotIn("extra", batch[1])
+    
+    @unittest.skipIf(np is None, "NumPy is not installed")
+    def test_batch_with_padded_heart_rate_rows(self):
+        """NaN padding lets users with fewer heart-rate samples share one matrix"""
+        rows = [[72, 80, 101], [150, 150, 150, 150], [110]]
+        matrix = np.full((3, 4), np.nan)
+        for i, row in enumerate(rows):
+            matrix[i, :len(row)] = row
+        steps, sleep_hours = [9000, 5000, 12000], [8.0, 6.0, 7.5]
+        
+        expected = [self.agent.analyze_fitness_data(*row) for row in zip(steps, rows, sleep_hours)]
+        self.assertEqual(self.agent.analyze_fitness_batch(steps, matrix, sleep_hours), expected)
+
+
+class TestRules(unittest.TestCase):
+    """Test cases for the declarative rule tables"""
+    
+    def test_fitness_level_rules(self):
+        """The compiled fitness-level table keeps the original thresholds, scalar and batch"""
+        levels = rule_set("fitness_level")
+        cases = [
+            (10001, [80, 84], "Excellent"),
+            (10001, [90, 90], "Good"),
+            (7501, [70], "Good"),
+            (7500, [70], "Average"),
+            (5000, [70], "Below target")
+        ]
+        for steps, heart_rate, level in cases:
+            self.assertEqual(levels.evaluate({"steps": steps, "heart_rate": heart_rate}), level)
+        
+        steps = [steps for steps, _, _ in cases]
+        heart_rate = [(heart_rate * 2)[:2] for _, heart_rate, _ in cases]
+        batch = levels.evaluate_batch({"steps": steps, "heart_rate": heart_rate})
+        self.assertEqual(batch, [level for _, _, level in cases])
+        with patch("rules.np", None):
+            self.assertEqual(levels.evaluate_batch({"steps": steps, "heart_rate": heart_rate}), batch)
+    
+    def test_thresholds_come_from_rules_file(self):
+        """Editing the data file changes the agents' decisions without code changes"""
+        with open(DEFAULT_RULES_PATH, encoding="utf-8") as f:
+            table = json.load(f)
+        table["rule_sets"]["recommendations"]["rules"][0]["threshold"] = 20000
+        table["rule_sets"]["fitness_level"]["rules"][1]["threshold"] = 2000
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "rules.json")
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(table, f)
+            
+            agent = UserInterfaceAgent("UI")
+            analysis = AnalysisAgent("Analysis")
+            self.assertEqual(agent.determine_fitness_level({"steps": 3000}), "Below target")
+            self.assertEqual(analysis.analyze_fitness_data(12000, [70], 8.0)[0], "Good job on staying active with your step count!")
+            
+            agent.rules_path = analysis.rules_path = path
+            self.assertEqual(agent.determine_fitness_level({"steps": 3000}), "Good")
+            self.assertIn("steps", analysis.analyze_fitness_data(12000, [70], 8.0)[0])
+    
+    def test_invalid_rules_are_rejected(self):
+        """Unknown operators and modes fail when the table is compiled"""
+        with self.assertRaises(ValueError):
+            Rule.from_dict({"metric": "steps", "operator": "=>", "threshold": 1, "message": "x"})
+        with self.assertRaises(ValueError):
+            RuleSet("bad", [], mode="any")
+
+
+class TestStreamingStats(unittest.TestCase):
+    """Test cases for the streaming heart-rate summary"""
+    
+    def test_matches_full_series_statistics(self):
+        """Incremental updates agree with statistics computed over the whole series"""
+        samples = [random.randint(60, 150) for _ in range(1000)]
+        stats = StreamingStats(140)
+        for sample in samples:
+            stats.add(sample)
+        
+        self.assertEqual(stats.count, len(samples))
+        self.assertEqual(stats.mean, sum(samples) / len(samples))
+        self.assertEqual((stats.min, stats.max), (min(samples), max(samples)))
+        self.assertAlmostEqual(stats.variance, statistics.pvariance(samples), places=6)
+        self.assertEqual(stats.exceedances, sum(1 for hr in samples if hr > 140))
+        
+        copy = StreamingStats.from_dict(json.loads(json.dumps(stats.to_dict())))
+        copy.add(200)
+        stats.add(200)
+        self.assertEqual(copy.to_dict(), stats.to_dict())
+    
+    def test_block_updates_match_single_updates(self):
+        """extend() agrees with add() and with a two-pass variance on large-offset data"""
+        rng = random.Random(3)
+        samples = [1e9 + rng.random() for _ in range(5000)]
+        single = StreamingStats(1e9 + 0.5)
+        for sample in samples:
+            single.add(sample)
+        blocks = StreamingStats(1e9 + 0.5, samples[:7])
+        blocks.extend(samples[7:2000])
+        blocks.extend(iter(samples[2000:]))
+        
+        expected = np.var(samples) if np is not None else statistics.pvariance(samples)
+        for stats in (single, blocks):
+            self.assertAlmostEqual(stats.variance / expected, 1.0, places=6)
+        self.assertEqual((blocks.count, blocks.min, blocks.max, blocks.exceedances),
+                         (single.count, single.min, single.max, single.exceedances))
+    
+    def test_consumers_read_shipped_summary(self):
+        """Rules and reports use the summary in fitness_data instead of rescanning the samples"""
+        summary = StreamingStats(SPIKE_HEART_RATE, [150, 150, 150, 150])
+        fitness_data = {"steps": 12000, "heart_rate": [70, 70], "heart_rate_stats": summary.to_dict(), "sleep_hours": 8.0}
+        
+        self.assertEqual(heart_rate_stats(fitness_data).mean, 150)
+        self.assertEqual(rule_set("fitness_level").evaluate(fitness_data), "Good")
+        recommendations = rule_set("recommendations").evaluate(fitness_data)
+        self.assertIn("Your heart rate spikes suggest high intensity. Consider adding recovery sessions", recommendations)
+        
+        report = UserInterfaceAgent("UI").generate_report(fitness_data, recommendations)
+        self.assertEqual(report["metrics"]["heart_rate_avg"], 150)
+        
+        # Including a deliberative agent that received the fields as beliefs
+        agent = DeliberativeAgent("SummaryReader")
+        agent.add_beliefs(fitness_data)
+        self.assertTrue(agent.handle_analyze_fitness_data(Intention("analyze_fitness_data", {})))
+        self.assertIn("Consider more cardiovascular training", agent.get_belief("recommendations").value)
+        
+        # A summary kept for another spike threshold is not reused for spike counts
+        self.assertEqual(heart_rate_stats(fitness_data, threshold=100).exceedances, 0)
 
 
 class TestUserInterfaceAgent(unittest.TestCase):
@@ -411,21 +1247,524 @@ class TestFitnessMAS(unittest.TestCase):
         
         # Verify results
         # 1. Data agent should have fitness data
-        self.assertIsNotNone(self.mas.data_agent.get_belief("fitness_data"))
+        self.assertIsNotNone(self.mas.data_agent.sessions["test_user"].beliefs.get("fitness_data"))
         
         # 2. Analysis agent should have recommendations
-        recommendations = self.mas.analysis_agent.get_belief("recommendations")
+        recommendations = self.mas.analysis_agent.sessions["test_user"].beliefs.get("recommendations")
         self.assertIsNotNone(recommendations)
         
         # 3. UI agent should have a report
-        report_belief = self.mas.ui_agent.get_belief("fitness_report")
-        if report_belief:
-            self.assertEqual(report_belief.value["user_id"], "test_user")
+        report = self.mas.get_report("test_user")
+        if report:
+            self.assertEqual(report["user_id"], "test_user")
         
         # 4. Check ontology contains instances - may not have FitnessMetric instances specifically
         self.assertGreater(len(fitness_ontology.instances), 0)
 
 
+class TestScheduler(unittest.TestCase):
+    """Test cases for the ready-set scheduler"""
+    
+    def setUp(self):
+        self.mas = FitnessMAS()
+        self.mas.data_agent.fetch_delay = 0
+    
+    def test_only_ready_agents_step(self):
+        """Test that idle agents are stepped only in the first cycle"""
+        idle = self.mas.add_agent(ReactiveAgent("IdleAgent"))
+        self.mas.start_analysis("ready_user")
+        with patch.object(idle, "step", wraps=idle.step) as idle_step:
+            self.mas.run_cycle(max_cycles=10)
+        self.assertEqual(idle_step.call_count, 1)
+        self.assertEqual(self.mas.get_report("ready_user")["user_id"], "ready_user")
+    
+    def test_no_fixed_sleep(self):
+        """Test that the default wait_time does not delay a busy workflow"""
+        self.mas.start_analysis("fast_user")
+        start = time.perf_counter()
+        self.mas.run_cycle()  # wait_time=0.2
+        self.assertLess(time.perf_counter() - start, 0.2)
+        self.assertIsNotNone(self.mas.get_report("fast_user"))
+    
+    def test_wake_ends_wait(self):
+        """Test that waking an agent from another thread ends a wait early"""
+        scheduler = Scheduler()
+        agent = DeliberativeAgent("WokenAgent")
+        threading.Timer(0.05, scheduler.wake, args=(agent,)).start()
+        start = time.perf_counter()
+        self.assertTrue(scheduler.wait(5))
+        self.assertLess(time.perf_counter() - start, 1)
+        self.assertEqual(scheduler.take_ready(), [agent])
+        
+        # Wakes are ignored while an agent is stepped; leftover work keeps it ready
+        scheduler.wake(agent)
+        agent.add_intention(Intention("noop", {}))
+        scheduler.done(agent)
+        self.assertIn(agent, scheduler)
+
+
+class TestQuiescence(unittest.TestCase):
+    """Test cases for termination detection"""
+    
+    def setUp(self):
+        self.mas = FitnessMAS()
+        self.mas.data_agent.fetch_delay = 0
+    
+    def test_run_until_quiescent(self):
+        """Test that the workflow ends as soon as no work is left"""
+        self.mas.start_analysis("quiescent_user")
+        cycles = self.mas.run_until_quiescent(timeout=5)
+        
+        self.assertEqual(self.mas.get_report("quiescent_user")["user_id"], "quiescent_user")
+        self.assertTrue(self.mas.is_quiescent())
+        self.assertEqual(self.mas.pending_work()["undelivered_messages"], 0)
+        
+        # A second run has nothing to do
+        self.assertEqual(self.mas.run_until_quiescent(timeout=5), 1)
+        self.assertLess(cycles, 15)
+    
+    def test_blocked_intention_is_quiescent(self):
+        """Test that an intention no message can unblock does not keep the run going"""
+        self.mas.ui_agent.add_intention(Intention("await_reply", {}))
+        start = time.perf_counter()
+        cycles = self.mas.run_cycle(wait_time=0, max_cycles=15)
+        self.assertLess(time.perf_counter() - start, 1)
+        self.assertLess(cycles, 15)
+        self.assertEqual(self.mas.pending_work()["pending_intentions"], 1)
+    
+    def test_undelivered_messages_keep_running(self):
+        """Test that messages in flight prevent quiescence"""
+        self.mas.start_analysis("in_flight_user")
+        self.assertFalse(self.mas.is_quiescent())
+        self.assertEqual(self.mas.pending_work()["undelivered_messages"], 1)
+    
+    def test_timeout(self):
+        """Test that run_until_quiescent gives up after the timeout"""
+        self.mas.data_agent.fetch_delay = 0.2
+        self.mas.start_analysis("slow_user")
+        with self.assertRaises(TimeoutError):
+            self.mas.run_until_quiescent(timeout=0.1)
+    
+    def test_async_run_until_quiescent(self):
+        """Test that the asyncio runtime also stops once quiescent"""
+        self.mas.start_analysis("async_quiescent_user")
+        cycles = self.mas.run_until_quiescent(timeout=5, runtime="async", wait_time=0)
+        self.assertLess(cycles, 15)
+        self.assertEqual(self.mas.get_report("async_quiescent_user")["user_id"], "async_quiescent_user")
+
+
+class TestBatchAnalysis(unittest.TestCase):
+    """Test cases for pipelined batch analysis"""
+    
+    def setUp(self):
+        self.mas = FitnessMAS()
+        self.mas.data_agent.fetch_delay = 0
+    
+    def test_streams_reports(self):
+        """Test that every user gets their own report and sessions are released"""
+        users = [f"batch_user_{i}" for i in range(200)]
+        max_sessions = 0
+        results = {}
+        for user_id, report in self.mas.analyze_batch(iter(users), concurrency=25):
+            max_sessions = max(max_sessions, len(self.mas.analysis_agent.sessions))
+            results[user_id] = report
+        
+        self.assertEqual(set(results), set(users))
+        for user_id, report in results.items():
+            self.assertEqual(report["user_id"], user_id)
+        
+        # At most `concurrency` user sessions (plus the default one) at a time
+        self.assertLessEqual(max_sessions, 26)
+        self.assertEqual(len(self.mas.ui_agent.sessions), 1)
+        self.assertEqual(self.mas.ui_agent.reports, {})
+        self.assertEqual(self.mas.batch_stats["users"], 200)
+        self.assertEqual(self.mas.batch_stats["failed"], 0)
+        self.assertGreater(self.mas.batch_stats["users_per_second"], 0)
+        self.assertLess(self.mas.batch_stats["cycles"], 200)
+    
+    def test_stalled_analysis(self):
+        """Test that an analysis whose request is dropped is reported as failed"""
+        self.mas.data_agent.message_queue.capacity = 3
+        results = dict(self.mas.analyze_batch([f"user_{i}" for i in range(5)], concurrency=5))
+        self.assertEqual(len(results), 5)
+        self.assertEqual(sum(report is None for report in results.values()), 2)
+        self.assertEqual(self.mas.batch_stats["failed"], 2)
+    
+    def test_close_ends_open_sessions(self):
+        """Test that closing the generator early releases the sessions still in flight"""
+        batch = self.mas.analyze_batch([f"user_{i}" for i in range(40)], concurrency=10)
+        next(batch)
+        batch.close()
+        for agent in agent_registry:
+            self.assertEqual(list(agent.sessions), [None], agent.name)
+    
+    def test_none_user_id_is_rejected(self):
+        """Test that a None user id is an error, not the end of the batch"""
+        with self.assertRaises(ValueError):
+            list(self.mas.analyze_batch(["user_a", None, "user_b"], concurrency=1))
+        self.assertEqual(list(self.mas.ui_agent.sessions), [None])
+    
+    def test_repeated_user_ids(self):
+        """Test that a repeated user id gets its own result once the earlier analysis finishes"""
+        results = list(self.mas.analyze_batch(["dup_a", "dup_b", "dup_a", "dup_c", "dup_a"]))
+        self.assertEqual(sorted(user_id for user_id, _ in results), ["dup_a", "dup_a", "dup_a", "dup_b", "dup_c"])
+        self.assertTrue(all(report is not None for _, report in results))
+        self.assertEqual(self.mas.batch_stats["users"], 5)
+        self.assertEqual(list(self.mas.ui_agent.sessions), [None])
+    
+    def test_async_fetches_overlap(self):
+        """Test that the asyncio runtime overlaps retrievals across users"""
+        self.mas.data_agent.fetch_delay = 0.05
+        start = time.perf_counter()
+        results = list(self.mas.analyze_batch([f"user_{i}" for i in range(20)], runtime="async"))
+        self.assertLess(time.perf_counter() - start, 20 * 0.05 / 2)
+        self.assertEqual(len([report for _, report in results if report]), 20)
+        self.assertFalse(self.mas.data_agent.asynchronous)
+
+
+class TestAsyncRuntime(unittest.TestCase):
+    """Test cases for the asyncio runtime"""
+    
+    def setUp(self):
+        self.mas = FitnessMAS()
+        self.mas.data_agent.fetch_delay = 0.05
+    
+    def test_async_workflow(self):
+        """Test that the asyncio runtime completes the analysis workflow"""
+        self.mas.start_analysis("async_user")
+        self.mas.run_cycle(wait_time=0, max_cycles=10, runtime="async")
+        
+        report = self.mas.get_report("async_user")
+        self.assertIsNotNone(report)
+        self.assertEqual(report["user_id"], "async_user")
+        self.assertFalse(self.mas.data_agent.asynchronous)
+    
+    @patch('time.sleep')
+    def test_fetches_overlap(self, mock_sleep):
+        """Test that concurrent retrievals await instead of blocking"""
+        for i in range(20):
+            self.mas.ui_agent.send_message(
+                self.mas.data_agent,
+                SpeechAct.REQUEST,
+                {"action": "retrieve_fitness_data", "user_id": f"user_{i}"}
+            )
+        
+        start = time.perf_counter()
+        self.mas.run_cycle(wait_time=0, max_cycles=10, runtime="async")
+        elapsed = time.perf_counter() - start
+        
+        # 20 sequential fetches would take a full second
+        self.assertLess(elapsed, 20 * 0.05 / 2)
+        mock_sleep.assert_not_called()
+        self.assertIsNotNone(self.mas.data_agent.get_belief("fitness_data"))
+
+
+class TestThreadedRuntime(unittest.TestCase):
+    """Test cases for parallel agent stepping on a thread pool"""
+    
+    def setUp(self):
+        self.mas = FitnessMAS()
+    
+    def test_threaded_workflow(self):
+        """Test that the thread-pool runtime produces the same workflow results"""
+        self.mas.data_agent.fetch_delay = 0
+        self.mas.start_analysis("threaded_user")
+        self.mas.run_cycle(wait_time=0, max_cycles=5, runtime="threads", workers=3)
+        
+        self.assertIsNotNone(self.mas.analysis_agent.sessions["threaded_user"].beliefs.get("recommendations"))
+        report = self.mas.get_report("threaded_user")
+        self.assertIsNotNone(report)
+        self.assertEqual(report["user_id"], "threaded_user")
+    
+    def test_io_bound_agents_overlap(self):
+        """Test that blocking fetches in different agents run concurrently"""
+        data_agents = [self.mas.data_agent] + [
+            self.mas.add_agent(FitnessDataAgent(f"ExtraDataAgent{i}")) for i in range(3)
+        ]
+        for agent in data_agents:
+            agent.fetch_delay = 0.1
+            self.mas.ui_agent.send_message(
+                agent,
+                SpeechAct.REQUEST,
+                {"action": "retrieve_fitness_data", "user_id": agent.name}
+            )
+        
+        start = time.perf_counter()
+        self.mas.run_cycle(wait_time=0, max_cycles=1, runtime="threads", workers=4)
+        elapsed = time.perf_counter() - start
+        
+        self.assertLess(elapsed, 0.1 * len(data_agents) * 0.75)
+        for agent in data_agents:
+            self.assertEqual(agent.get_belief("fitness_data").value["user_id"], agent.name)
+    
+    def test_deterministic_delivery(self):
+        """Test that delivery order follows registration order, not step timing"""
+        first = self.mas.add_agent(FitnessDataAgent("FirstSender"))
+        second = self.mas.add_agent(FitnessDataAgent("SecondSender"))
+        
+        # Post in reverse registration order
+        second.send_message(self.mas.analysis_agent, SpeechAct.INFORM, {"n": 2})
+        first.send_message(self.mas.analysis_agent, SpeechAct.INFORM, {"n": 1})
+        self.mas.dispatcher.deliver()
+        
+        senders = [m.sender for m in self.mas.analysis_agent.message_queue]
+        self.assertEqual(senders, ["FirstSender", "SecondSender"])
+
+
+class ExitingAgent(DeliberativeAgent):
+    """Agent whose process dies during its first step, as if it were killed"""
+    def step(self):
+        os._exit(3)
+
+
+class TestShardedRuntime(unittest.TestCase):
+    """Test cases for multi-process sharded execution"""
+    
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.mas = FitnessMAS(message_log_dir=os.path.join(self.directory.name, "messages"))
+        self.mas.data_agent.fetch_delay = 0
+    
+    def tearDown(self):
+        self.mas.message_log.close()
+        self.directory.cleanup()
+    
+    def test_sharded_workflow(self):
+        """Test that agents on different shards complete the workflow"""
+        self.mas.start_analysis("sharded_user")
+        self.mas.run_cycle(wait_time=0, max_cycles=6, runtime="processes", workers=2)
+        
+        # Every message crossed from one agent to another on a different shard
+        recommendations = self.mas.analysis_agent.sessions["sharded_user"].beliefs.get("recommendations")
+        self.assertIsNotNone(recommendations)
+        report = self.mas.ui_agent.sessions["sharded_user"].beliefs.get("fitness_report")
+        self.assertIsNotNone(report)
+        self.assertEqual(report.value["user_id"], "sharded_user")
+        self.assertEqual(report.value["recommendations"], recommendations.value)
+        self.assertGreater(self.mas.analysis_agent.actions.counts["analyze_fitness_data"], 0)
+        self.assertEqual(len(self.mas.dispatcher), 0)
+        self.assertGreater(len(fitness_ontology.instances), 0)
+        
+        # The agents' full state comes back, not only their beliefs
+        self.assertEqual(self.mas.get_report("sharded_user")["report_id"], report.value["report_id"])
+        self.assertIn("REPORT", self.mas.process_user_command("show report"))
+        
+        # Messages sent on the shards reach the coordinator's log
+        logged = [(message.sender, message.speech_act) for message in self.mas.message_log.query()]
+        self.assertEqual(logged, [
+            ("UserInterfaceAgent", SpeechAct.REQUEST),
+            ("FitnessDataAgent", SpeechAct.INFORM),
+            ("FitnessDataAgent", SpeechAct.INFORM),
+            ("AnalysisAgent", SpeechAct.INFORM)
+        ])
+    
+    def test_sharded_run_until_quiescent(self):
+        """Test that the sharded runtime stops on the same quiescence condition"""
+        self.mas.start_analysis("sharded_quiescent_user")
+        cycles = self.mas.run_until_quiescent(timeout=30, runtime="processes", workers=2)
+        self.assertEqual(self.mas.get_report("sharded_quiescent_user")["user_id"], "sharded_quiescent_user")
+        self.assertTrue(self.mas.is_quiescent())
+        
+        # Same number of cycles as a single-process run of the same workflow
+        mas = FitnessMAS()
+        mas.data_agent.fetch_delay = 0
+        mas.start_analysis("sharded_quiescent_user")
+        self.assertEqual(cycles, mas.run_until_quiescent(timeout=5, wait_time=0))
+    
+    def test_dead_worker(self):
+        """Test that a worker that dies without reporting an error is reported as a shard failure"""
+        self.mas.add_agent(ExitingAgent("ExitingAgent"))
+        with self.assertRaisesRegex(RuntimeError, "exited with code 3"):
+            self.mas.run_cycle(wait_time=0, max_cycles=3, runtime="processes", workers=2)
+    
+    def test_sharded_blocked_intention_is_quiescent(self):
+        """Test that a blocked intention does not keep the shards running"""
+        self.mas.ui_agent.add_intention(Intention("await_reply", {}))
+        cycles = self.mas.run_cycle(wait_time=0, max_cycles=15, runtime="processes", workers=2)
+        self.assertLess(cycles, 15)
+        self.assertEqual(self.mas.pending_work()["pending_intentions"], 1)
+
+
+class TestSnapshot(unittest.TestCase):
+    """Test cases for saving and restoring the whole system"""
+    
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "mas.snapshot")
+        self.mas = FitnessMAS()
+        self.mas.data_agent.fetch_delay = 0
+    
+    def tearDown(self):
+        self.directory.cleanup()
+    
+    def test_round_trip(self):
+        """Test that a restored system has the same mental state and ontology"""
+        self.mas.start_analysis("snapshot_user")
+        self.mas.run_cycle(wait_time=0, max_cycles=6)
+        report = self.mas.get_report("snapshot_user")
+        desires = [(d.name, d.achieved) for d in self.mas.ui_agent.sessions["snapshot_user"].desires]
+        counts = dict(self.mas.analysis_agent.actions.counts)
+        instances = dict(fitness_ontology.instances)
+        self.mas.snapshot(self.path)
+        
+        restored = FitnessMAS()
+        fitness_ontology.instances = {}
+        restored.restore(self.path)
+        session = restored.ui_agent.sessions["snapshot_user"]
+        self.assertEqual(session.beliefs.get("fitness_report").value, report)
+        self.assertEqual(restored.get_report("snapshot_user"), report)
+        self.assertEqual(restored.ui_agent.last_report, self.mas.ui_agent.last_report)
+        self.assertEqual([(d.name, d.achieved) for d in session.desires], desires)
+        self.assertEqual(dict(restored.analysis_agent.actions.counts), counts)
+        self.assertEqual(fitness_ontology.instances, instances)
+        self.assertEqual(restored.data_agent.fetch_delay, 0)
+        
+        # Restored beliefs are not treated as new changes
+        self.assertEqual(session.beliefs.take_changes(), [])
+    
+    def test_pending_messages(self):
+        """Test that undelivered messages are saved and delivered after a restore"""
+        self.mas.start_analysis("warm_user")
+        self.mas.snapshot(self.path)
+        
+        restored = FitnessMAS()
+        restored.restore(self.path)
+        self.assertEqual(len(restored.dispatcher), 1)
+        restored.data_agent.fetch_delay = 0
+        restored.run_cycle(wait_time=0, max_cycles=6)
+        self.assertEqual(restored.get_report("warm_user")["user_id"], "warm_user")
+
+    
+    def test_shared_message_shifted_once(self):
+        """Test that a published message in several mailboxes moves to the new clock once"""
+        self.mas.analysis_agent.subscribe("snapshot_topic")
+        self.mas.ui_agent.subscribe("snapshot_topic")
+        message = self.mas.data_agent.publish("snapshot_topic", {"n": 1})
+        self.mas.dispatcher.deliver()
+        self.mas.snapshot(self.path)
+        
+        # Pretend the snapshot was taken by a process whose monotonic clock was 5 s behind
+        with open(self.path, "rb") as f:
+            state = pickle.load(f)
+        state["wall_offset_ns"] += 5 * 10**9
+        with open(self.path, "wb") as f:
+            pickle.dump(state, f)
+        
+        restored = FitnessMAS()
+        restored.restore(self.path)
+        for agent in (restored.analysis_agent, restored.ui_agent):
+            restored_message, = [m for m in agent.message_queue if m.content == {"n": 1}]
+            self.assertEqual(restored_message.created_ns, message.created_ns + 5 * 10**9, agent.name)
+
+
+class TestJournal(unittest.TestCase):
+    """Test cases for the event journal and replay"""
+    
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "events.jsonl")
+    
+    def tearDown(self):
+        fitness_ontology.journal = None
+        self.directory.cleanup()
+    
+    @staticmethod
+    def _state(mas):
+        return {
+            (agent.name, key): (
+                {belief.predicate: belief.value for belief in session.beliefs},
+                [(d.name, d.achieved) for d in session.desires],
+                [i.action for i in session.intentions]
+            )
+            for agent in agent_registry
+            for key, session in agent.sessions.items()
+        }
+    
+    def test_replay_each_cycle(self):
+        """Test that replaying up to any cycle rebuilds the state at its end"""
+        mas = FitnessMAS(journal_path=self.path)
+        mas.data_agent.fetch_delay = 0
+        mas.start_analysis("journal_user")
+        states = []
+        for _ in range(5):
+            mas.run_cycle(wait_time=0, max_cycles=1)
+            states.append((self._state(mas), dict(fitness_ontology.instances), len(mas.dispatcher)))
+        mas.journal.close()
+        
+        for cycle, (state, instances, undelivered) in enumerate(states, start=1):
+            replayed = FitnessMAS()
+            fitness_ontology.instances = {}
+            stats = replayed.replay(self.path, until_cycle=cycle)
+            self.assertEqual(self._state(replayed), state, f"cycle {cycle}")
+            self.assertEqual(fitness_ontology.instances, instances)
+            self.assertEqual(len(replayed.dispatcher), undelivered, f"cycle {cycle}")
+            self.assertEqual(stats["cycles"], cycle)
+        
+        # The replay ran no handlers and sent no messages
+        self.assertEqual(len(replayed.dispatcher), 0)
+        self.assertEqual(sum(replayed.analysis_agent.actions.counts.values()), 0)
+    
+    def test_resume_after_replay(self):
+        """Test that a system replayed to a past cycle finishes the workflow from there"""
+        mas = FitnessMAS(journal_path=self.path)
+        mas.data_agent.fetch_delay = 0
+        mas.start_analysis("resumed_user")
+        mas.run_cycle(wait_time=0, max_cycles=1)
+        self.assertEqual(len(mas.dispatcher), 2)
+        mas.journal.close()
+        
+        replayed = FitnessMAS()
+        replayed.data_agent.fetch_delay = 0
+        replayed.replay(self.path, until_cycle=1)
+        self.assertEqual(len(replayed.dispatcher), 2)
+        self.assertEqual(len(replayed.scheduler), 0)  # Replay applies state without waking agents
+        replayed.run_cycle(wait_time=0)
+        self.assertEqual(replayed.get_report("resumed_user")["user_id"], "resumed_user")
+    
+    def test_replay_removals_and_ended_sessions(self):
+        """Test that removed beliefs, replaced beliefs and ended sessions stay gone after replay"""
+        mas = FitnessMAS(journal_path=self.path)
+        mas.data_agent.fetch_delay = 0
+        reports = dict(mas.analyze_batch(["batch_a", "batch_b"]))
+        self.assertEqual(set(reports), {"batch_a", "batch_b"})
+        
+        agent = mas.analysis_agent
+        agent.add_belief(Belief("note", "temporary"))
+        agent.add_belief(Belief("kept", [1, 2]))
+        agent.remove_belief("note")
+        with agent.in_session("manual"):
+            agent.beliefs = [Belief("only", {"a": (1, 2)})]
+        state = self._state(mas)
+        mas.journal.close()
+        
+        replayed = FitnessMAS()
+        replayed.replay(self.path)
+        # Tuples come back as lists, as in any JSON round trip
+        state[("AnalysisAgent", "manual")] = ({"only": {"a": [1, 2]}}, [], [])
+        self.assertEqual(self._state(replayed), state)
+        self.assertNotIn("batch_a", replayed.ui_agent.sessions)
+    
+    def test_unsupported_values_are_rejected(self):
+        """Test that values JSON cannot represent raise instead of being journaled as text"""
+        journal = Journal(self.path)
+        with self.assertRaises(TypeError):
+            journal.record("belief", "A", predicate="when", value=datetime.now(), confidence=1.0)
+        journal.record("belief", "A", predicate="samples", value=memoryview(bytes([1, 2])), confidence=1.0)
+        journal.close()
+        self.assertEqual([event["value"] for event in Journal(self.path).events()], [[1, 2]])
+    
+    def test_resume_numbering(self):
+        """Test that a reopened journal continues its sequence and cycle numbers"""
+        mas = FitnessMAS(journal_path=self.path)
+        mas.journal.begin_cycle()
+        events = len(mas.journal)
+        mas.journal.close()
+        
+        journal = Journal(self.path)
+        self.assertEqual((len(journal), journal.cycle), (events, 1))
+        journal.close()
+
+
 class TestEndToEndWorkflow(unittest.TestCase):
     """End-to-end tests for the complete fitness analysis workflow"""
     
@@ -547,16 +1886,16 @@ class TestEndToEndWorkflow(unittest.TestCase):
             self.mas.run_cycle(wait_time=0, max_cycles=5)
             
             # Check the report's fitness level
-            report_belief = self.mas.ui_agent.get_belief("fitness_report")
-            self.assertIsNotNone(report_belief, "No fitness report was generated")
+            report = self.mas.get_report("test_user")
+            self.assertIsNotNone(report, "No fitness report was generated")
             
             # Verify the fitness level is valid
             valid_levels = {"Excellent", "Good", "Average", "Below target"}
-            self.assertIn(report_belief.value["fitness_level"], valid_levels,
+            self.assertIn(report["fitness_level"], valid_levels,
                          "Report should have a valid fitness level")
             
             # Verify the recommendations
-            recommendations_belief = self.mas.analysis_agent.get_belief("recommendations")
+            recommendations_belief = self.mas.analysis_agent.sessions["test_user"].beliefs.get("recommendations")
             self.assertIsNotNone(recommendations_belief, "No recommendations were generated")
             recommendations = recommendations_belief.value
             
@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+
+import json
+import pickle
+import struct
+import sys
+import time
+from array import array
+from collections.abc import Mapping
+from typing import Dict, Any, Optional
+
+from base_agent import Message, SpeechAct, monotonic_to_wall_ns, wall_to_monotonic_ns
+
+# Every encoded message starts with MAGIC and the format VERSION
+# (version 2 added the session key, version 3 integers outside 64 bits,
+# version 4 integer session keys; older messages still decode)
+MAGIC = b"FM"
+VERSION = 4
+
+# Header: magic, version, speech act code, send time (ns since the epoch)
+_HEADER = struct.Struct("<2sBBq")
+_U16 = struct.Struct("<H")
+_U32 = struct.Struct("<I")
+_I64 = struct.Struct("<q")
+_F64 = struct.Struct("<d")
+
+# Session key lengths that stand for no session and for an integer key (sent as a value)
+_NO_SESSION = 0xFFFF
+_INT_SESSION = 0xFFFE
+
+# Speech acts are sent as their position in the enum; new members must be appended
+_ACT_CODES = {act: code for code, act in enumerate(SpeechAct)}
+_ACTS = list(SpeechAct)
+
+# Value tags
+_NONE, _TRUE, _FALSE = b"N", b"T", b"F"
+_INT, _BIGINT, _FLOAT, _STR, _BYTES = b"i", b"I", b"d", b"s", b"b"
+_LIST, _MAP, _ARRAY = b"l", b"m", b"a"
+
+# Range of integers sent as a fixed 64-bit value
+_I64_MIN, _I64_MAX = -2**63, 2**63 - 1
+
+# Integer typecodes tried from narrowest to widest
+_INT_TYPECODES = ("B", "b", "h", "i", "q")
+
+# Packed arrays are little-endian; on such hosts they decode without copying
+_LITTLE_ENDIAN = sys.byteorder == "little"
+
+
+def _pack_numeric(values):
+    """Pack a list of only ints or only floats into the narrowest array, or None
+
+    Mixed lists are not packed, so their ints and floats keep their types.
+    """
+    types = set(map(type, values))
+    if types == {int}:
+        # array() range-checks in C, which is cheaper than min()/max() first
+        for typecode in _INT_TYPECODES:
+            try:
+                packed = array(typecode, values)
+                break
+            except OverflowError:
+                continue
+        else:
+            return None
+    elif types == {float}:
+        packed = array("d", values)
+    else:
+        return None
+    if not _LITTLE_ENDIAN:
+        packed.byteswap()
+    return packed
+
+
+def _encode_str(out: bytearray, text: str) -> None:
+    if type(text) is not str:
+        raise TypeError(f"Cannot encode {type(text).__name__} key {text!r} in a message")
+    data = text.encode("utf-8")
+    out += _U32.pack(len(data))
+    out += data
+
+
+def _encode_value(out: bytearray, value: Any) -> None:
+    # bool before int: bool is a subclass of int
+    if value is None:
+        out += _NONE
+    elif value is True:
+        out += _TRUE
+    elif value is False:
+        out += _FALSE
+    elif type(value) is int:
+        if _I64_MIN <= value <= _I64_MAX:
+            out += _INT
+            out += _I64.pack(value)
+        else:
+            # Length-prefixed two's complement, little-endian
+            data = value.to_bytes((value.bit_length() + 8) // 8, "little", signed=True)
+            out += _BIGINT
+            out += _U32.pack(len(data))
+            out += data
+    elif type(value) is float:
+        out += _FLOAT
+        out += _F64.pack(value)
+    elif isinstance(value, str):
+        out += _STR
+        _encode_str(out, value)
+    elif isinstance(value, (bytes, bytearray)):
+        out += _BYTES
+        out += _U32.pack(len(value))
+        out += value
+    elif isinstance(value, Mapping):
+        out += _MAP
+        out += _U32.pack(len(value))
+        for key, item in value.items():
+            _encode_str(out, key)
+            _encode_value(out, item)
+    elif isinstance(value, (list, tuple, memoryview, array)):
+        if isinstance(value, memoryview):
+            value = value.tolist()
+        packed = _pack_numeric(value) if value else None
+        if packed is not None:
+            out += _ARRAY
+            out += packed.typecode.encode("ascii")
+            out += _U32.pack(len(packed))
+            out += packed
+        else:
+            out += _LIST
+            out += _U32.pack(len(value))
+            for item in value:
+                _encode_value(out, item)
+    else:
+        raise TypeError(f"Cannot encode {type(value).__name__} in a message")
+
+
+def encode_message(message: Message) -> bytes:
+    """Encode a message (a MessageBatch is sent as its merged content)"""
+    out = bytearray(_HEADER.pack(MAGIC, VERSION, _ACT_CODES[message.speech_act],
+                                 monotonic_to_wall_ns(message.created_ns)))
+    for text in (message.sender, message.receiver, message.conversation_id):
+        data = text.encode("utf-8")
+        out += _U16.pack(len(data))
+        out += data
+    if message.session is None:
+        out += _U16.pack(_NO_SESSION)
+    elif type(message.session) is int:
+        out += _U16.pack(_INT_SESSION)
+        _encode_value(out, message.session)
+    elif type(message.session) is not str:
+        raise TypeError(f"Cannot encode session key of type {type(message.session).__name__}")
+    else:
+        data = message.session.encode("utf-8")
+        out += _U16.pack(len(data))
+        out += data
+    _encode_value(out, message.content)
+    return bytes(out)
+
+
+class _Decoder:
+    """Reads values from a buffer; packed arrays become memoryviews into it"""
+    def __init__(self, data, copy: bool):
+        self.data = data
+        self.view = memoryview(data)
+        self.offset = 0
+        self.copy = copy or not _LITTLE_ENDIAN
+
+    def _take(self, size: int) -> memoryview:
+        start = self.offset
+        self.offset += size
+        if self.offset > len(self.view):
+            raise ValueError("Truncated message")
+        return self.view[start:self.offset]
+
+    def _u32(self) -> int:
+        value = _U32.unpack_from(self.data, self.offset)[0]
+        self.offset += 4
+        return value
+
+    def _str(self, length: int) -> str:
+        return str(self._take(length), "utf-8")
+
+    def name(self) -> Optional[str]:
+        """A header string (agent name, conversation id or session key)"""
+        length = _U16.unpack_from(self.data, self.offset)[0]
+        self.offset += 2
+        if length == _NO_SESSION:
+            return None
+        if length == _INT_SESSION:
+            return self.value()
+        return self._str(length)
+
+    def value(self) -> Any:
+        tag = self.data[self.offset:self.offset + 1]
+        self.offset += 1
+        if tag == _STR:
+            return self._str(self._u32())
+        if tag == _INT or tag == _FLOAT:
+            value = (_I64 if tag == _INT else _F64).unpack_from(self.data, self.offset)[0]
+            self.offset += 8
+            return value
+        if tag == _ARRAY:
+            typecode = self._str(1)
+            count = self._u32()
+            buffer = self._take(count * array(typecode).itemsize)
+            if self.copy:
+                values = array(typecode, buffer.tobytes())
+                if not _LITTLE_ENDIAN:
+                    values.byteswap()
+                return values.tolist()
+            return buffer.cast(typecode)
+        if tag == _MAP:
+            result = {}
+            for _ in range(self._u32()):
+                key = self._str(self._u32())
+                result[key] = self.value()
+            return result
+        if tag == _LIST:
+            return [self.value() for _ in range(self._u32())]
+        if tag == _BIGINT:
+            return int.from_bytes(self._take(self._u32()), "little", signed=True)
+        if tag == _NONE:
+            return None
+        if tag == _TRUE:
+            return True
+        if tag == _FALSE:
+            return False
+        if tag == _BYTES:
+            return bytes(self._take(self._u32()))
+        raise ValueError(f"Unknown value tag {tag!r}")
+
+
+def decode_message(data, copy: bool = True) -> Message:
+    """Decode a message produced by encode_message
+
+    Packed numeric arrays (such as heart_rate) are returned as lists. With
+    copy=False they are memoryviews over `data` instead, which avoids the
+    copy but must not reach agents' beliefs (memoryviews cannot be pickled
+    or journaled) and requires `data` to stay unchanged.
+    """
+    magic, version, act, wall_ns = _HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError("Not an encoded message")
+    if not 1 <= version <= VERSION:
+        raise ValueError(f"Unsupported message format version {version}")
+
+    decoder = _Decoder(data, copy)
+    decoder.offset = _HEADER.size
+    sender = decoder.name()
+    receiver = decoder.name()
+    conversation_id = decoder.name()
+    session = decoder.name() if version >= 2 else None
+    content = decoder.value()
+
+    message = Message(sender, receiver, _ACTS[act], content, conversation_id, session)
+    message.created_ns = wall_to_monotonic_ns(wall_ns)
+    return message
+
+
+def compare_formats(message: Message, rounds: int = 10000) -> Dict[str, Dict[str, float]]:
+    """Encoded size and microseconds to encode and decode, for this codec, pickle and JSON"""
+    record = {
+        "t": monotonic_to_wall_ns(message.created_ns), "s": message.sender, "r": message.receiver,
+        "a": message.speech_act.value, "c": message.conversation_id, "e": message.session,
+        "m": message.content
+    }
+    formats = {
+        "wire": (lambda: encode_message(message), decode_message),
+        "pickle": (lambda: pickle.dumps(message, pickle.HIGHEST_PROTOCOL), pickle.loads),
+        "json": (lambda: json.dumps(record).encode("utf-8"), json.loads)
+    }
+    results = {}
+    for name, (encode, decode) in formats.items():
+        start = time.perf_counter()
+        for _ in range(rounds):
+            data = encode()
+        encode_time = time.perf_counter() - start
+        start = time.perf_counter()
+        for _ in range(rounds):
+            decode(data)
+        decode_time = time.perf_counter() - start
+        results[name] = {
+            "bytes": len(data),
+            "encode_us": encode_time / rounds * 1e6,
+            "decode_us": decode_time / rounds * 1e6
+        }
+    return results
+
+
+if __name__ == "__main__":
+    import random
+
+    for samples in (10, 1000):
+        fitness_data = {
+            "user_id": "benchmark_user",
+            "heart_rate": [random.randint(60, 150) for _ in range(samples)],
+            "steps": random.randint(5000, 15000),
+            "calories": random.randint(1500, 3000),
+            "sleep_hours": round(random.uniform(5.0, 9.0), 1),
+            "active_minutes": random.randint(30, 120),
+            "timestamp": "2025-01-01T00:00:00"
+        }
+        message = Message("FitnessDataAgent", "AnalysisAgent", SpeechAct.INFORM, {"fitness_data": fitness_data})
+        print(f"\nfitness_data message with {samples} heart-rate samples:")
+        for name, result in compare_formats(message, rounds=2000).items():
+            print(f"  {name:<7} {result['bytes']:>6} bytes  "
+                  f"encode {result['encode_us']:7.1f} us  decode {result['decode_us']:7.1f} us")